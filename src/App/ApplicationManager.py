@@ -27,6 +27,9 @@ from App.version_txt import version_txt
 from OFS.Traversable import Traversable
 from Persistence import Persistent
 from Products.PageTemplates.PageTemplateFile import PageTemplateFile
+from ZPublisher.retry import conflict_stats
+from ZPublisher.timing import BUCKETS
+from ZPublisher.timing import timing_stats
 
 
 class FakeConnection(object):
@@ -96,9 +99,13 @@ class ApplicationManager(Persistent, Tabs, Traversable, Implicit):
 
     manage = manage_main = DTMLFile('dtml/cpContents', globals())
     manage_main._setName('manage_main')
+    manage_conflicts = DTMLFile('dtml/conflicts', globals())
+    manage_timing = DTMLFile('dtml/timing', globals())
     manage_options = (
         {'label': 'Control Panel', 'action': 'manage_main'},
         {'label': 'Databases', 'action': 'Database/manage_main'},
+        {'label': 'Conflicts', 'action': 'manage_conflicts'},
+        {'label': 'Timing', 'action': 'manage_timing'},
     )
     MANAGE_TABS_NO_BANNER = True
 
@@ -126,6 +133,33 @@ class ApplicationManager(Persistent, Tabs, Traversable, Implicit):
     def getCLIENT_HOME(self):
         return getConfiguration().clienthome
 
+    def conflict_stats(self):
+        return conflict_stats.items()
+
+    @requestmethod('POST')
+    def manage_resetConflictStats(self, REQUEST=None):
+        "Reset the conflict counters"
+        conflict_stats.clear()
+
+        if REQUEST is not None:
+            REQUEST.RESPONSE.redirect(REQUEST['URL1'] + '/manage_conflicts')
+
+    def timing_buckets(self):
+        labels = ['<= %d ms' % bound for bound in BUCKETS]
+        labels.append('> %d ms' % BUCKETS[-1])
+        return labels
+
+    def timing_stats(self):
+        return timing_stats.items()
+
+    @requestmethod('POST')
+    def manage_resetTimingStats(self, REQUEST=None):
+        "Reset the request timing histograms"
+        timing_stats.clear()
+
+        if REQUEST is not None:
+            REQUEST.RESPONSE.redirect(REQUEST['URL1'] + '/manage_timing')
+
 
 class AltDatabaseManager(Traversable, UndoSupport):
     """ Database management DBTab-style
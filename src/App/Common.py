@@ -12,6 +12,8 @@
 ##############################################################################
 """Commonly used utility functions."""
 
+from email.utils import mktime_tz
+from email.utils import parsedate_tz
 import os
 import sys
 import time
@@ -68,6 +70,33 @@ def rfc1123_date(ts=None):
         hh, mm, ss)
 
 
+_http_dates = {}
+_HTTP_DATES_MAX = 1000
+
+
+def parse_http_date(value):
+    # Return the seconds since the epoch of an HTTP-date in the RFC 1123,
+    # RFC 850 or asctime format, or None if it is not a valid date.
+    # Clients revalidating a resource send the same dates over and over,
+    # so the results are cached.
+    try:
+        return _http_dates[value]
+    except KeyError:
+        pass
+    try:
+        parsed = parsedate_tz(value)
+        if parsed is not None and parsed[9] is None:
+            # Dates without a time zone are in GMT.
+            parsed = parsed[:9] + (0,)
+        result = None if parsed is None else int(mktime_tz(parsed))
+    except (IndexError, OverflowError, TypeError, ValueError):
+        result = None
+    if len(_http_dates) >= _HTTP_DATES_MAX:
+        _http_dates.clear()
+    _http_dates[value] = result
+    return result
+
+
 def absattr(attr, callable=callable):
     # Return the absolute value of an attribute,
     # calling the attr if it is callable.
@@ -22,9 +22,9 @@ from AccessControl.SecurityInfo import ClassSecurityInfo
 from Acquisition import Explicit
 from App import bbb
 from App.Common import package_home
+from App.Common import parse_http_date
 from App.Common import rfc1123_date
 from App.config import getConfiguration
-from DateTime.DateTime import DateTime
 from zope.contenttype import guess_content_type
 from ZPublisher.Iterators import filestream_iterator
 
@@ -104,10 +104,7 @@ class ImageFile(Explicit):
             # with common servers such as Apache (which can usually
             # understand the screwy date string as a lucky side effect
             # of the way they parse it).
-            try:
-                mod_since = int(DateTime(header).timeTime())
-            except Exception:
-                mod_since = None
+            mod_since = parse_http_date(header)
             if mod_since is not None:
                 if getattr(self, 'lmt', None):
                     last_mod = int(self.lmt)
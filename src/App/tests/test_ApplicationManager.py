@@ -230,6 +230,46 @@ class ApplicationManagerTests(ConfigTestBase, unittest.TestCase):
         cldir = config.clienthome = self._makeTempdir()
         self.assertEqual(am.getCLIENT_HOME(), cldir)
 
+    def test_conflict_stats(self):
+        from ZPublisher.retry import conflict_stats
+        am = self._makeOne()
+        conflict_stats.record('/a', True)
+        try:
+            self.assertEqual(am.conflict_stats(), [
+                {'path': '/a', 'conflicts': 1, 'retries': 1, 'failures': 0}])
+        finally:
+            conflict_stats.clear()
+
+    def test_manage_resetConflictStats(self):
+        from ZPublisher.retry import conflict_stats
+        am = self._makeOne()
+        conflict_stats.record('/a', False)
+        am.manage_resetConflictStats()
+        self.assertEqual(am.conflict_stats(), [])
+
+    def test_timing_stats(self):
+        from ZPublisher.timing import RequestTiming
+        from ZPublisher.timing import timing_stats
+        am = self._makeOne()
+        timing = RequestTiming()
+        timing.mark('call')
+        timing_stats.record(timing)
+        try:
+            self.assertEqual([item['phase'] for item in am.timing_stats()],
+                             ['call', 'total'])
+            self.assertEqual(len(am.timing_buckets()),
+                             len(am.timing_stats()[0]['buckets']))
+        finally:
+            timing_stats.clear()
+
+    def test_manage_resetTimingStats(self):
+        from ZPublisher.timing import RequestTiming
+        from ZPublisher.timing import timing_stats
+        am = self._makeOne()
+        timing_stats.record(RequestTiming())
+        am.manage_resetTimingStats()
+        self.assertEqual(am.timing_stats(), [])
+
 
 class AltDatabaseManagerTests(unittest.TestCase):
 
@@ -322,3 +362,66 @@ class MenuDtmlTests(ConfigTestBase, Testing.ZopeTestCase.FunctionalTestCase):
         self.assertTrue(self.browser.isHtml)
         self.assertIn('Control Panel', self.browser.contents)
         self.assertNotIn('ZODB', self.browser.contents)
+
+
+class ConflictsDtmlTests(ConfigTestBase,
+                         Testing.ZopeTestCase.FunctionalTestCase):
+    """Browser testing ..dtml.conflicts.dtml."""
+
+    def setUp(self):
+        super(ConflictsDtmlTests, self).setUp()
+        uf = self.app.acl_users
+        uf.userFolderAddUser('manager', 'manager_pass', ['Manager'], [])
+        self.browser = Testing.testbrowser.Browser()
+        self.browser.addHeader(
+            'Authorization',
+            'basic {}'.format(codecs.encode(
+                b'manager:manager_pass', 'base64').decode()))
+
+    def tearDown(self):
+        from ZPublisher.retry import conflict_stats
+        conflict_stats.clear()
+        super(ConflictsDtmlTests, self).tearDown()
+
+    def test_conflicts_dtml(self):
+        from ZPublisher.retry import conflict_stats
+        self._makeConfig()
+        conflict_stats.record('/hotspot', True)
+        self.browser.open('http://localhost/Control_Panel/manage_conflicts')
+        self.assertIn('/hotspot', self.browser.contents)
+        self.browser.getControl('Reset').click()
+        self.assertNotIn('/hotspot', self.browser.contents)
+        self.assertIn('No conflicts recorded.', self.browser.contents)
+
+
+class TimingDtmlTests(ConfigTestBase,
+                      Testing.ZopeTestCase.FunctionalTestCase):
+    """Browser testing ..dtml.timing.dtml."""
+
+    def setUp(self):
+        super(TimingDtmlTests, self).setUp()
+        uf = self.app.acl_users
+        uf.userFolderAddUser('manager', 'manager_pass', ['Manager'], [])
+        self.browser = Testing.testbrowser.Browser()
+        self.browser.addHeader(
+            'Authorization',
+            'basic {}'.format(codecs.encode(
+                b'manager:manager_pass', 'base64').decode()))
+
+    def tearDown(self):
+        from ZPublisher.timing import timing_stats
+        timing_stats.clear()
+        super(TimingDtmlTests, self).tearDown()
+
+    def test_timing_dtml(self):
+        from ZPublisher.timing import RequestTiming
+        from ZPublisher.timing import timing_stats
+        self._makeConfig()
+        timing = RequestTiming()
+        timing.mark('traversal')
+        timing_stats.record(timing)
+        self.browser.open('http://localhost/Control_Panel/manage_timing')
+        self.assertIn('traversal', self.browser.contents)
+        self.browser.getControl('Reset').click()
+        self.assertNotIn('traversal', self.browser.contents)
+        self.assertIn('No requests timed.', self.browser.contents)
@@ -0,0 +1,35 @@
+import unittest
+
+
+class ParseHTTPDateTests(unittest.TestCase):
+
+    def _callFUT(self, value):
+        from App.Common import parse_http_date
+        return parse_http_date(value)
+
+    def test_formats(self):
+        # 784111777 is Sun, 06 Nov 1994 08:49:37 GMT
+        self.assertEqual(self._callFUT('Sun, 06 Nov 1994 08:49:37 GMT'),
+                         784111777)
+        self.assertEqual(self._callFUT('Sunday, 06-Nov-94 08:49:37 GMT'),
+                         784111777)
+        self.assertEqual(self._callFUT('Sun Nov  6 08:49:37 1994'),
+                         784111777)
+
+    def test_round_trip(self):
+        from App.Common import rfc1123_date
+        self.assertEqual(self._callFUT(rfc1123_date(1234567890)), 1234567890)
+
+    def test_invalid(self):
+        self.assertEqual(self._callFUT('garbage'), None)
+        self.assertEqual(self._callFUT(''), None)
+
+    def test_cached(self):
+        from App import Common
+        Common._http_dates.clear()
+        self._callFUT('Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertEqual(Common._http_dates,
+                         {'Sun, 06 Nov 1994 08:49:37 GMT': 784111777})
+        Common._http_dates['Sun, 06 Nov 1994 08:49:37 GMT'] = 42
+        self.assertEqual(self._callFUT('Sun, 06 Nov 1994 08:49:37 GMT'), 42)
+        Common._http_dates.clear()
@@ -0,0 +1,261 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""'Folder' storing its subobjects in BTrees.
+
+A Folder keeps its subobjects as attributes and lists them in `_objects`,
+a tuple rewritten whenever an object is added or removed.  For folders
+with many subobjects this makes every change expensive and lets
+concurrent changes conflict.  BTree folders keep their subobjects in an
+`OOBTree`, their ids per meta type in an index and their number in a
+`BTrees.Length`, so changes only touch a few buckets.
+"""
+
+from AccessControl import ClassSecurityInfo
+from AccessControl.class_init import InitializeClass
+from AccessControl.Permissions import access_contents_information
+from Acquisition import aq_base
+from App.special_dtml import DTMLFile
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from zope.interface import implementer
+
+from OFS.Folder import Folder
+from OFS.interfaces import IBTreeFolder
+from OFS.ObjectManager import ObjectManager
+from OFS.ObjectManager import _overrides
+
+_marker = []
+
+manage_addBTreeFolderForm = DTMLFile('dtml/addBTreeFolder', globals())
+
+
+def manage_addBTreeFolder(self, id, title='', REQUEST=None):
+    """Add a new BTree Folder object with id *id*.
+    """
+    ob = BTreeFolder(id)
+    ob.title = title
+    self._setObject(id, ob)
+    ob = self._getOb(id)
+    if REQUEST is not None:
+        return self.manage_main(self, REQUEST)
+
+
+class BTreeObjectManager(ObjectManager):
+
+    """Object manager storing its subobjects in BTrees.
+
+    Subobjects are kept in `_tree`, their ids per meta type in `_mt_index`
+    and their number in `_count`.  `_objects` stays empty.
+    """
+
+    security = ClassSecurityInfo()
+
+    _tree = None
+    _mt_index = None
+    _count = None
+
+    def __init__(self, id=None):
+        if id is not None:
+            self.id = str(id)
+        self._initBTrees()
+
+    def _initBTrees(self):
+        self._tree = OOBTree()
+        self._mt_index = OOBTree()
+        self._count = Length()
+
+    def _populateFromFolder(self, source):
+        """Move the subobjects of the ObjectManager `source` into self.
+
+        Events are not sent, the subobjects are not added or removed but
+        stored differently.
+        """
+        for id in source.objectIds():
+            self._setOb(id, aq_base(source._getOb(id)))
+
+    def __getattr__(self, name):
+        # Subobjects are accessible as attributes, just like in a Folder,
+        # so acquisition and attribute based traversal find them.
+        tree = self._tree
+        if tree is not None and name[:1] != '_':
+            ob = tree.get(name)
+            if ob is not None:
+                return ob
+        raise AttributeError(name)
+
+    def _setOb(self, id, object):
+        tree = self._tree
+        if id in tree:
+            self._delOb(id)
+        tree[id] = object
+        self._count.change(1)
+        meta_type = getattr(object, 'meta_type', None)
+        if meta_type is not None:
+            ids = self._mt_index.get(meta_type)
+            if ids is None:
+                ids = self._mt_index[meta_type] = OOTreeSet()
+            ids.insert(id)
+
+    def _delOb(self, id):
+        object = self._tree[id]
+        meta_type = getattr(object, 'meta_type', None)
+        ids = self._mt_index.get(meta_type) if meta_type is not None else None
+        if ids is not None and id in ids:
+            ids.remove(id)
+            if not ids:
+                del self._mt_index[meta_type]
+        del self._tree[id]
+        self._count.change(-1)
+
+    # ObjectManager's _setObject and _delObject store and remove their
+    # objects with these methods.
+
+    def _storeObjects(self, items):
+        for id, ob in items:
+            self._setOb(id, ob)
+
+    def _removeObjects(self, ids):
+        for id in ids:
+            self._delOb(id)
+
+    def _getOb(self, id, default=_marker):
+        ob = self._tree.get(id, _marker) if self._tree is not None else _marker
+        if ob is _marker:
+            if default is _marker:
+                raise AttributeError(id)
+            return default
+        if hasattr(ob, '__of__'):
+            return ob.__of__(self)
+        return ob
+
+    security.declareProtected(access_contents_information, 'hasObject')
+    def hasObject(self, id):
+        # Indicate whether the folder has an item by ID.
+        return self._tree is not None and id in self._tree
+
+    security.declareProtected(access_contents_information, 'objectIds')
+    def objectIds(self, spec=None):
+        # Returns a list of subobject ids of the current object, sorted
+        # by id.  If 'spec' is specified, returns objects whose meta_type
+        # matches 'spec'.
+        if spec is None:
+            return list(self._tree.keys())
+        if isinstance(spec, str):
+            spec = [spec]
+        ids = []
+        for meta_type in set(spec):
+            ids.extend(self._mt_index.get(meta_type, ()))
+        ids.sort()
+        return ids
+
+    security.declareProtected(access_contents_information, 'objectValues')
+    def objectValues(self, spec=None):
+        # Returns a list of actual subobjects of the current object.
+        # If 'spec' is specified, returns only objects whose meta_type
+        # match 'spec'.
+        if spec is not None:
+            return ObjectManager.objectValues(self, spec)
+        return [ob.__of__(self) if hasattr(ob, '__of__') else ob
+                for ob in self._tree.values()]
+
+    security.declareProtected(access_contents_information, 'objectItems')
+    def objectItems(self, spec=None):
+        # Returns a list of (id, subobject) tuples of the current object.
+        # If 'spec' is specified, returns only objects whose meta_type match
+        # 'spec'
+        if spec is not None:
+            return ObjectManager.objectItems(self, spec)
+        return [(id, ob.__of__(self) if hasattr(ob, '__of__') else ob)
+                for id, ob in self._tree.items()]
+
+    security.declareProtected(access_contents_information, 'iterObjectValues')
+    def iterObjectValues(self, spec=None):
+        # Returns an iterator over the subobjects of the current object,
+        # which are only loaded when reached.  If 'spec' is specified,
+        # iterates only over objects whose meta_type match 'spec'.
+        if _overrides(self, 'objectValues', BTreeObjectManager):
+            return iter(self.objectValues(spec))
+        ids = self.objectIds(spec)
+        return (self._getOb(id) for id in ids)
+
+    security.declareProtected(access_contents_information, 'iterObjectItems')
+    def iterObjectItems(self, spec=None):
+        # Returns an iterator over (id, subobject) tuples of the current
+        # object, loading the subobjects only when reached.  If 'spec' is
+        # specified, iterates only over objects whose meta_type match
+        # 'spec'.
+        if _overrides(self, 'objectItems', BTreeObjectManager):
+            return iter(self.objectItems(spec))
+        ids = self.objectIds(spec)
+        return ((id, self._getOb(id)) for id in ids)
+
+    def objectMap(self):
+        # Return a tuple of mappings containing subobject meta-data
+        meta_types = {}
+        for meta_type, ids in self._mt_index.items():
+            for id in ids:
+                meta_types[id] = meta_type
+        return tuple({'id': id, 'meta_type': meta_types.get(id)}
+                     for id in self._tree.keys())
+
+    security.declareProtected(access_contents_information, 'objectMap_d')
+    def objectMap_d(self, t=None):
+        n = getattr(self, '_reserved_names', ())
+        return [d for d in self.objectMap() if d['id'] not in n]
+
+    def __contains__(self, name):
+        return self._tree is not None and name in self._tree
+
+    def __iter__(self):
+        return iter(self._tree.keys())
+
+    def __len__(self):
+        return self._count()
+
+
+@implementer(IBTreeFolder)
+class BTreeFolder(BTreeObjectManager, Folder):
+
+    """Folder storing its subobjects in BTrees, for large folders.
+    """
+    meta_type = 'Folder (BTree)'
+    zmi_icon = 'fas fa-folder'
+
+    def __init__(self, id=None):
+        BTreeObjectManager.__init__(self, id)
+
+
+InitializeClass(BTreeFolder)
+
+
+def migrateFolder(container, id):
+    """Replace the folder `id` in `container` by an equivalent BTreeFolder.
+
+    The properties, local roles and other attributes of the folder as
+    well as its subobjects are moved over.  No events are sent, the
+    objects keep their identity and location.  Returns the new folder.
+    """
+    folder = aq_base(container._getOb(id))
+    if isinstance(folder, BTreeObjectManager):
+        return container._getOb(id)
+    child_ids = set(folder.objectIds())
+    new = BTreeFolder()
+    for name, value in folder.__dict__.items():
+        if name not in child_ids and name != '_objects':
+            new.__dict__[name] = value
+    new._p_changed = True
+    new._populateFromFolder(folder)
+    container._delObject(id, suppress_events=True)
+    container._setObject(id, new, set_owner=0, suppress_events=True)
+    return container._getOb(id)
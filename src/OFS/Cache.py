@@ -15,19 +15,20 @@
 
 from logging import getLogger
 import sys
-import time
+import threading
 
 from AccessControl.class_init import InitializeClass
 from AccessControl.Permissions import view_management_screens
 from AccessControl.SecurityInfo import ClassSecurityInfo
 from AccessControl.SecurityManagement import getSecurityManager
 from AccessControl.unauthorized import Unauthorized
-from Acquisition import aq_acquire
 from Acquisition import aq_base
 from Acquisition import aq_get
 from Acquisition import aq_inner
 from Acquisition import aq_parent
 from App.special_dtml import DTMLFile
+from ZODB.utils import u64
+from ZODB.utils import z64
 
 ZCM_MANAGERS = '__ZCacheManager_ids__'
 
@@ -75,10 +76,324 @@ def getVerifiedManagerIds(container):
     return tuple(rval)
 
 
-# Anytime a CacheManager is added or removed, all _v_ZCacheable_cache
-# attributes must be invalidated.  manager_timestamp is a way to do
-# that.
-manager_timestamp = 0
+class Dependencies(object):
+    '''The oids of the persistent objects a view was rendered from.
+
+    `snapshot` is the transaction id the connection reads the objects
+    before, None if it is not known.
+    '''
+
+    def __init__(self, db, snapshot):
+        self.db = db
+        self.snapshot = snapshot
+        self.oids = set()
+
+
+class _RecordingFrame(object):
+
+    def __init__(self, ob, jar, transaction, dependencies):
+        self.ob = ob
+        self.jar = jar
+        self.transaction = transaction
+        self.dependencies = dependencies
+        # The number of objects in the ring of the connection's cache
+        # when the recording started, and of the objects loaded since.
+        self.ring = jar._cache.ringlen()
+        self.loads = 0
+
+
+_recording = threading.local()
+
+
+def _frames(jar=None):
+    # The recording frames of the current transaction, of `jar` only if
+    # given.
+    return [frame for frame in getattr(_recording, 'frames', ())
+            if frame.transaction is frame.jar.transaction_manager.get() and
+            (jar is None or frame.jar is jar)]
+
+
+class _LoadHook(object):
+    # Replaces the setstate method of a connection while recording, so
+    # the objects loaded are recorded even if they leave the cache again.
+
+    def __init__(self, jar):
+        self.jar = jar
+        self.setstate = type(jar).setstate.__get__(jar)
+
+    def __call__(self, ob):
+        self.setstate(ob)
+        frames = _frames(self.jar)
+        if frames:
+            frames[-1].loads += 1
+            frames[-1].dependencies.oids.add(ob._p_oid)
+
+    @classmethod
+    def install(cls, jar):
+        if not isinstance(jar.__dict__.get('setstate'), cls):
+            jar.setstate = cls(jar)
+
+    @classmethod
+    def uninstall(cls, jar):
+        if isinstance(jar.__dict__.get('setstate'), cls):
+            del jar.setstate
+
+
+def _snapshot(jar):
+    # The id of the transaction the connection reads the objects before,
+    # None if the storage does not tell.  Views are not cached then.
+    return getattr(jar._storage, '_start', None)
+
+
+def _markAccess(jar):
+    # Move the root object of the database to the most recently used end
+    # of the ring of the connection's cache.  Objects accessed later are
+    # moved behind it.  Views do not access the root object directly,
+    # only the application object stored in it.
+    getattr(jar.get(z64), 'data', None)
+
+
+def _accessedSinceMark(jar):
+    oids = []
+    marked = False
+    for oid, ob in jar._cache.lru_items():
+        if marked:
+            oids.append(oid)
+        elif oid == z64:
+            marked = True
+    if not marked:
+        # The mark was removed from the cache, use all objects in it.
+        oids = [oid for oid, ob in jar._cache.lru_items()]
+    return oids
+
+
+def _collect(frame):
+    # Add the objects accessed since the mark to the dependencies of
+    # `frame`.  Objects which left the cache while recording, e.g. by
+    # deactivation or garbage collection, can not be found in it, if any
+    # did the dependencies are incomplete and the view is not cached.
+    frame.dependencies.oids.update(_accessedSinceMark(frame.jar))
+    if frame.jar._cache.ringlen() < frame.ring + frame.loads:
+        frame.dependencies.snapshot = None
+
+
+def startRecording(ob):
+    '''Start recording the persistent objects `ob` depends on.
+
+    The objects loaded or accessed until `stopRecording` is called for
+    `ob` in the same transaction are recorded.  Recordings may be nested,
+    the objects an inner recording depends on are added to the outer
+    ones.  Finding the objects takes time proportional to the size of
+    the ZODB cache.
+    '''
+    base = aq_base(ob)
+    jar = getattr(base, '_p_jar', None)
+    if jar is None:
+        return
+    transaction = jar.transaction_manager.get()
+    # Drop recordings left over from failed renderings.
+    for frame in getattr(_recording, 'frames', ()):
+        if frame.transaction is not frame.jar.transaction_manager.get():
+            _LoadHook.uninstall(frame.jar)
+    frames = _frames()
+    if frames and frames[-1].jar is jar:
+        _collect(frames[-1])
+    _markAccess(jar)
+    _LoadHook.install(jar)
+    frames.append(_RecordingFrame(
+        base, jar, transaction, Dependencies(jar.db(), _snapshot(jar))))
+    _recording.frames = frames
+
+
+def stopRecording(ob):
+    '''Stop recording the objects `ob` depends on.
+
+    Returns the `Dependencies` or None if no recording for `ob` was
+    started.  The snapshot of the dependencies is None if some objects
+    may have been missed.
+    '''
+    frames = getattr(_recording, 'frames', None)
+    if not frames:
+        return None
+    base = aq_base(ob)
+    for frame in reversed(frames):
+        if frame.ob is base:
+            break
+    else:
+        return None
+    jar = frame.jar
+    if frame.transaction is not jar.transaction_manager.get():
+        # Started in a previous transaction.
+        for frame in frames:
+            _LoadHook.uninstall(frame.jar)
+        del frames[:]
+        return None
+    dependencies = frame.dependencies
+    loads = 0
+    while True:
+        inner = frames.pop()
+        if inner is frame:
+            break
+        # Abandoned inner recordings rendered parts of this view.
+        dependencies.oids.update(inner.dependencies.oids)
+        loads += inner.loads
+    frame.loads += loads
+    _collect(frame)
+    outer = [f for f in frames if f.jar is jar]
+    if outer:
+        outer[-1].dependencies.oids.update(dependencies.oids)
+        outer[-1].loads += frame.loads
+        _markAccess(jar)
+    else:
+        _LoadHook.uninstall(jar)
+    return dependencies
+
+
+class DependencyIndex(object):
+    '''Index of cache entries by the persistent objects they depend on.
+
+    The index follows the invalidation streams of the databases: `poll`
+    returns the keys of the entries depending on objects which changed
+    since the last call.  Callers must serialize the access to the index.
+
+    Storages send the invalidations of a transaction while holding the
+    lock guarding their last transaction id, so the id read after the
+    invalidations were seen is never older than the changes.
+    '''
+
+    # The number of changed objects remembered to detect views rendered
+    # while the objects they depend on changed.
+    max_remembered = 100000
+
+    def __init__(self):
+        # db -> [storage instance, id of the last transaction not seen]
+        self._streams = {}
+        # (db, oid) -> keys of the entries depending on the object
+        self._keys = {}
+        # key -> (db, oid) of the objects the entry depends on
+        self._refs = {}
+        # (db, oid) -> last transaction id when the change was seen
+        self._invalidated = {}
+
+    def _stream(self, db):
+        stream = self._streams.get(db)
+        if stream is None:
+            instance = db._mvcc_storage.new_instance()
+            instance.poll_invalidations()
+            stream = self._streams[db] = [
+                instance, u64(db.lastTransaction())]
+        return stream
+
+    def poll(self, db):
+        '''Return the keys of the entries depending on objects in `db`
+        which changed since the last call.'''
+        stream = self._stream(db)
+        oids = stream[0].poll_invalidations()
+        tid = u64(db.lastTransaction())
+        if oids is None:
+            # The database could not tell which objects changed.
+            stream[1] = tid
+            return [key for key, refs in self._refs.items()
+                    if any(ref[0] is db for ref in refs)]
+        keys = set()
+        invalidated = self._invalidated
+        for oid in oids:
+            ref = (db, oid)
+            invalidated[ref] = tid
+            keys.update(self._keys.get(ref, ()))
+        if len(invalidated) > self.max_remembered:
+            invalidated.clear()
+            for stream in self._streams.values():
+                stream[1] = u64(stream[0].lastTransaction())
+        return keys
+
+    def add(self, key, dependencies):
+        '''Add the entry `key` depending on `dependencies`.
+
+        Return False if the entry may have been rendered from objects
+        which changed meanwhile, it must not be cached then.
+        '''
+        if dependencies.snapshot is None:
+            return False
+        db = dependencies.db
+        # The view saw the changes of the transactions before snapshot.
+        snapshot = u64(dependencies.snapshot)
+        if snapshot <= self._stream(db)[1]:
+            return False
+        refs = set((db, oid) for oid in dependencies.oids)
+        invalidated = self._invalidated
+        for ref in refs:
+            if snapshot <= invalidated.get(ref, 0):
+                return False
+        self._refs[key] = refs
+        for ref in refs:
+            self._keys.setdefault(ref, set()).add(key)
+        return True
+
+    def remove(self, key):
+        for ref in self._refs.pop(key, ()):
+            keys = self._keys.get(ref)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[ref]
+
+    def clear(self):
+        self._keys.clear()
+        self._refs.clear()
+
+    def close(self):
+        self.clear()
+        self._invalidated.clear()
+        for instance, since in self._streams.values():
+            instance.release()
+        self._streams.clear()
+
+
+def findManager(ob, manager_id):
+    '''Find the cache manager `manager_id` in the containers of `ob`.
+
+    Returns the manager and the containers searched, paired with their
+    lists of cache managers, or None and an empty tuple.
+    '''
+    searched = []
+    container = aq_inner(ob)
+    while container is not None:
+        base = aq_base(container)
+        ids = getattr(base, ZCM_MANAGERS, None)
+        searched.append((base, ids))
+        if ids and manager_id in ids:
+            # Look in the container only, a stale id must not acquire an
+            # object of a parent.
+            manager = aq_base(getattr(base, manager_id, None))
+            if getattr(manager, '_isCacheManager', 0):
+                return manager.__of__(container), tuple(searched)
+        container = aq_parent(container)
+    return None, ()
+
+
+def _searchedUnchanged(ob, searched):
+    # Whether the cache manager found for `ob` in the `searched`
+    # containers is still the one to use.  Adding or removing a cache
+    # manager replaces the list of cache managers of its container, in
+    # other processes once they see the change of the container.
+    container = aq_inner(ob)
+    for base, ids in searched:
+        if (container is None or aq_base(container) is not base or
+                getattr(base, ZCM_MANAGERS, None) is not ids):
+            return False
+        container = aq_parent(container)
+    return True
+
+
+def _markRepeatable(ob):
+    # The output of a cached view is likely to be sent again unchanged,
+    # so the response may keep the compressed variants of its body.
+    request = getattr(ob, 'REQUEST', None)
+    response = getattr(request, 'RESPONSE', None)
+    mark = getattr(response, 'markBodyRepeatable', None)
+    if mark is not None:
+        mark()
 
 
 class Cacheable(object):
@@ -98,7 +413,7 @@ class Cacheable(object):
     ZCacheable_manage = DTMLFile('dtml/cacheable', globals())
 
     _v_ZCacheable_cache = None
-    _v_ZCacheable_manager_timestamp = 0
+    _v_ZCacheable_searched = ()
     __manager_id = None
     __enabled = True
     _isCacheable = True
@@ -109,12 +424,7 @@ class Cacheable(object):
         manager_id = self.__manager_id
         if manager_id is None:
             return None
-        try:
-            return aq_acquire(
-                self, manager_id, containment=1,
-                filter=filterCacheManagers, extra=None, default=None)
-        except AttributeError:
-            return None
+        return findManager(self, manager_id)[0]
 
     security.declarePrivate('ZCacheable_getCache')
     def ZCacheable_getCache(self):
@@ -125,16 +435,16 @@ class Cacheable(object):
         c = self._v_ZCacheable_cache
         if c is not None:
             # We have a volatile reference to the cache.
-            if self._v_ZCacheable_manager_timestamp == manager_timestamp:
+            if _searchedUnchanged(self, self._v_ZCacheable_searched):
                 return aq_base(c)
-        manager = self.ZCacheable_getManager()
+        manager, searched = findManager(self, self.__manager_id)
         if manager is not None:
             c = aq_base(manager.ZCacheManager_getCache())
         else:
             return None
         # Set a volatile reference to the cache then return it.
         self._v_ZCacheable_cache = c
-        self._v_ZCacheable_manager_timestamp = manager_timestamp
+        self._v_ZCacheable_searched = searched
         return c
 
     security.declarePrivate('ZCacheable_isCachingEnabled')
@@ -163,10 +473,16 @@ class Cacheable(object):
             try:
                 val = c.ZCache_get(ob, view_name, keywords,
                                    mtime_func, default)
-                return val
             except:
                 LOG.warning('ZCache_get() exception')
                 return default
+            if val is not default:
+                _markRepeatable(ob)
+            if val is default and getattr(c, 'ZCache_tracksDependencies',
+                                          False):
+                # The view is rendered and passed to ZCacheable_set.
+                startRecording(ob)
+            return val
         return default
 
     security.declarePrivate('ZCacheable_set')
@@ -179,10 +495,19 @@ class Cacheable(object):
         if c is not None and self.__enabled:
             ob, view_name = self.ZCacheable_getObAndView(view_name)
             try:
-                c.ZCache_set(ob, data, view_name, keywords,
-                             mtime_func)
+                dependencies = None
+                if getattr(c, 'ZCache_tracksDependencies', False):
+                    dependencies = stopRecording(ob)
+                if dependencies is not None:
+                    c.ZCache_set(ob, data, view_name, keywords,
+                                 mtime_func, dependencies=dependencies)
+                else:
+                    c.ZCache_set(ob, data, view_name, keywords,
+                                 mtime_func)
             except:
                 LOG.warning('ZCache_set() exception')
+            else:
+                _markRepeatable(ob)
 
     security.declareProtected(ViewManagementScreensPermission,
                               'ZCacheable_invalidate')
@@ -326,10 +651,14 @@ def findCacheables(ob, manager_id, require_assoc, subfolders,
     "Find" function.  Finds all Cacheable objects in a hierarchy.
     '''
     try:
+        if hasattr(aq_base(ob), 'iterObjectValues'):
+            values = ob.iterObjectValues
+        else:
+            values = ob.objectValues
         if meta_types:
-            subobs = ob.objectValues(meta_types)
+            subobs = values(meta_types)
         else:
-            subobs = ob.objectValues()
+            subobs = values()
         sm = getSecurityManager()
 
         # Add to the list of cacheable objects.
@@ -353,8 +682,7 @@ def findCacheables(ob, manager_id, require_assoc, subfolders,
 
         # Visit subfolders.
         if subfolders:
-            if meta_types:
-                subobs = ob.objectValues()
+            subobs = values()
             for subob in subobs:
                 subpath = path + (subob.getId(),)
                 if hasattr(aq_base(subob), 'objectValues'):
@@ -400,6 +728,10 @@ class Cache(object):
 
     def ZCache_set(self, ob, data, view_name, keywords, mtime_func):
         # See ZCache_get() for parameter descriptions.
+        #
+        # Caches setting ZCache_tracksDependencies to a true value are
+        # passed the `Dependencies` of the view as keyword argument
+        # `dependencies`, if they were recorded.
         raise NotImplementedError
 
 
@@ -428,8 +760,6 @@ class CacheManager(object):
             id = self.getId()
             if id not in ids:
                 setattr(container, ZCM_MANAGERS, ids + (id,))
-                global manager_timestamp
-                manager_timestamp = time.time()
 
     def manage_beforeDelete(self, item, container):
         # Removes self from the list of cache managers.
@@ -440,10 +770,9 @@ class CacheManager(object):
                 manager_ids = [s for s in ids if s != id]
                 if manager_ids:
                     setattr(container, ZCM_MANAGERS, manager_ids)
-                elif getattr(aq_base(self), ZCM_MANAGERS, None) is not None:
-                    delattr(self, ZCM_MANAGERS)
-                global manager_timestamp
-                manager_timestamp = time.time()
+                elif getattr(aq_base(container), ZCM_MANAGERS,
+                             None) is not None:
+                    delattr(container, ZCM_MANAGERS)
 
     security.declareProtected(ChangeCacheSettingsPermission,
                               'ZCacheManager_associate')
@@ -162,7 +162,7 @@ class CopyContainer(Base):
             id = 'copy%s_of_%s' % (n and n + 1 or '', orig_id)
             n = n + 1
 
-    def _pasteObjects(self, cp, cb_maxsize=0):
+    def _pasteObjects(self, cp, cb_maxsize=0, coalesce_events=False):
         """Paste previously copied objects into the current object.
 
         ``cp`` is the list of objects for paste as encoded by ``_cb_encode``.
@@ -175,7 +175,9 @@ class CopyContainer(Base):
         huge object lists or zlib bombs.
 
         This method sends IObjectCopiedEvent and IObjectClonedEvent
-        or IObjectWillBeMovedEvent and IObjectMovedEvent.
+        or IObjectWillBeMovedEvent and IObjectMovedEvent.  The containers
+        get an IContainerModifiedEvent per pasted object, or only once
+        if ``coalesce_events`` is true.
 
         Returns tuple of (operator, list of {'id': orig_id, 'new_id': new_id}).
         Where `operator` is 0 for a copy operation and 1 for a move operation.
@@ -202,6 +204,9 @@ class CopyContainer(Base):
             oblist.append(ob)
 
         result = []
+        pending = []
+        # The ids of the objects in `pending`.
+        pending_ids = set()
         if op == 0:
             # Copy operation
             for ob in oblist:
@@ -217,22 +222,22 @@ class CopyContainer(Base):
                     raise CopyError('Copy Error')
 
                 id = self._get_id(orig_id)
+                if id in pending_ids:
+                    # The id is taken by a copy not added yet.
+                    self._pasteCopies(pending, coalesce_events)
+                    pending = []
+                    pending_ids.clear()
+                    id = self._get_id(orig_id)
                 result.append({'id': orig_id, 'new_id': id})
 
                 orig_ob = ob
                 ob = ob._getCopy(self)
                 ob._setId(id)
                 notify(ObjectCopiedEvent(ob, orig_ob))
+                pending.append((id, ob))
+                pending_ids.add(id)
 
-                self._setObject(id, ob)
-                ob = self._getOb(id)
-                ob.wl_clearLocks()
-
-                ob._postCopy(self, op=0)
-
-                compatibilityCall('manage_afterClone', ob, ob)
-
-                notify(ObjectClonedEvent(ob))
+            self._pasteCopies(pending, coalesce_events)
 
         elif op == 1:
             # Move operation
@@ -256,6 +261,12 @@ class CopyContainer(Base):
                     id = orig_id
                 else:
                     id = self._get_id(orig_id)
+                    if id in pending_ids:
+                        # The id is taken by an object not moved yet.
+                        self._pasteMoves(pending, coalesce_events)
+                        pending = []
+                        pending_ids.clear()
+                        id = self._get_id(orig_id)
                 result.append({'id': orig_id, 'new_id': id})
 
                 notify(ObjectWillBeMovedEvent(ob, orig_container, orig_id,
@@ -264,7 +275,56 @@ class CopyContainer(Base):
                 # try to make ownership explicit so that it gets carried
                 # along to the new location if needed.
                 ob.manage_changeOwnershipType(explicit=1)
+                pending.append((ob, id, orig_container, orig_id))
+                pending_ids.add(id)
+
+            self._pasteMoves(pending, coalesce_events)
 
+        return op, result
+
+    def _pasteCopies(self, copies, coalesce_events=False):
+        # Add the (id, copy) pairs `copies`, all at once if supported.
+        from OFS.ObjectManager import _bulkMethod
+        setObjects = _bulkMethod(self, '_setObjects', '_setObject')
+        if setObjects is not None:
+            setObjects(copies, coalesce_events=coalesce_events)
+        else:
+            for id, ob in copies:
+                self._setObject(id, ob)
+
+        for id, ob in copies:
+            ob = self._getOb(id)
+            ob.wl_clearLocks()
+
+            ob._postCopy(self, op=0)
+
+            compatibilityCall('manage_afterClone', ob, ob)
+
+            notify(ObjectClonedEvent(ob))
+
+    def _pasteMoves(self, moves, coalesce_events=False):
+        # Move the objects of `moves`, a list of (object, id, original
+        # container, original id) tuples, removing them from and adding
+        # them to each container at once if supported.  The containers
+        # get an IContainerModifiedEvent per object, or only once if
+        # `coalesce_events` is true.
+        from OFS.ObjectManager import _bulkMethod
+        containers = []
+        removed = {}
+        for ob, new_id, orig_container, orig_id in moves:
+            ids = removed.get(id(aq_base(orig_container)))
+            if ids is None:
+                ids = removed[id(aq_base(orig_container))] = []
+                containers.append((orig_container, ids))
+            ids.append(orig_id)
+
+        for orig_container, ids in containers:
+            delObjects = _bulkMethod(orig_container, '_delObjects',
+                                     '_delObject')
+            if delObjects is not None:
+                delObjects(ids, suppress_events=True)
+                continue
+            for orig_id in ids:
                 try:
                     orig_container._delObject(orig_id, suppress_events=True)
                 except TypeError:
@@ -273,28 +333,46 @@ class CopyContainer(Base):
                         "%s._delObject without suppress_events is discouraged."
                         % orig_container.__class__.__name__,
                         DeprecationWarning)
-                ob = aq_base(ob)
-                ob._setId(id)
 
+        added = []
+        for ob, new_id, orig_container, orig_id in moves:
+            ob = aq_base(ob)
+            ob._setId(new_id)
+            added.append((new_id, ob))
+
+        setObjects = _bulkMethod(self, '_setObjects', '_setObject')
+        if setObjects is not None:
+            setObjects(added, set_owner=0, suppress_events=True)
+        else:
+            for new_id, ob in added:
                 try:
-                    self._setObject(id, ob, set_owner=0, suppress_events=True)
+                    self._setObject(new_id, ob, set_owner=0,
+                                    suppress_events=True)
                 except TypeError:
-                    self._setObject(id, ob, set_owner=0)
+                    self._setObject(new_id, ob, set_owner=0)
                     warnings.warn(
                         "%s._setObject without suppress_events is discouraged."
                         % self.__class__.__name__, DeprecationWarning)
-                ob = self._getOb(id)
 
-                notify(ObjectMovedEvent(ob, orig_container, orig_id, self, id))
+        for ob, new_id, orig_container, orig_id in moves:
+            ob = self._getOb(new_id)
+
+            notify(ObjectMovedEvent(ob, orig_container, orig_id, self,
+                                    new_id))
+            if not coalesce_events:
                 notifyContainerModified(orig_container)
                 if aq_base(orig_container) is not aq_base(self):
                     notifyContainerModified(self)
 
-                ob._postCopy(self, op=1)
-                # try to make ownership implicit if possible
-                ob.manage_changeOwnershipType(explicit=0)
+            ob._postCopy(self, op=1)
+            # try to make ownership implicit if possible
+            ob.manage_changeOwnershipType(explicit=0)
 
-        return op, result
+        if coalesce_events:
+            for orig_container, ids in containers:
+                notifyContainerModified(orig_container)
+            if id(aq_base(self)) not in removed or len(containers) > 1:
+                notifyContainerModified(self)
 
     security.declareProtected(view_management_screens, 'manage_pasteObjects')
     def manage_pasteObjects(self, cb_copy_data=None, REQUEST=None):
@@ -24,10 +24,19 @@ from DocumentTemplate.DT_Util import InstanceDict
 from DocumentTemplate.DT_Util import TemplateDict
 from DocumentTemplate.security import RestrictedDTML
 from ExtensionClass import Base
+from six import string_types
 from zope.interface import implementer
 
 from OFS.interfaces import IFindSupport
 
+# The number of objects loaded by iterZopeFind which are deactivated
+# together.
+deactivate_batch = 100
+
+# The number of objects ZopeFindPage looks at before returning a page,
+# even if it holds less than the requested number of results.
+find_scan_limit = 10000
+
 
 @implementer(IFindSupport)
 class FindSupport(Base):
@@ -95,7 +104,10 @@ class FindSupport(Base):
         if not hasattr(base, 'objectItems'):
             return result
         try:
-            items = obj.objectItems()
+            if hasattr(base, 'iterObjectItems'):
+                items = obj.iterObjectItems()
+            else:
+                items = obj.objectItems()
         except Exception:
             return result
 
@@ -148,9 +160,205 @@ class FindSupport(Base):
 
         return result
 
+    security.declareProtected(view_management_screens, 'iterZopeFind')
+    def iterZopeFind(self, obj, obj_ids=None, obj_metatypes=None,
+                     obj_searchterm=None, obj_expr=None,
+                     obj_mtime=None, obj_mspec=None,
+                     obj_permission=None, obj_roles=None,
+                     search_sub=0, cursor=None, prefilter=False):
+        """Generate the (path, object) pairs found, depth first.
+
+        The search continues after the object at path `cursor`.  With
+        `prefilter` the meta types recorded by the containers are used
+        to skip objects without loading them.
+        """
+        for path, ob, found in self._iterFind(
+                obj, obj_ids, obj_metatypes, obj_searchterm, obj_expr,
+                obj_mtime, obj_mspec, obj_permission, obj_roles,
+                search_sub, cursor, prefilter):
+            if found:
+                yield path, ob
+
+    security.declareProtected(view_management_screens, 'ZopeFindPage')
+    def ZopeFindPage(self, obj, obj_ids=None, obj_metatypes=None,
+                     obj_searchterm=None, obj_expr=None,
+                     obj_mtime=None, obj_mspec=None,
+                     obj_permission=None, obj_roles=None,
+                     search_sub=0, cursor=None, size=20, prefilter=True):
+        """Return a page of at most `size` results of a search.
+
+        The page is a mapping with the list of (path, object) pairs
+        found and the cursor to pass for the next page, None after the
+        last page.
+        """
+        size = int(size)
+        results = []
+        scanned = 0
+        path = None
+        items = self._iterFind(
+            obj, obj_ids, obj_metatypes, obj_searchterm, obj_expr,
+            obj_mtime, obj_mspec, obj_permission, obj_roles,
+            search_sub, cursor, prefilter)
+        try:
+            for path, ob, found in items:
+                if found:
+                    results.append((path, ob))
+                scanned += 1
+                if len(results) >= size or scanned >= find_scan_limit:
+                    break
+            else:
+                path = None
+        finally:
+            items.close()
+        return {'results': results, 'cursor': path}
+
+    def _iterFind(self, obj, obj_ids, obj_metatypes, obj_searchterm,
+                  obj_expr, obj_mtime, obj_mspec, obj_permission, obj_roles,
+                  search_sub, cursor, prefilter):
+        # Generate (path, object, found) for the objects looked at.  The
+        # object is None for objects skipped without loading them.
+        if obj_metatypes and 'all' in obj_metatypes:
+            obj_metatypes = None
+
+        if obj_mtime and isinstance(obj_mtime, str):
+            obj_mtime = DateTime(obj_mtime).timeTime()
+
+        if obj_permission:
+            obj_permission = getPermissionIdentifier(obj_permission)
+
+        if obj_roles and isinstance(obj_roles, str):
+            obj_roles = [obj_roles]
+
+        if obj_expr:
+            md = td()
+            obj_expr = (Eval(obj_expr), md, md._push, md._pop)
+
+        criteria = (obj_ids, obj_metatypes, obj_searchterm, obj_expr,
+                    obj_mtime, obj_mspec, obj_permission, obj_roles)
+        if isinstance(cursor, string_types):
+            cursor = [id for id in cursor.split('/') if id]
+        loaded = []
+        try:
+            for item in _walk(obj, criteria, search_sub, cursor or (),
+                              prefilter, '', loaded):
+                yield item
+        finally:
+            _deactivate(loaded)
+
 InitializeClass(FindSupport)
 
 
+def _walk(obj, criteria, search_sub, cursor, prefilter, pre, loaded):
+    # Look at the subobjects of obj depth first, continuing after the
+    # path cursor.  Objects loaded for the search are appended to loaded
+    # once their subobjects were searched.
+    (obj_ids, obj_metatypes, obj_searchterm, obj_expr,
+     obj_mtime, obj_mspec, obj_permission, obj_roles) = criteria
+    base = aq_base(obj)
+    items = _items(obj)
+    if items is None:
+        return
+
+    meta_types = {}
+    if prefilter and obj_metatypes:
+        # The meta types recorded by object managers.
+        for info in getattr(base, '_objects', ()):
+            meta_types[info['id']] = info.get('meta_type')
+
+    resume = None
+    if cursor:
+        for id, ob in items:
+            if id == cursor[0]:
+                resume = (id, ob)
+                break
+        else:
+            # The object at the cursor is gone, search the container
+            # again from the start.
+            items = _items(obj)
+
+    if resume is not None:
+        # The object at the cursor was looked at, its subobjects may not.
+        id, ob = resume
+        if search_sub or len(cursor) > 1:
+            p = "%s/%s" % (pre, id) if pre else id
+            for item in _walk(ob, criteria, search_sub, cursor[1:],
+                              prefilter, p, loaded):
+                yield item
+
+    for id, ob in items:
+        if pre:
+            p = "%s/%s" % (pre, id)
+        else:
+            p = id
+
+        bs = aq_base(ob)
+        if prefilter:
+            # Skip the objects which do not match by id or recorded meta
+            # type without loading them, unless they are to be searched.
+            if ((obj_ids and id not in obj_ids) or
+                    (obj_metatypes and id in meta_types and
+                     meta_types[id] not in obj_metatypes)):
+                if not (search_sub and hasattr(type(bs), 'objectItems')):
+                    yield p, None, False
+                    continue
+
+        dflag = getattr(bs, '_p_changed', 0) is None
+
+        if ((not obj_ids or absattr(bs.getId()) in obj_ids) and
+            (not obj_metatypes or (hasattr(bs, 'meta_type') and
+             bs.meta_type in obj_metatypes)) and
+            (not obj_mtime or mtime_match(ob, obj_mtime, obj_mspec)) and
+            ((not obj_permission or not obj_roles) or
+             role_match(ob, obj_permission, obj_roles)) and
+            (not obj_searchterm or
+             (hasattr(ob, 'PrincipiaSearchSource') and
+              obj_searchterm in ob.PrincipiaSearchSource()) or
+             (hasattr(ob, 'SearchableText') and
+              obj_searchterm in ob.SearchableText())
+             ) and
+                (not obj_expr or expr_match(ob, obj_expr))):
+            yield p, ob, True
+            dflag = False
+        else:
+            yield p, ob, False
+
+        if search_sub and hasattr(bs, 'objectItems'):
+            for item in _walk(ob, criteria, search_sub, (), prefilter, p,
+                              loaded):
+                yield item
+
+        if dflag:
+            loaded.append(ob)
+            if len(loaded) >= deactivate_batch:
+                _deactivate(loaded)
+
+
+def _items(obj):
+    # An iterator over the (id, subobject) pairs of obj, None if it has
+    # none.
+    base = aq_base(obj)
+    if not hasattr(base, 'objectItems'):
+        return None
+    try:
+        if hasattr(base, 'iterObjectItems'):
+            return iter(obj.iterObjectItems())
+        return iter(obj.objectItems())
+    except Exception:
+        return None
+
+
+def _deactivate(obs):
+    # Turn the objects loaded by a search into ghosts again, so a search
+    # through many objects does not fill the ZODB cache.
+    jar = None
+    for ob in obs:
+        ob._p_deactivate()
+        jar = ob._p_jar
+    del obs[:]
+    if jar is not None:
+        jar.cacheGC()
+
+
 class td(RestrictedDTML, TemplateDict):
     pass
 
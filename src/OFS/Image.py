@@ -15,7 +15,9 @@
 
 from email.generator import _make_boundary
 from io import BytesIO
+import hashlib
 import struct
+import tempfile
 
 from AccessControl.class_init import InitializeClass
 from AccessControl.Permissions import change_images_and_files
@@ -23,8 +25,9 @@ from AccessControl.Permissions import view_management_screens
 from AccessControl.Permissions import view as View  # NOQA
 from AccessControl.Permissions import ftp_access
 from AccessControl.SecurityInfo import ClassSecurityInfo
+from Acquisition import aq_base
 from Acquisition import Implicit
-from DateTime.DateTime import DateTime
+from BTrees.LOBTree import LOBTree
 from Persistence import Persistent
 from six import binary_type
 from six import PY2
@@ -35,7 +38,11 @@ from zope.event import notify
 from zope.interface import implementer
 from zope.lifecycleevent import ObjectCreatedEvent
 from zope.lifecycleevent import ObjectModifiedEvent
+from ZODB.blob import Blob
+from ZODB.interfaces import BlobError
+from ZODB.interfaces import IBlobStorage
 
+from App.Common import parse_http_date
 from App.Common import rfc1123_date
 from App.special_dtml import DTMLFile
 from OFS import bbb
@@ -46,6 +53,9 @@ from OFS.role import RoleManager
 from OFS.SimpleItem import Item_w__name__
 from ZPublisher import HTTPRangeSupport
 from ZPublisher.HTTPRequest import FileUpload
+from ZPublisher.Iterators import byteranges_iterator
+from ZPublisher.Iterators import filestream_iterator
+from ZPublisher.Iterators import filestream_range_iterator
 import ZPublisher.HTTPRequest
 
 try:
@@ -54,6 +64,19 @@ except ImportError:  # PY2
     from cgi import escape
 
 
+# The ZConfig machinery may set these attributes on initialization.
+# Large files are stored in a chain of Pdata objects of this size.
+pdata_chunk_size = 1 << 16
+# The number of Pdata objects written to the database per savepoint while
+# a large file is stored.
+pdata_savepoint_chunks = 16
+# Store large files in ZODB blobs instead of Pdata chains, if the storage
+# supports blobs.
+blob_storage = False
+# Requests for more byte ranges than this, after merging overlapping ones,
+# are answered with the whole file.  0 means no limit.
+max_ranges = 100
+
 manage_addFileForm = DTMLFile(
     'dtml/imageAdd', globals(), Kind='File', kind='file')
 
@@ -106,6 +129,13 @@ class File(Persistent, Implicit, PropertyManager,
     precondition = ''
     size = None
 
+    # A tuple of the first link of the Pdata chain in `data` and an
+    # LOBTree mapping the start offset of each link to the link.
+    _pdata_index = None
+
+    # The MD5 digest of the data, the ETag is derived from it.
+    _content_digest = None
+
     manage_editForm = DTMLFile('dtml/fileEdit', globals(),
                                Kind='File', kind='file')
     manage_editForm._setName('manage_editForm')
@@ -140,6 +170,24 @@ class File(Persistent, Implicit, PropertyManager,
         content_type = self._get_content_type(file, data, id, content_type)
         self.update_data(data, content_type, size)
 
+    def _if_none_match_request_handler(self, REQUEST, RESPONSE):
+        # HTTP If-None-Match header handling: return True if we can
+        # handle this request by returning a 304 response, False if the
+        # ETag of the data does not match, and None without the header.
+        header = REQUEST.get_header('If-None-Match', None)
+        if header is None:
+            return None
+        etag = self.http__etag(readonly=1)
+        for tag in header.split(','):
+            tag = tag.strip()
+            if tag[:2] == 'W/':
+                # Weak comparison suffices for If-None-Match.
+                tag = tag[2:]
+            if tag == '*' or (etag is not None and tag == '"%s"' % etag):
+                self._not_modified(RESPONSE)
+                return True
+        return False
+
     def _if_modified_since_request_handler(self, REQUEST, RESPONSE):
         # HTTP If-Modified-Since header handling: return True if
         # we can handle this request by returning a 304 response
@@ -154,23 +202,25 @@ class File(Persistent, Implicit, PropertyManager,
             # of the way they parse it).
             # This happens to be what RFC2616 tells us to do in the face of an
             # invalid date.
-            try:
-                mod_since = int(DateTime(header).timeTime())
-            except Exception:
-                mod_since = None
+            mod_since = parse_http_date(header)
             if mod_since is not None:
                 if self._p_mtime:
                     last_mod = int(self._p_mtime)
                 else:
                     last_mod = 0
                 if last_mod > 0 and last_mod <= mod_since:
-                    RESPONSE.setHeader('Last-Modified',
-                                       rfc1123_date(self._p_mtime))
-                    RESPONSE.setHeader('Content-Type', self.content_type)
-                    RESPONSE.setHeader('Accept-Ranges', 'bytes')
-                    RESPONSE.setStatus(304)
+                    self._not_modified(RESPONSE)
                     return True
 
+    def _not_modified(self, RESPONSE):
+        RESPONSE.setHeader('Last-Modified', rfc1123_date(self._p_mtime))
+        RESPONSE.setHeader('Content-Type', self.content_type)
+        RESPONSE.setHeader('Accept-Ranges', 'bytes')
+        etag = self.http__etag(readonly=1)
+        if etag:
+            RESPONSE.setHeader('ETag', '"%s"' % etag)
+        RESPONSE.setStatus(304)
+
     def _range_request_handler(self, REQUEST, RESPONSE):
         # HTTP Range header handling: return True if we've served a range
         # chunk out of our data.
@@ -181,13 +231,21 @@ class File(Persistent, Implicit, PropertyManager,
             # Later on, we need to serve a different mime-type as well.
             range = request_range
         if_range = REQUEST.get_header('If-Range', None)
+        if_range_etag = False
+        if if_range is not None and if_range.startswith(('"', 'W/"')):
+            # The ETag header sent by index_html is quoted, and weak for
+            # compressed responses.  Weak ETags never match If-Range.
+            if if_range.startswith('"'):
+                if_range = if_range.strip('"')
+            if_range_etag = True
         if range is not None:
             ranges = HTTPRangeSupport.parseRange(range)
 
             if if_range is not None:
                 # Only send ranges if the data isn't modified, otherwise send
                 # the whole object. Support both ETags and Last-Modified dates!
-                if len(if_range) > 1 and if_range[:2] == 'ts':
+                if if_range_etag or if_range[:2] == 'ts' or \
+                        if_range[:4] == 'md5-':
                     # ETag:
                     if if_range != self.http__etag():
                         # Modified, so send a normal response. We delete
@@ -197,10 +255,7 @@ class File(Persistent, Implicit, PropertyManager,
                 else:
                     # Date
                     date = if_range.split(';')[0]
-                    try:
-                        mod_since = int(DateTime(date).timeTime())
-                    except Exception:
-                        mod_since = None
+                    mod_since = parse_http_date(date)
                     if mod_since is not None:
                         if self._p_mtime:
                             last_mod = int(self._p_mtime)
@@ -232,6 +287,10 @@ class File(Persistent, Implicit, PropertyManager,
                     return True
 
                 ranges = HTTPRangeSupport.expandRanges(ranges, self.size)
+                ranges = HTTPRangeSupport.coalesceRanges(ranges)
+                if max_ranges and len(ranges) > max_ranges:
+                    # Send the whole file instead of a multitude of parts.
+                    return None
 
                 if len(ranges) == 1:
                     # Easy case, set extra header and return partial set.
@@ -249,40 +308,38 @@ class File(Persistent, Implicit, PropertyManager,
                     RESPONSE.setStatus(206)  # Partial content
 
                     data = self.data
-                    if isinstance(data, binary_type):
-                        RESPONSE.write(data[start:end])
-                        return True
-
-                    # Linked Pdata objects. Urgh.
-                    pos = 0
-                    while data is not None:
-                        l = len(data.data)
-                        pos = pos + l
-                        if pos > start:
-                            # We are within the range
-                            lstart = l - (pos - start)
-
-                            if lstart < 0:
-                                lstart = 0
-
-                            # find the endpoint
-                            if end <= pos:
-                                lend = l - (pos - end)
-
-                                # Send and end transmission
-                                RESPONSE.write(data[lstart:lend])
-                                break
-
-                            # Not yet at the end, transmit what we have.
-                            RESPONSE.write(data[lstart:])
-
-                        data = data.next
-
+                    if isinstance(data, BlobData):
+                        filename = data.committed()
+                        if filename is not None:
+                            return filestream_range_iterator(
+                                filename, start, end)
+                    self._write_range(RESPONSE, start, end)
                     return True
 
                 else:
                     boundary = _make_boundary()
 
+                    # Some clients implement an earlier draft of the spec, they
+                    # will only accept x-byteranges.
+                    draftprefix = (request_range is not None) and 'x-' or ''
+
+                    stream = self._open_stream()
+                    if stream is not None:
+                        # The parts are produced while the body is sent.
+                        body = byteranges_iterator(
+                            stream, ranges, boundary, self.content_type,
+                            self.size)
+                        RESPONSE.setHeader('Content-Length', len(body))
+                        RESPONSE.setHeader('Accept-Ranges', 'bytes')
+                        RESPONSE.setHeader(
+                            'Last-Modified', rfc1123_date(self._p_mtime))
+                        RESPONSE.setHeader(
+                            'Content-Type',
+                            'multipart/%sbyteranges; boundary=%s' % (
+                                draftprefix, boundary))
+                        RESPONSE.setStatus(206)  # Partial content
+                        return body
+
                     # Calculate the content length
                     size = (8 + len(boundary) +  # End marker length
                             len(ranges) * (  # Constant lenght per set
@@ -293,10 +350,6 @@ class File(Persistent, Implicit, PropertyManager,
                         size = (size + len('%d%d' % (start, end - 1)) +
                                 end - start)
 
-                    # Some clients implement an earlier draft of the spec, they
-                    # will only accept x-byteranges.
-                    draftprefix = (request_range is not None) and 'x-' or ''
-
                     RESPONSE.setHeader('Content-Length', size)
                     RESPONSE.setHeader('Accept-Ranges', 'bytes')
                     RESPONSE.setHeader(
@@ -307,11 +360,9 @@ class File(Persistent, Implicit, PropertyManager,
                             draftprefix, boundary))
                     RESPONSE.setStatus(206)  # Partial content
 
-                    data = self.data
-                    # The Pdata map allows us to jump into the Pdata chain
-                    # arbitrarily during out-of-order range searching.
-                    pdata_map = {}
-                    pdata_map[0] = data
+                    # Links of the Pdata chain seen while serving the
+                    # ranges, for files without an index of the chain.
+                    links = {}
 
                     for start, end in ranges:
                         RESPONSE.write(
@@ -327,60 +378,109 @@ class File(Persistent, Implicit, PropertyManager,
                             b'/' +
                             str(self.size).encode('ascii') +
                             b'\r\n\r\n')
-
-                        if isinstance(data, binary_type):
-                            RESPONSE.write(data[start:end])
-
-                        else:
-                            # Yippee. Linked Pdata objects. The following
-                            # calculations allow us to fast-forward through the
-                            # Pdata chain without a lot of dereferencing if we
-                            # did the work already.
-                            first_size = len(pdata_map[0].data)
-                            if start < first_size:
-                                closest_pos = 0
-                            else:
-                                closest_pos = (
-                                    ((start - first_size) >> 16 << 16) +
-                                    first_size)
-                            pos = min(closest_pos, max(pdata_map.keys()))
-                            data = pdata_map[pos]
-
-                            while data is not None:
-                                l = len(data.data)
-                                pos = pos + l
-                                if pos > start:
-                                    # We are within the range
-                                    lstart = l - (pos - start)
-
-                                    if lstart < 0:
-                                        lstart = 0
-
-                                    # find the endpoint
-                                    if end <= pos:
-                                        lend = l - (pos - end)
-
-                                        # Send and loop to next range
-                                        RESPONSE.write(data[lstart:lend])
-                                        break
-
-                                    # Not yet at the end,
-                                    # transmit what we have.
-                                    RESPONSE.write(data[lstart:])
-
-                                data = data.next
-                                # Store a reference to a Pdata chain link
-                                # so we don't have to deref during
-                                # this request again.
-                                pdata_map[pos] = data
+                        self._write_range(RESPONSE, start, end, links)
 
                     # Do not keep the link references around.
-                    del pdata_map
+                    del links
 
                     RESPONSE.write(
                         b'\r\n--' + boundary.encode('ascii') + b'--\r\n')
                     return True
 
+    def _open_stream(self):
+        # Return a file object with the data, if it can be read after the
+        # database connection is closed: bytes and committed blobs.
+        data = self.data
+        if isinstance(data, bytes):
+            return BytesIO(data)
+        if isinstance(data, BlobData):
+            filename = data.committed()
+            if filename is not None:
+                return open(filename, 'rb')
+        return None
+
+    def _pdata_seek(self, start, links=None):
+        # Return the start offset and the link of the Pdata chain in
+        # `data` holding the byte at `start`, using the index of the chain.
+        # Without an index, the chain is searched from the closest link in
+        # `links`, a mapping of offsets to links seen before.
+        data = self.data
+        index = self._pdata_index
+        if index is not None and index[0] is aq_base(data):
+            try:
+                pos = index[1].maxKey(start)
+            except ValueError:
+                return 0, data
+            return pos, index[1][pos]
+        if links:
+            seen = [pos for pos in links if pos <= start]
+            if seen:
+                pos = max(seen)
+                return pos, links[pos]
+        return 0, data
+
+    def _write_range(self, RESPONSE, start, end, links=None):
+        # Write the bytes from `start` up to `end` of the data.
+        data = self.data
+        if isinstance(data, binary_type):
+            RESPONSE.write(data[start:end])
+            return
+
+        if isinstance(data, BlobData):
+            for chunk in data.chunks(start, end):
+                RESPONSE.write(chunk)
+            return
+
+        pos, data = self._pdata_seek(start, links)
+        while data is not None:
+            size = len(data.data)
+            if pos + size > start:
+                # We are within the range
+                lstart = max(start - pos, 0)
+                if end <= pos + size:
+                    # Send and end transmission
+                    RESPONSE.write(data[lstart:end - pos])
+                    break
+                # Not yet at the end, transmit what we have.
+                RESPONSE.write(data[lstart:])
+            pos = pos + size
+            data = data.next
+            if links is not None and data is not None:
+                links[pos] = data
+
+    def _set_content_digest(self, data):
+        # Use the digest of `data` computed by _read_data, if it read it.
+        pending = getattr(self, '_v_content_digest', None)
+        self._v_content_digest = None
+        if pending is not None and pending[0] is aq_base(data):
+            self._content_digest = pending[1]
+            return
+        md5 = hashlib.md5()
+        if isinstance(data, bytes):
+            md5.update(data)
+        else:
+            for chunk in data.chunks():
+                md5.update(chunk)
+        self._content_digest = md5.hexdigest()
+
+    def http__etag(self, readonly=0):
+        # The ETag is derived from the content.  Files stored before
+        # content digests were kept have an ETag based on a timestamp.
+        digest = self._content_digest
+        if digest is not None:
+            return 'md5-' + digest
+        return super(File, self).http__etag(readonly)
+
+    def _set_pdata_index(self, data):
+        # Keep the index of the Pdata chain built by _read_data if `data`
+        # is that chain, otherwise drop the index of the former data.
+        pending = getattr(self, '_v_pdata_index', None)
+        self._v_pdata_index = None
+        if pending is not None and pending[0] is aq_base(data):
+            self._pdata_index = pending
+        elif self._pdata_index is not None:
+            self._pdata_index = None
+
     security.declareProtected(View, 'index_html')
     def index_html(self, REQUEST, RESPONSE):
         """
@@ -390,7 +490,12 @@ class File(Persistent, Implicit, PropertyManager,
         Content-Type HTTP header to the objects content type.
         """
 
-        if self._if_modified_since_request_handler(REQUEST, RESPONSE):
+        # If-None-Match takes precedence over If-Modified-Since.
+        not_modified = self._if_none_match_request_handler(REQUEST, RESPONSE)
+        if not_modified is None:
+            not_modified = self._if_modified_since_request_handler(
+                REQUEST, RESPONSE)
+        if not_modified:
             # we were able to handle this by returning a 304
             # unfortunately, because the HTTP cache manager uses the cache
             # API, and because 304 responses are required to carry the Expires
@@ -410,14 +515,19 @@ class File(Persistent, Implicit, PropertyManager,
             else:
                 c()
 
-        if self._range_request_handler(REQUEST, RESPONSE):
-            # we served a chunk of content in response to a range request.
-            return b''
+        handled = self._range_request_handler(REQUEST, RESPONSE)
+        if handled:
+            # we served a chunk of content in response to a range request,
+            # or return an iterator serving it from a blob.
+            return b'' if handled is True else handled
 
         RESPONSE.setHeader('Last-Modified', rfc1123_date(self._p_mtime))
         RESPONSE.setHeader('Content-Type', self.content_type)
         RESPONSE.setHeader('Content-Length', self.size)
         RESPONSE.setHeader('Accept-Ranges', 'bytes')
+        etag = self.http__etag(readonly=1)
+        if etag:
+            RESPONSE.setHeader('ETag', '"%s"' % etag)
 
         if self.ZCacheable_isCachingEnabled():
             result = self.ZCacheable_get(default=None)
@@ -435,9 +545,14 @@ class File(Persistent, Implicit, PropertyManager,
             RESPONSE.setBase(None)
             return data
 
-        while data is not None:
-            RESPONSE.write(data.data)
-            data = data.next
+        if isinstance(data, BlobData):
+            filename = data.committed()
+            if filename is not None:
+                # The server may send the file without reading it in Python.
+                return filestream_iterator(filename, 'rb')
+
+        for chunk in data.chunks():
+            RESPONSE.write(chunk)
 
         return b''
 
@@ -467,6 +582,8 @@ class File(Persistent, Implicit, PropertyManager,
             size = len(data)
         self.size = size
         self.data = data
+        self._set_pdata_index(data)
+        self._set_content_digest(data)
         self.ZCacheable_invalidate()
         self.ZCacheable_set(None)
         self.http__refreshEtag()
@@ -533,7 +650,7 @@ class File(Persistent, Implicit, PropertyManager,
             content_type = headers['content-type']
         else:
             if not isinstance(body, bytes):
-                body = body.data
+                body = body[:pdata_chunk_size]
             content_type, enc = guess_content_type(
                 getattr(file, 'filename', id), body, content_type)
         return content_type
@@ -541,7 +658,7 @@ class File(Persistent, Implicit, PropertyManager,
     def _read_data(self, file):
         import transaction
 
-        n = 1 << 16
+        n = pdata_chunk_size
 
         if isinstance(file, text_type):
             raise ValueError("Must be bytes")
@@ -556,14 +673,19 @@ class File(Persistent, Implicit, PropertyManager,
         if isinstance(file, FileUpload) and not file:
             raise ValueError('File not specified')
 
-        if hasattr(file, '__class__') and file.__class__ is Pdata:
+        if hasattr(file, '__class__') and file.__class__ in (Pdata, BlobData):
             size = len(file)
             return (file, size)
 
+        try:
+            file.seek(0, 2)
+        except (AttributeError, IOError, ValueError):
+            # The data is read back to front below.
+            file = _spool(file, n)
+            file.seek(0, 2)
+
         seek = file.seek
         read = file.read
-
-        seek(0, 2)
         size = end = file.tell()
 
         if size <= 2 * n:
@@ -581,11 +703,27 @@ class File(Persistent, Implicit, PropertyManager,
             seek(0)
             return Pdata(read(size)), size
 
+        if blob_storage and IBlobStorage.providedBy(self._p_jar.db().storage):
+            seek(0)
+            blob = Blob()
+            md5 = hashlib.md5()
+            with blob.open('w') as fd:
+                chunk = read(n)
+                while chunk:
+                    fd.write(chunk)
+                    md5.update(chunk)
+                    chunk = read(n)
+            data = BlobData(blob, size)
+            self._v_content_digest = (data, md5.hexdigest())
+            return data, size
+
         # Now we're going to build a linked list from back
         # to front to minimize the number of database updates
         # and to allow us to get things out of memory as soon as
         # possible.
         _next = None
+        index = LOBTree()
+        batch = []
         while end > 0:
             pos = end - n
             if pos < n:
@@ -598,17 +736,36 @@ class File(Persistent, Implicit, PropertyManager,
             data = Pdata(read(end - pos))
             self._p_jar.add(data)
             data.next = _next
-
-            # Save the object so that we can release its memory.
-            transaction.savepoint(optimistic=True)
-            data._p_deactivate()
-            # The object should be assigned an oid and be a ghost.
-            assert data._p_oid is not None
-            assert data._p_state == -1
+            data._length = size - pos
+
+            # Save the objects in batches so that we can release their
+            # memory without paying for a savepoint per object.
+            batch.append(data)
+            if pos == 0 or len(batch) >= pdata_savepoint_chunks:
+                transaction.savepoint(optimistic=True)
+                for link in batch:
+                    link._p_deactivate()
+                    # The object should be assigned an oid and be a ghost.
+                    assert link._p_oid is not None
+                    assert link._p_state == -1
+                del batch[:]
 
             _next = data
             end = pos
-
+            index[pos] = data
+
+        # The chain was built back to front, the digest of the data is
+        # computed front to back.
+        md5 = hashlib.md5()
+        seek(0)
+        chunk = read(n)
+        while chunk:
+            md5.update(chunk)
+            chunk = read(n)
+
+        # update_data keeps the index and digest, if it stores this chain.
+        self._v_pdata_index = (_next, index)
+        self._v_content_digest = (_next, md5.hexdigest())
         return (_next, size)
 
     security.declareProtected(View, 'get_size')
@@ -644,8 +801,7 @@ class File(Persistent, Implicit, PropertyManager,
     __nonzero__ = __bool__
 
     def __len__(self):
-        data = bytes(self.data)
-        return len(data)
+        return self.get_size()
 
     if bbb.HAS_ZSERVER:
         security.declareProtected(change_images_and_files, 'PUT')
@@ -689,9 +845,13 @@ class File(Persistent, Implicit, PropertyManager,
                 RESPONSE.setBase(None)
                 return data
 
-            while data is not None:
-                RESPONSE.write(data.data)
-                data = data.next
+            if isinstance(data, BlobData):
+                filename = data.committed()
+                if filename is not None:
+                    return filestream_iterator(filename, 'rb')
+
+            for chunk in data.chunks():
+                RESPONSE.write(chunk)
 
             return b''
 
@@ -742,44 +902,101 @@ def manage_addImage(self, id, file, title='', precondition='', content_type='',
     return id
 
 
+def _spool(file, chunk_size):
+    # Copy a stream which cannot seek, like the WSGI input, to a temporary
+    # file.
+    spool = tempfile.TemporaryFile()
+    chunk = file.read(chunk_size)
+    while chunk:
+        spool.write(chunk)
+        chunk = file.read(chunk_size)
+    return spool
+
+
+class _PdataReader(object):
+    # Read a Pdata chain like a file, loading its links as needed.
+
+    def __init__(self, data):
+        self._data = data
+        self.seek(0)
+
+    def seek(self, pos):
+        self._chunks = self._data.chunks()
+        self._buffer = b''
+        self._pos = 0
+        self.read(pos)
+
+    def close(self):
+        pass
+
+    def read(self, size):
+        while len(self._buffer) - self._pos < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+        start = self._pos
+        data = self._buffer[start:start + size]
+        self._pos = start + len(data)
+        return data
+
+
+def _image_reader(data):
+    if isinstance(data, Pdata):
+        return _PdataReader(data)
+    if isinstance(data, BlobData):
+        return data.open()
+    return BytesIO(bytes(data))
+
+
 def getImageInfo(data):
-    data = bytes(data)
-    size = len(data)
+    # Only the header of the image is read, a Pdata chain is not joined.
+    reader = _image_reader(data)
+    try:
+        return _getImageInfo(reader)
+    finally:
+        reader.close()
+
+
+def _getImageInfo(reader):
+    header = reader.read(24)
+    size = len(header)
     height = -1
     width = -1
     content_type = ''
 
     # handle GIFs
-    if (size >= 10) and data[:6] in (b'GIF87a', b'GIF89a'):
+    if (size >= 10) and header[:6] in (b'GIF87a', b'GIF89a'):
         # Check to see if content_type is correct
         content_type = 'image/gif'
-        w, h = struct.unpack("<HH", data[6:10])
+        w, h = struct.unpack("<HH", header[6:10])
         width = int(w)
         height = int(h)
 
     # See PNG v1.2 spec (http://www.cdrom.com/pub/png/spec/)
     # Bytes 0-7 are below, 4-byte chunk length, then 'IHDR'
     # and finally the 4-byte width, height
-    elif ((size >= 24) and (data[:8] == b'\211PNG\r\n\032\n') and
-          (data[12:16] == b'IHDR')):
+    elif ((size >= 24) and (header[:8] == b'\211PNG\r\n\032\n') and
+          (header[12:16] == b'IHDR')):
         content_type = 'image/png'
-        w, h = struct.unpack(">LL", data[16:24])
+        w, h = struct.unpack(">LL", header[16:24])
         width = int(w)
         height = int(h)
 
     # Maybe this is for an older PNG version.
-    elif (size >= 16) and (data[:8] == b'\211PNG\r\n\032\n'):
+    elif (size >= 16) and (header[:8] == b'\211PNG\r\n\032\n'):
         # Check to see if we have the right content type
         content_type = 'image/png'
-        w, h = struct.unpack(">LL", data[8:16])
+        w, h = struct.unpack(">LL", header[8:16])
         width = int(w)
         height = int(h)
 
     # handle JPEGs
-    elif (size >= 2) and (data[:2] == b'\377\330'):
+    elif (size >= 2) and (header[:2] == b'\377\330'):
         content_type = 'image/jpeg'
-        jpeg = BytesIO(data)
-        jpeg.read(2)
+        jpeg = reader
+        jpeg.seek(2)
         b = jpeg.read(1)
         try:
             while (b and ord(b) != 0xDA):
@@ -869,6 +1086,8 @@ class Image(File):
 
         self.size = size
         self.data = data
+        self._set_pdata_index(data)
+        self._set_content_digest(data)
 
         ct, width, height = getImageInfo(data)
         if ct:
@@ -966,6 +1185,9 @@ class Pdata(Persistent, Implicit):
 
     next = None
 
+    # The length of the chain starting here, if known when it was built.
+    _length = None
+
     def __init__(self, data):
         self.data = data
 
@@ -977,8 +1199,24 @@ class Pdata(Persistent, Implicit):
         return self.data[key]
 
     def __len__(self):
-        data = bytes(self)
-        return len(data)
+        if self.next is None:
+            return len(self.data)
+        length = self._length
+        if length is None:
+            length = getattr(self, '_v_length', None)
+        if length is None:
+            length = 0
+            for chunk in self.chunks():
+                length += len(chunk)
+            self._v_length = length
+        return length
+
+    def chunks(self):
+        """Iterate over the data of the links of the chain."""
+        link = self
+        while link is not None:
+            yield link.data
+            link = link.next
 
     def __bytes__(self):
         _next = self.next
@@ -995,3 +1233,84 @@ class Pdata(Persistent, Implicit):
 
     if PY2:
         __str__ = __bytes__
+
+
+class BlobData(Persistent):
+    # Data of a File or Image stored in a ZODB blob
+
+    def __init__(self, blob, size):
+        self.blob = blob
+        self.size = size
+
+    def open(self):
+        return self.blob.open('r')
+
+    def committed(self):
+        """Return the name of the committed blob file or None.
+
+        There is none while the blob has uncommitted changes.
+        """
+        try:
+            return self.blob.committed()
+        except BlobError:
+            return None
+
+    def chunks(self, start=0, end=None):
+        """Iterate over the data from `start` up to `end` in chunks."""
+        if end is None:
+            end = self.size
+        with self.open() as fd:
+            fd.seek(start)
+            pos = start
+            while pos < end:
+                chunk = fd.read(min(pdata_chunk_size, end - pos))
+                if not chunk:
+                    break
+                pos += len(chunk)
+                yield chunk
+
+    if PY2:
+        def __getslice__(self, i, j):
+            return self[i:j]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(self.size)
+            return b''.join(self.chunks(start, max(start, end)))[::step]
+        return b''.join(self.chunks())[key]
+
+    def __len__(self):
+        return self.size
+
+    def __bytes__(self):
+        with self.open() as fd:
+            return fd.read()
+
+    if PY2:
+        __str__ = __bytes__
+
+
+def migrateToBlob(file):
+    """Move the data of the File or Image `file` from Pdata into a blob.
+
+    Small data stored inline and data already stored in a blob are left
+    alone.  The storage of `file` must support blobs.  Returns whether the
+    data was moved.
+    """
+    data = aq_base(file.data)
+    if not isinstance(data, Pdata):
+        return False
+    blob = Blob()
+    size = 0
+    with blob.open('w') as fd:
+        link = data
+        while link is not None:
+            fd.write(link.data)
+            size += len(link.data)
+            _next = link.next
+            # Release the memory of the chunks already copied.
+            link._p_deactivate()
+            link = _next
+    file.data = BlobData(blob, size)
+    file._set_pdata_index(file.data)
+    return True
@@ -153,6 +153,43 @@ class BreakoutException(Exception):
 _marker = []
 
 
+def _overrides(ob, name, klass):
+    # Whether the class of `ob` overrides the method `name` of `klass`.
+    return getattr(type(aq_base(ob)), name, None) != getattr(klass, name)
+
+
+def _bulkMethod(container, name, single):
+    # The method `name` of `container` adding or removing several objects
+    # at once, or None if it has none or if it would bypass an override
+    # of the per-object method `single`.
+    method = getattr(container, name, None)
+    if (method is not None and
+            _overrides(container, single, ObjectManager) and
+            not _overrides(container, name, ObjectManager)):
+        return None
+    return method
+
+
+def _setOwner(ob, user=_marker):
+    # Make the current user the owner of the newly added `ob`.  Returns
+    # the user, who is looked up unless given.
+
+    # TODO: eventify manage_fixupOwnershipAfterAdd
+    # This will be called for a copy/clone, or a normal _setObject.
+    ob.manage_fixupOwnershipAfterAdd()
+
+    # Try to give user the local role "Owner", but only if
+    # no local roles have been set on the object yet.
+    if getattr(ob, '__ac_local_roles__', _marker) is None:
+        if user is _marker:
+            user = getSecurityManager().getUser()
+        if user is not None:
+            userid = user.getId()
+            if userid is not None:
+                ob.manage_setLocalRoles(userid, ['Owner'])
+    return user
+
+
 @implementer(IObjectManager)
 class ObjectManager(CopyContainer,
                     Navigation,
@@ -179,6 +216,10 @@ class ObjectManager(CopyContainer,
 
     _objects = ()
 
+    # A tuple of the `_objects` it indexes and a mapping of meta types to
+    # lists of ids in the order of `_objects`.
+    _meta_type_index = None
+
     security.declareProtected(view_management_screens, 'manage_main')
     manage_main = PageTemplateFile('zpt/main', globals())
 
@@ -330,34 +371,19 @@ class ObjectManager(CopyContainer,
         v = self._checkId(id)
         if v is not None:
             id = v
-        t = getattr(ob, 'meta_type', None)
 
         # If an object by the given id already exists, remove it.
-        for object_info in self._objects:
-            if object_info['id'] == id:
-                self._delObject(id)
-                break
+        if id in self:
+            self._delObject(id)
 
         if not suppress_events:
             notify(ObjectWillBeAddedEvent(ob, self, id))
 
-        self._objects = self._objects + ({'id': id, 'meta_type': t},)
-        self._setOb(id, ob)
+        self._storeObjects([(id, ob)])
         ob = self._getOb(id)
 
         if set_owner:
-            # TODO: eventify manage_fixupOwnershipAfterAdd
-            # This will be called for a copy/clone, or a normal _setObject.
-            ob.manage_fixupOwnershipAfterAdd()
-
-            # Try to give user the local role "Owner", but only if
-            # no local roles have been set on the object yet.
-            if getattr(ob, '__ac_local_roles__', _marker) is None:
-                user = getSecurityManager().getUser()
-                if user is not None:
-                    userid = user.getId()
-                    if userid is not None:
-                        ob.manage_setLocalRoles(userid, ['Owner'])
+            _setOwner(ob)
 
         if not suppress_events:
             notify(ObjectAddedEvent(ob, self, id))
@@ -394,9 +420,7 @@ class ObjectManager(CopyContainer,
         if not suppress_events:
             notify(ObjectWillBeRemovedEvent(ob, self, id))
 
-        self._objects = tuple([i for i in self._objects
-                               if i['id'] != id])
-        self._delOb(id)
+        self._removeObjects([id])
 
         # Indicate to the object that it has been deleted. This is
         # necessary for object DB mount points. Note that we have to
@@ -412,6 +436,162 @@ class ObjectManager(CopyContainer,
             notify(ObjectRemovedEvent(ob, self, id))
             notifyContainerModified(self)
 
+    def _getMetaTypeIndex(self):
+        # Return the mapping of meta types to ids for `_objects`.  Code
+        # changing `_objects` directly invalidates the persistent index,
+        # it is then rebuilt, but only stored by the next change.
+        objects = self._objects
+        for cached in (self._meta_type_index,
+                       getattr(self, '_v_meta_type_index', None)):
+            if cached is not None and cached[0] is objects:
+                return cached[1]
+        index = {}
+        for info in objects:
+            index.setdefault(info['meta_type'], []).append(info['id'])
+        self._v_meta_type_index = (objects, index)
+        return index
+
+    def _setMetaTypeIndex(self, index):
+        # Store the meta type index after changing `_objects`.  The index
+        # refers to the `_objects` tuple, which is pickled only once.
+        self._meta_type_index = (self._objects, index)
+
+    def _reindexMetaTypes(self):
+        # Rebuild and store the meta type index, e.g. after reordering.
+        self._v_meta_type_index = None
+        self._meta_type_index = None
+        self._setMetaTypeIndex(self._getMetaTypeIndex())
+
+    def _storeObjects(self, items):
+        # Store the (id, object) pairs `items`, writing `_objects` and the
+        # meta type index only once.
+        index = self._getMetaTypeIndex()
+        infos = []
+        for id, ob in items:
+            t = getattr(ob, 'meta_type', None)
+            infos.append({'id': id, 'meta_type': t})
+            index.setdefault(t, []).append(id)
+        self._objects = self._objects + tuple(infos)
+        self._setMetaTypeIndex(index)
+        for id, ob in items:
+            self._setOb(id, ob)
+
+    def _removeObjects(self, ids):
+        # Remove the objects `ids`, writing `_objects` and the meta type
+        # index only once.
+        removed = set(ids)
+        index = self._getMetaTypeIndex()
+        objects = []
+        for info in self._objects:
+            if info['id'] not in removed:
+                objects.append(info)
+                continue
+            ids_of_type = index.get(info['meta_type'])
+            if ids_of_type is not None and info['id'] in ids_of_type:
+                ids_of_type.remove(info['id'])
+                if not ids_of_type:
+                    del index[info['meta_type']]
+        self._objects = tuple(objects)
+        self._setMetaTypeIndex(index)
+        for id in ids:
+            self._delOb(id)
+
+    def _setObjects(self, objects, set_owner=1, suppress_events=False,
+                    coalesce_events=False):
+        """Set several objects into this container at once.
+
+        `objects` is a mapping or a sequence of (id, object) pairs.  The
+        list of subobjects is only rewritten once.  All
+        IObjectWillBeAddedEvents are sent before the objects are added,
+        all IObjectAddedEvents afterwards.  An IContainerModifiedEvent is
+        sent per object, or only once if `coalesce_events` is true.
+
+        Returns the list of ids.
+        """
+        if hasattr(objects, 'items'):
+            objects = objects.items()
+        items = []
+        seen = set()
+        for id, ob in objects:
+            v = self._checkId(id)
+            if v is not None:
+                id = v
+            if id in seen:
+                raise BadRequest(
+                    'The id "%s" is invalid - it is already in use.' % id)
+            seen.add(id)
+            items.append((id, ob))
+
+        # If objects by the given ids already exist, remove them.
+        existing = [id for id, ob in items
+                    if self.hasObject(id) and id in self]
+        if existing:
+            self._delObjects(existing)
+
+        if not suppress_events:
+            for id, ob in items:
+                notify(ObjectWillBeAddedEvent(ob, self, id))
+
+        self._storeObjects(items)
+
+        user = _marker
+        added = []
+        for id, ob in items:
+            ob = self._getOb(id)
+            if set_owner:
+                user = _setOwner(ob, user)
+            added.append((id, ob))
+
+        for id, ob in added:
+            if not suppress_events:
+                notify(ObjectAddedEvent(ob, self, id))
+                if not coalesce_events:
+                    notifyContainerModified(self)
+            compatibilityCall('manage_afterAdd', ob, ob, self)
+
+        if added and coalesce_events and not suppress_events:
+            notifyContainerModified(self)
+
+        return [id for id, ob in added]
+
+    def _delObjects(self, ids, suppress_events=False, coalesce_events=False):
+        """Delete several objects from this container at once.
+
+        The list of subobjects is only rewritten once.  All
+        IObjectWillBeRemovedEvents are sent before the objects are
+        removed, all IObjectRemovedEvents afterwards.  An
+        IContainerModifiedEvent is sent per object, or only once if
+        `coalesce_events` is true.
+        """
+        obs = []
+        seen = set()
+        for id in ids:
+            if id not in seen:
+                seen.add(id)
+                obs.append((id, self._getOb(id)))
+
+        for id, ob in obs:
+            compatibilityCall('manage_beforeDelete', ob, ob, self)
+            if not suppress_events:
+                notify(ObjectWillBeRemovedEvent(ob, self, id))
+
+        self._removeObjects([id for id, ob in obs])
+
+        for id, ob in obs:
+            # See _delObject.
+            try:
+                ob._v__object_deleted__ = 1
+            except Exception:
+                pass
+
+            if not suppress_events:
+                notify(ObjectRemovedEvent(ob, self, id))
+                if not coalesce_events:
+                    notifyContainerModified(self)
+
+        if obs and coalesce_events and not suppress_events:
+            notifyContainerModified(self)
+
     security.declareProtected(access_contents_information, 'objectIds')
     def objectIds(self, spec=None):
         # Returns a list of subobject ids of the current object.
@@ -420,11 +600,16 @@ class ObjectManager(CopyContainer,
         if spec is not None:
             if isinstance(spec, str):
                 spec = [spec]
-            set = []
-            for ob in self._objects:
-                if ob['meta_type'] in spec:
-                    set.append(ob['id'])
-            return set
+            index = self._getMetaTypeIndex()
+            matches = [index[t] for t in set(spec) if t in index]
+            if not matches:
+                return []
+            if len(matches) == 1:
+                return list(matches[0])
+            ids = set()
+            for match in matches:
+                ids.update(match)
+            return [o['id'] for o in self._objects if o['id'] in ids]
         return [o['id'] for o in self._objects]
 
     security.declareProtected(access_contents_information, 'objectValues')
@@ -441,6 +626,27 @@ class ObjectManager(CopyContainer,
         # 'spec'
         return [(id, self._getOb(id)) for id in self.objectIds(spec)]
 
+    security.declareProtected(access_contents_information, 'iterObjectValues')
+    def iterObjectValues(self, spec=None):
+        # Returns an iterator over the subobjects of the current object,
+        # which are only loaded when reached.  If 'spec' is specified,
+        # iterates only over objects whose meta_type match 'spec'.
+        if _overrides(self, 'objectValues', ObjectManager):
+            return iter(self.objectValues(spec))
+        ids = self.objectIds(spec)
+        return (self._getOb(id) for id in ids)
+
+    security.declareProtected(access_contents_information, 'iterObjectItems')
+    def iterObjectItems(self, spec=None):
+        # Returns an iterator over (id, subobject) tuples of the current
+        # object, loading the subobjects only when reached.  If 'spec' is
+        # specified, iterates only over objects whose meta_type match
+        # 'spec'.
+        if _overrides(self, 'objectItems', ObjectManager):
+            return iter(self.objectItems(spec))
+        ids = self.objectIds(spec)
+        return ((id, self._getOb(id)) for id in ids)
+
     def objectMap(self):
         # Return a tuple of mappings containing subobject meta-data
         return tuple(d.copy() for d in self._objects)
@@ -500,12 +706,14 @@ class ObjectManager(CopyContainer,
                 break
             get = obj._getOb
             if hasattr(obj, '_objects'):
-                for i in obj._objects:
+                try:
+                    ids = obj.objectIds(t)
+                except Exception:
+                    ids = ()
+                for id in ids:
                     try:
-                        id = i['id']
                         physicalPath = relativePhysicalPath + (id,)
-                        if ((physicalPath not in seen) and
-                                (i['meta_type'] in t)):
+                        if physicalPath not in seen:
                             vals.append(get(id))
                             seen[physicalPath] = 1
                     except Exception:
@@ -538,8 +746,9 @@ class ObjectManager(CopyContainer,
         for n in ids:
             if n in p:
                 raise BadRequest('Not Deletable')
-        while ids:
-            id = ids[-1]
+        # Delete in reverse order, after checking all objects.
+        ids = list(reversed(ids))
+        for id in ids:
             v = self._getOb(id, self)
 
             try:
@@ -550,9 +759,13 @@ class ObjectManager(CopyContainer,
                 pass
 
             if v is self:
-                raise BadRequest('%s does not exist' % escape(ids[-1], True))
-            self._delObject(id)
-            del ids[-1]
+                raise BadRequest('%s does not exist' % escape(id, True))
+        delObjects = _bulkMethod(self, '_delObjects', '_delObject')
+        if delObjects is not None:
+            delObjects(ids)
+        else:
+            for id in ids:
+                self._delObject(id)
         if REQUEST is not None:
             return self.manage_main(self, REQUEST)
 
@@ -572,13 +785,17 @@ class ObjectManager(CopyContainer,
                 if hasattr(self, id):
                     r.append(self._getOb(id))
         else:
-            obj_ids = self.objectIds()
-            obj_ids.sort()
-            for id in obj_ids:
-                o = self._getOb(id)
+            items = []
+            for id, o in self.iterObjectItems():
+                ghost = getattr(o, '_p_changed', 0) is None
                 if hasattr(aq_base(o), 'isPrincipiaFolderish') and \
                    o.isPrincipiaFolderish:
-                    r.append(o)
+                    items.append((id, o))
+                elif ghost:
+                    # Don't keep objects in the cache just to look at them.
+                    o._p_deactivate()
+            items.sort(key=itemgetter(0))
+            r = [o for id, o in items]
         return r
 
     security.declareProtected(import_export_objects, 'manage_exportObject')
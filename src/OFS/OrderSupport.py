@@ -168,6 +168,7 @@ class OrderSupport(object):
                         raise ValueError('The object with the id "%s" does '
                                          'not exist.' % subset_ids[pos])
             self._objects = tuple(objects)
+            self._reindexMetaTypes()
 
         if not suppress_events:
             notifyContainerModified(self)
@@ -256,7 +257,7 @@ class OrderSupport(object):
                     r.append(self._getOb(id))
         else:
             # this part is different from the ObjectManager code
-            r = [obj for obj in self.objectValues()
+            r = [obj for obj in self.iterObjectValues()
                  if getattr(obj, 'isPrincipiaFolderish', False)]
             r = sort(r, ((self._default_sort_key, 'cmp', 'asc'), ))
             if self._default_sort_reverse:
@@ -0,0 +1,453 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Cache manager keeping the cached views of Cacheable objects in RAM.
+
+The cache of a manager lives in the memory of the process and is shared
+by its threads.  It holds at most `max_entries` entries, each for at
+most `max_age` seconds.  Entries are keyed on the physical path of the
+object, the view name, the keywords and the request variables named in
+`request_vars`, and are stale once `ZCacheable_getModTime` changes.
+
+When the cache is full, the least recently used entry is evicted.  With
+the 'tinylfu' policy a new entry is only admitted if it was requested at
+least as often as that entry, so a burst of requests for rarely used
+views does not flush the entries which are used all the time.
+
+With `track_dependencies` the persistent objects loaded while rendering
+a view are recorded, and the entry is removed as soon as a transaction
+changing one of them is committed, in any process using the database.
+Recording needs time proportional to the size of the ZODB cache.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from AccessControl.class_init import InitializeClass
+from AccessControl.Permissions import view_management_screens
+from AccessControl.SecurityInfo import ClassSecurityInfo
+from Acquisition import aq_base
+from Acquisition import aq_get
+from App.special_dtml import DTMLFile
+from six import string_types
+
+from OFS.Cache import Cache
+from OFS.Cache import CacheManager
+from OFS.Cache import ChangeCacheSettingsPermission
+from OFS.Cache import DependencyIndex
+from OFS.SimpleItem import SimpleItem
+
+POLICIES = ('lru', 'tinylfu')
+
+DEFAULT_SETTINGS = {
+    'max_entries': 1000,
+    'max_age': 3600,
+    'request_vars': ('AUTHENTICATED_USER',),
+    'policy': 'tinylfu',
+    'track_dependencies': False,
+}
+
+
+def _keyValue(value):
+    # Turn a keyword value into something hashable and equal for equal
+    # values in different requests.  Objects in the database are
+    # represented by their path, mappings by their sorted items.
+    if hasattr(aq_base(value), 'getPhysicalPath'):
+        try:
+            return ('path',) + tuple(value.getPhysicalPath())
+        except Exception:
+            pass
+    if isinstance(value, dict):
+        return tuple(sorted(((str(k), _keyValue(v))
+                             for k, v in value.items()),
+                            key=lambda item: item[0]))
+    if isinstance(value, (list, tuple)):
+        return tuple(_keyValue(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def cacheKey(ob, view_name, keywords, request_vars):
+    """Return the key of the cache entry for a view of `ob`.
+
+    The first item of the key is the physical path of `ob`.
+    """
+    key = [tuple(ob.getPhysicalPath()), view_name]
+    if keywords:
+        key.append(_keyValue(keywords))
+    if request_vars:
+        request = aq_get(ob, 'REQUEST', None)
+        get = getattr(request, 'get', None)
+        for name in request_vars:
+            value = get(name, '') if get is not None else ''
+            key.append(str(value))
+    return tuple(key)
+
+
+class RAMCache(Cache):
+    """Thread safe cache of the views of Cacheable objects in RAM."""
+
+    def __init__(self, **settings):
+        self._lock = threading.Lock()
+        # key -> [data, mtime, expires], least recently used first
+        self._entries = OrderedDict()
+        # path -> set of keys of the entries for the object at path
+        self._paths = {}
+        # hash of key -> recent number of requests for key
+        self._frequencies = {}
+        self._requests = 0
+        self.hits = self.misses = self.evictions = 0
+        self._dependencies = None
+        self.configure(**settings)
+
+    def configure(self, max_entries=1000, max_age=3600,
+                  request_vars=('AUTHENTICATED_USER',), policy='tinylfu',
+                  track_dependencies=False):
+        with self._lock:
+            self.settings = {'max_entries': max_entries,
+                             'max_age': max_age,
+                             'request_vars': request_vars,
+                             'policy': policy,
+                             'track_dependencies': track_dependencies}
+            self.max_entries = max(int(max_entries), 1)
+            self.max_age = int(max_age)
+            self.request_vars = tuple(request_vars)
+            self.policy = policy
+            self.ZCache_tracksDependencies = bool(track_dependencies)
+            if self.ZCache_tracksDependencies:
+                if self._dependencies is None:
+                    self._dependencies = DependencyIndex()
+            elif self._dependencies is not None:
+                self._dependencies.close()
+                self._dependencies = None
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    def getKey(self, ob, view_name, keywords):
+        return cacheKey(ob, view_name, keywords, self.request_vars)
+
+    def _count(self, key):
+        # Count a request for key in the frequency sketch.  The counts
+        # are halved regularly, so only recent requests matter.
+        if self.policy != 'tinylfu':
+            return
+        frequencies = self._frequencies
+        h = hash(key)
+        frequencies[h] = frequencies.get(h, 0) + 1
+        self._requests += 1
+        if self._requests >= 10 * self.max_entries:
+            self._requests = 0
+            for h, count in list(frequencies.items()):
+                if count > 1:
+                    frequencies[h] = count >> 1
+                else:
+                    del frequencies[h]
+
+    def _remove(self, key):
+        del self._entries[key]
+        if self._dependencies is not None:
+            self._dependencies.remove(key)
+        keys = self._paths.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._paths[key[0]]
+
+    def _evict(self):
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+    def _invalidateChanged(self, ob):
+        # Remove the entries depending on objects changed in other
+        # transactions.
+        jar = getattr(aq_base(ob), '_p_jar', None)
+        if jar is None or self._dependencies is None:
+            return
+        db = jar.db()
+        for key in self._dependencies.poll(db):
+            if key in self._entries:
+                self._remove(key)
+
+    def ZCache_get(self, ob, view_name, keywords, mtime_func, default):
+        key = self.getKey(ob, view_name, keywords)
+        mtime = ob.ZCacheable_getModTime(mtime_func)
+        with self._lock:
+            self._invalidateChanged(ob)
+            self._count(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if (entry[1] == mtime and
+                        (not entry[2] or entry[2] > time.time())):
+                    # Mark the entry as recently used.
+                    self._entries[key] = self._entries.pop(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+            self.misses += 1
+        return default
+
+    def ZCache_set(self, ob, data, view_name, keywords, mtime_func,
+                   dependencies=None):
+        key = self.getKey(ob, view_name, keywords)
+        mtime = ob.ZCacheable_getModTime(mtime_func)
+        expires = time.time() + self.max_age if self.max_age > 0 else 0
+        with self._lock:
+            self._invalidateChanged(ob)
+            entries = self._entries
+            if key in entries:
+                self._remove(key)
+            elif len(entries) >= self.max_entries:
+                if self.policy == 'tinylfu':
+                    victim = next(iter(entries))
+                    frequencies = self._frequencies
+                    if (frequencies.get(hash(key), 0) <
+                            frequencies.get(hash(victim), 0)):
+                        # Requested less often than the entry it would
+                        # replace.
+                        return
+                self._evict()
+            if dependencies is not None and self._dependencies is not None:
+                if not self._dependencies.add(key, dependencies):
+                    return
+            entries[key] = [data, mtime, expires]
+            self._paths.setdefault(key[0], set()).add(key)
+
+    def ZCache_invalidate(self, ob):
+        path = tuple(ob.getPhysicalPath())
+        with self._lock:
+            keys = self._paths.get(path, ())
+            count = len(keys)
+            for key in list(keys):
+                self._remove(key)
+        return 'Invalidated %d cache entries.' % count
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            if self._dependencies is not None:
+                self._dependencies.clear()
+            self._frequencies.clear()
+            self._requests = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        """Stop following the invalidations of the databases."""
+        with self._lock:
+            if self._dependencies is not None:
+                self._dependencies.close()
+                self._dependencies = None
+            self.ZCache_tracksDependencies = False
+
+    def getStatistics(self):
+        """Return a mapping with the number of entries, hits, misses and
+        evictions and the number of entries per object path."""
+        with self._lock:
+            objects = sorted(
+                ('/'.join(path), len(keys))
+                for path, keys in self._paths.items())
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / total if total else 0.0,
+                'evictions': self.evictions,
+                'objects': [{'path': path, 'entries': count}
+                            for path, count in objects],
+            }
+
+
+# The caches of the RAM cache managers in this process by cache id.
+caches = {}
+caches_lock = threading.Lock()
+
+# The cache ids of the stored managers by database name and oid.  Moving
+# a manager gives it a new cache id, the cache of the old id is closed
+# when the new one is seen.
+_cacheids = {}
+
+# Caches not used for this many seconds, or for the max_age of their
+# entries if longer, are closed.  Their managers may have been deleted in
+# another process.  Idle caches are looked for once a minute.
+idle_timeout = 3600
+_swept = [0]
+
+
+def _managerKey(manager):
+    oid = getattr(aq_base(manager), '_p_oid', None)
+    if oid is None:
+        return None
+    return manager._p_jar.db().database_name, oid
+
+
+def _removeStale(key, cacheid, now):
+    # Remove the caches no manager uses any more from `caches` and return
+    # them.  Called with `caches_lock` held.
+    stale = []
+    if key is not None:
+        old = _cacheids.get(key)
+        _cacheids[key] = cacheid
+        if old is not None and old != cacheid and old in caches:
+            stale.append(caches.pop(old))
+    if now - _swept[0] > 60:
+        _swept[0] = now
+        idle = set()
+        for id, cache in list(caches.items()):
+            timeout = max(cache.settings.get('max_age', 0), idle_timeout)
+            if id != cacheid and now - getattr(cache, 'used', now) > timeout:
+                stale.append(caches.pop(id))
+                idle.add(id)
+        for manager, id in list(_cacheids.items()):
+            if id in idle:
+                del _cacheids[manager]
+    return stale
+
+
+class RAMCacheManager(CacheManager, SimpleItem):
+    """Cache manager keeping the cached views in RAM."""
+
+    meta_type = 'RAM Cache Manager'
+    zmi_icon = 'fas fa-forward'
+
+    security = ClassSecurityInfo()
+
+    manage_options = (
+        {'label': 'Properties', 'action': 'manage_main'},
+        {'label': 'Statistics', 'action': 'manage_stats'},
+    ) + CacheManager.manage_options + SimpleItem.manage_options
+
+    _default_settings = DEFAULT_SETTINGS
+    _settings = None
+    _cacheid = None
+
+    def __init__(self, id, title=''):
+        self.id = id
+        self.title = title
+        self._settings = dict(self._default_settings)
+        self._resetCacheId()
+
+    def _resetCacheId(self):
+        # The cache is shared by all copies of this object in the process,
+        # a copy of the manager gets a new one.
+        self._cacheid = '%x_%f' % (id(self), time.time())
+
+    def _makeCache(self, settings):
+        return RAMCache(**settings)
+
+    def manage_afterAdd(self, item, container):
+        if aq_base(self) is aq_base(item):
+            self._resetCacheId()
+        CacheManager.manage_afterAdd(self, item, container)
+
+    def manage_beforeDelete(self, item, container):
+        if aq_base(self) is aq_base(item):
+            with caches_lock:
+                cache = caches.pop(self._cacheid, None)
+            if cache is not None:
+                cache.close()
+        CacheManager.manage_beforeDelete(self, item, container)
+
+    security.declarePrivate('ZCacheManager_getCache')
+    def ZCacheManager_getCache(self):
+        cacheid = self._cacheid
+        settings = self.getSettings()
+        key = _managerKey(self)
+        now = time.time()
+        cache = caches.get(cacheid)
+        if (cache is None or cache.settings != settings or
+                (key is not None and _cacheids.get(key) != cacheid) or
+                now - _swept[0] > 60):
+            # The settings may have been changed in another process.
+            with caches_lock:
+                stale = _removeStale(key, cacheid, now)
+                cache = caches.get(cacheid)
+                if cache is None:
+                    cache = caches[cacheid] = self._makeCache(settings)
+                elif cache.settings != settings:
+                    cache.configure(**settings)
+            for old in stale:
+                old.close()
+        cache.used = now
+        return cache
+
+    security.declareProtected(view_management_screens, 'getSettings')
+    def getSettings(self):
+        """Return the settings of the cache."""
+        settings = dict(self._default_settings)
+        settings.update(self._settings or {})
+        return settings
+
+    security.declareProtected(view_management_screens, 'manage_main')
+    manage_main = DTMLFile('dtml/ramCacheManager', globals())
+
+    security.declareProtected(ChangeCacheSettingsPermission,
+                              'manage_editProps')
+    def manage_editProps(self, title, settings=None, REQUEST=None):
+        """Change the title and the settings of the cache."""
+        if settings is None:
+            settings = REQUEST
+        policy = settings.get('policy', 'tinylfu')
+        if policy not in POLICIES:
+            raise ValueError('Unknown eviction policy: %s' % policy)
+        request_vars = settings.get('request_vars', ())
+        if isinstance(request_vars, string_types):
+            request_vars = request_vars.split()
+        self.title = str(title)
+        self._settings = {
+            'max_entries': int(settings.get('max_entries', 1000)),
+            'max_age': int(settings.get('max_age', 3600)),
+            'request_vars': tuple(
+                name.strip() for name in request_vars if name.strip()),
+            'policy': policy,
+            'track_dependencies': bool(
+                settings.get('track_dependencies', False)),
+        }
+        self.ZCacheManager_getCache()
+        if REQUEST is not None:
+            return self.manage_main(
+                self, REQUEST, manage_tabs_message='Properties changed.')
+
+    security.declareProtected(view_management_screens, 'manage_stats')
+    manage_stats = DTMLFile('dtml/ramCacheStats', globals())
+
+    security.declareProtected(view_management_screens, 'getStatistics')
+    def getStatistics(self):
+        """Return the statistics of the cache."""
+        return self.ZCacheManager_getCache().getStatistics()
+
+    security.declareProtected(ChangeCacheSettingsPermission,
+                              'manage_invalidate')
+    def manage_invalidate(self, REQUEST=None):
+        """Remove all entries from the cache and reset the statistics."""
+        self.ZCacheManager_getCache().clear()
+        if REQUEST is not None:
+            return self.manage_stats(
+                self, REQUEST, manage_tabs_message='Cache cleared.')
+
+
+InitializeClass(RAMCacheManager)
+
+
+manage_addRAMCacheManagerForm = DTMLFile('dtml/addRAMCacheManager', globals())
+
+
+def manage_addRAMCacheManager(self, id, title='', REQUEST=None):
+    """Add a RAM cache manager with id *id*."""
+    self._setObject(id, RAMCacheManager(id, title))
+    if REQUEST is not None:
+        return self.manage_main(self, REQUEST)
@@ -0,0 +1,392 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Cache manager sharing the cached views between the processes of a host.
+
+The cache is a file mapped into the memory of every Zope process using
+it, so a view rendered in one process is served from the cache in all
+others, and a new process starts with a warm cache.  The file is divided
+into `max_entries` slots of `slot_size` bytes, grouped in sets of four.
+An entry is stored pickled in one of the slots of the set its key maps
+to, replacing the oldest entry of the set if none is free.  Views which
+do not fit into a slot are not cached.
+
+Readers share a lock on the file, writers and invalidations hold it
+exclusively, so an invalidation is seen by all processes at once.  The
+files are kept in a subdirectory of the temporary directory only
+accessible by the user running Zope, unless `shared-cache-directory` is
+configured.  As the entries are unpickled, a file which is a symbolic
+link, is not owned by that user or is accessible by others is refused.
+Shared caches need `fcntl` and thus are not available on Windows.
+"""
+
+from contextlib import contextmanager
+import errno
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+
+from AccessControl.class_init import InitializeClass
+from AccessControl.SecurityInfo import ClassSecurityInfo
+from AccessControl.Permissions import view_management_screens
+from Acquisition import aq_base
+from App.special_dtml import DTMLFile
+from six import string_types
+from six.moves import cPickle as pickle
+
+from OFS.Cache import Cache
+from OFS.Cache import ChangeCacheSettingsPermission
+from OFS.RAMCacheManager import cacheKey
+from OFS.RAMCacheManager import caches
+from OFS.RAMCacheManager import RAMCacheManager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# The ZConfig machinery may set these attributes on initialization.
+# The directory of the cache files, a private subdirectory of the
+# temporary directory if None.
+directory = None
+
+DEFAULT_SETTINGS = {
+    'max_entries': 1024,
+    'slot_size': 65536,
+    'max_age': 3600,
+    'request_vars': ('AUTHENTICATED_USER',),
+}
+
+MAGIC = b'ZCACHE01'
+# magic, number of slots, slot size
+FILE_HEADER = struct.Struct('<8sII')
+FILE_HEADER_SIZE = 64
+# digest of the key, digest of the object path, mtime, expiration time,
+# time stored, length of the pickle
+SLOT_HEADER = struct.Struct('<16s16sdddI')
+SLOT_HEADER_SIZE = 64
+EMPTY_SLOT = b'\0' * SLOT_HEADER_SIZE
+WAYS = 4
+
+
+def _digest(value):
+    return hashlib.md5(repr(value).encode('utf-8')).digest()
+
+
+def _checkPrivate(st, path, kind):
+    # Refuse files and directories other users could have written to.
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(
+            'The shared cache %s %s must be owned by the user running Zope '
+            'and not be accessible by others.' % (kind, path))
+
+
+def _directory():
+    # The directory of the cache files.
+    if directory:
+        return directory
+    path = os.path.join(tempfile.gettempdir(), 'zope-cache-%d' % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(
+            'The shared cache directory %s is not a directory.' % path)
+    _checkPrivate(st, path, 'directory')
+    return path
+
+
+class SharedCache(Cache):
+    """Cache of the views of Cacheable objects in a memory mapped file,
+    shared by all processes using the same file."""
+
+    def __init__(self, name, **settings):
+        if fcntl is None:
+            raise RuntimeError('Shared caches need fcntl.')
+        self.name = name
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self.slots = self.slot_size = None
+        self.hits = self.misses = self.evictions = 0
+        self.configure(**settings)
+
+    def configure(self, max_entries=1024, slot_size=65536, max_age=3600,
+                  request_vars=('AUTHENTICATED_USER',)):
+        with self._lock:
+            self.settings = {'max_entries': max_entries,
+                             'slot_size': slot_size,
+                             'max_age': max_age,
+                             'request_vars': request_vars}
+            self.max_age = int(max_age)
+            self.request_vars = tuple(request_vars)
+            slots = -(-max(int(max_entries), WAYS) // WAYS) * WAYS
+            slot_size = max(int(slot_size), 2 * SLOT_HEADER_SIZE)
+            if (slots, slot_size) != (self.slots, self.slot_size):
+                self.slots = slots
+                self.slot_size = slot_size
+                self._open()
+
+    def getPath(self):
+        """Return the path of the cache file.
+
+        The file name contains the geometry of the file, so processes
+        with different settings never use the same file.
+        """
+        return os.path.join(
+            _directory(),
+            'zope-cache-%s-%dx%d' % (self.name, self.slots, self.slot_size))
+
+    def _open(self):
+        self._close()
+        size = FILE_HEADER_SIZE + self.slots * self.slot_size
+        path = self.getPath()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        file = os.fdopen(fd, 'r+b')
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise RuntimeError(
+                    'The shared cache file %s is not a regular file.' % path)
+            _checkPrivate(st, path, 'file')
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                header = FILE_HEADER.pack(MAGIC, self.slots, self.slot_size)
+                if os.fstat(fd).st_size < size:
+                    # The file is only ever enlarged, shrinking it would
+                    # crash the processes which mapped it.
+                    file.truncate(size)
+                file.seek(0)
+                if file.read(len(header)) != header:
+                    file.seek(0)
+                    file.write(header)
+                    for index in range(self.slots):
+                        file.seek(FILE_HEADER_SIZE + index * self.slot_size)
+                        file.write(EMPTY_SLOT)
+                    file.flush()
+                self._map = mmap.mmap(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            file.close()
+            raise
+        self._file = file
+
+    def close(self):
+        """Close the cache file, the cache is empty afterwards."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Close and remove the cache file."""
+        with self._lock:
+            path = self.getPath()
+            self._close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        # The file lock excludes other processes, the thread lock the
+        # other threads of this process, which share the file.  Yields
+        # None if the cache was closed.
+        with self._lock:
+            if self._file is None:
+                yield None
+                return
+            fd = self._file.fileno()
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _offsets(self, digest):
+        # The offsets of the slots an entry with `digest` may be stored in.
+        sets = self.slots // WAYS
+        first = struct.unpack('<Q', digest[:8])[0] % sets * WAYS
+        return [FILE_HEADER_SIZE + index * self.slot_size
+                for index in range(first, first + WAYS)]
+
+    def ZCache_get(self, ob, view_name, keywords, mtime_func, default):
+        digest = _digest(cacheKey(ob, view_name, keywords, self.request_vars))
+        mtime = ob.ZCacheable_getModTime(mtime_func)
+        data = None
+        with self._locked() as map:
+            for offset in self._offsets(digest) if map is not None else ():
+                (key, path, entry_mtime, expires, stored,
+                 length) = SLOT_HEADER.unpack_from(map, offset)
+                if key == digest:
+                    if (entry_mtime == mtime and
+                            (not expires or expires > time.time())):
+                        start = offset + SLOT_HEADER_SIZE
+                        data = map[start:start + length]
+                    break
+            if data is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(data)
+
+    def ZCache_set(self, ob, data, view_name, keywords, mtime_func):
+        key = cacheKey(ob, view_name, keywords, self.request_vars)
+        try:
+            data = pickle.dumps(data, 2)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Only views which can be pickled are shared.
+            return
+        if len(data) > self.slot_size - SLOT_HEADER_SIZE:
+            return
+        digest = _digest(key)
+        mtime = ob.ZCacheable_getModTime(mtime_func)
+        now = time.time()
+        expires = now + self.max_age if self.max_age > 0 else 0
+        with self._locked(exclusive=True) as map:
+            if map is None:
+                return
+            # Use the slot of the entry, a free slot or the slot of the
+            # oldest entry in the set, in this order.
+            slot = priority = oldest = None
+            for offset in self._offsets(digest):
+                header = SLOT_HEADER.unpack_from(map, offset)
+                if header[0] == digest:
+                    slot, priority = offset, 0
+                    break
+                if header[0] == EMPTY_SLOT[:16] or 0 < header[3] <= now:
+                    if slot is None or priority > 1:
+                        slot, priority = offset, 1
+                elif slot is None or (priority == 2 and header[4] < oldest):
+                    slot, priority, oldest = offset, 2, header[4]
+            if priority == 2:
+                self.evictions += 1
+            start = slot + SLOT_HEADER_SIZE
+            map[start:start + len(data)] = data
+            SLOT_HEADER.pack_into(map, slot, digest, _digest(key[0]),
+                                  mtime, expires, now, len(data))
+
+    def ZCache_invalidate(self, ob):
+        path = _digest(tuple(ob.getPhysicalPath()))
+        count = 0
+        with self._locked(exclusive=True) as map:
+            for index in range(self.slots if map is not None else 0):
+                offset = FILE_HEADER_SIZE + index * self.slot_size
+                if map[offset + 16:offset + 32] == path:
+                    map[offset:offset + SLOT_HEADER_SIZE] = EMPTY_SLOT
+                    count += 1
+        return 'Invalidated %d cache entries.' % count
+
+    def clear(self):
+        with self._locked(exclusive=True) as map:
+            for index in range(self.slots if map is not None else 0):
+                offset = FILE_HEADER_SIZE + index * self.slot_size
+                map[offset:offset + SLOT_HEADER_SIZE] = EMPTY_SLOT
+            self.hits = self.misses = self.evictions = 0
+
+    def getStatistics(self):
+        """Return a mapping with the number of entries in the file and
+        the hits, misses and evictions of this process."""
+        entries = 0
+        now = time.time()
+        with self._locked() as map:
+            for index in range(self.slots if map is not None else 0):
+                header = SLOT_HEADER.unpack_from(
+                    map, FILE_HEADER_SIZE + index * self.slot_size)
+                if (header[0] != EMPTY_SLOT[:16] and
+                        (not header[3] or header[3] > now)):
+                    entries += 1
+            total = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.slots,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / total if total else 0.0,
+                'evictions': self.evictions,
+                'objects': [],
+            }
+
+
+class SharedCacheManager(RAMCacheManager):
+    """Cache manager sharing the cached views between processes."""
+
+    meta_type = 'Shared Cache Manager'
+    zmi_icon = 'fas fa-share-alt'
+
+    security = ClassSecurityInfo()
+
+    _default_settings = DEFAULT_SETTINGS
+
+    def _makeCache(self, settings):
+        return SharedCache(self._cacheid, **settings)
+
+    def manage_beforeDelete(self, item, container):
+        cache = caches.get(self._cacheid)
+        RAMCacheManager.manage_beforeDelete(self, item, container)
+        if aq_base(self) is aq_base(item) and cache is not None:
+            cache.remove()
+
+    security.declareProtected(view_management_screens, 'manage_main')
+    manage_main = DTMLFile('dtml/sharedCacheManager', globals())
+
+    security.declareProtected(ChangeCacheSettingsPermission,
+                              'manage_editProps')
+    def manage_editProps(self, title, settings=None, REQUEST=None):
+        """Change the title and the settings of the cache."""
+        if settings is None:
+            settings = REQUEST
+        request_vars = settings.get('request_vars', ())
+        if isinstance(request_vars, string_types):
+            request_vars = request_vars.split()
+        self.title = str(title)
+        self._settings = {
+            'max_entries': int(settings.get('max_entries', 1024)),
+            'slot_size': int(settings.get('slot_size', 65536)),
+            'max_age': int(settings.get('max_age', 3600)),
+            'request_vars': tuple(
+                name.strip() for name in request_vars if name.strip()),
+        }
+        self.ZCacheManager_getCache()
+        if REQUEST is not None:
+            return self.manage_main(
+                self, REQUEST, manage_tabs_message='Properties changed.')
+
+
+InitializeClass(SharedCacheManager)
+
+
+manage_addSharedCacheManagerForm = DTMLFile(
+    'dtml/addSharedCacheManager', globals())
+
+
+def manage_addSharedCacheManager(self, id, title='', REQUEST=None):
+    """Add a shared cache manager with id *id*."""
+    self._setObject(id, SharedCacheManager(id, title))
+    if REQUEST is not None:
+        return self.manage_main(self, REQUEST)
@@ -692,6 +692,16 @@ class IObjectManager(IZopeObject, ICopyContainer, INavigation, IManageable,
         """
         """
 
+    def _setObjects(objects, set_owner=1, suppress_events=False,
+                    coalesce_events=False):
+        """Set several objects, given as a mapping or a sequence of
+        (id, object) pairs, at once.
+        """
+
+    def _delObjects(ids, suppress_events=False, coalesce_events=False):
+        """Delete several objects at once.
+        """
+
     def hasObject(id):
         """Indicate whether the folder has an item by ID.
         """
@@ -717,6 +727,21 @@ class IObjectManager(IZopeObject, ICopyContainer, INavigation, IManageable,
         'spec'.
         """
 
+    def iterObjectValues(spec=None):
+        """Iterate over the subobjects of the current object.
+
+        Subobjects are only loaded when reached.  If 'spec' is specified,
+        iterates only over objects whose meta_types match 'spec'.
+        """
+
+    def iterObjectItems(spec=None):
+        """Iterate over (ID, subobject) tuples for subobjects of the
+        current object.
+
+        Subobjects are only loaded when reached.  If 'spec' is specified,
+        iterates only over objects whose meta_types match 'spec'.
+        """
+
     def objectMap():
         """Return a tuple of mappings containing subobject meta-data.
         """
@@ -770,6 +795,27 @@ class IFindSupport(Interface):
                          apply_func=None, apply_path=''):
         """Zope Find interface and apply"""
 
+    def iterZopeFind(obj, obj_ids=None, obj_metatypes=None,
+                     obj_searchterm=None, obj_expr=None,
+                     obj_mtime=None, obj_mspec=None,
+                     obj_permission=None, obj_roles=None,
+                     search_sub=0, cursor=None, prefilter=False):
+        """Generate the (path, object) pairs found, depth first.
+
+        The search continues after the object at path `cursor`.
+        """
+
+    def ZopeFindPage(obj, obj_ids=None, obj_metatypes=None,
+                     obj_searchterm=None, obj_expr=None,
+                     obj_mtime=None, obj_mspec=None,
+                     obj_permission=None, obj_roles=None,
+                     search_sub=0, cursor=None, size=20, prefilter=True):
+        """Return a page of at most `size` results of a search.
+
+        The page is a mapping with the (path, object) pairs found as
+        'results' and the cursor of the next page as 'cursor'.
+        """
+
 
 # XXX: might contain non-API methods and outdated comments;
 #      not synced with ZopeBook API Reference;
@@ -980,6 +1026,12 @@ class IOrderedFolder(IOrderedContainer, IFolder):
     """
 
 
+class IBTreeFolder(IFolder):
+
+    """Folder storing its subobjects in BTrees, for large folders.
+    """
+
+
 # XXX: might contain non-API methods and outdated comments;
 #      not synced with ZopeBook API Reference;
 #      based on OFS.Application.Application
@@ -79,7 +79,7 @@ class ObjectManagerSublocations(object):
         self.container = container
 
     def sublocations(self):
-        for ob in self.container.objectValues():
+        for ob in self.container.iterObjectValues():
             yield ob
 
 # The following subscribers should really be defined in ZCML
@@ -0,0 +1,111 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare storing large files with a savepoint per chunk and in batches.
+
+Run with ``python -m OFS.tests.benchmark_upload [size in MiB ...]``, the
+default sizes are 10, 100 and 1024 MiB.  Each upload runs in a separate
+process storing into a FileStorage, so the peak RSS is its own.
+"""
+
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# (label, chunk size, chunks per savepoint)
+SETTINGS = [
+    ('savepoint per chunk', 1 << 16, 1),
+    ('16 x 64 KiB', 1 << 16, 16),
+    ('64 x 256 KiB', 1 << 18, 64),
+]
+
+
+def peak_rss():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss >> 10 if sys.platform == 'darwin' else rss
+
+
+def upload(path, workdir, chunk_size, savepoint_chunks):
+    import transaction
+    from ZODB import DB
+    from ZODB.FileStorage import FileStorage
+
+    from OFS import Image
+
+    Image.pdata_chunk_size = chunk_size
+    Image.pdata_savepoint_chunks = savepoint_chunks
+    db = DB(FileStorage(os.path.join(workdir, 'Data.fs')))
+    conn = db.open()
+    root = conn.root()
+    root['file'] = Image.File('file', '', b'')
+    transaction.commit()
+    rss_before = peak_rss()
+
+    start = time.time()
+    with open(path, 'rb') as fd:
+        root['file'].manage_upload(fd)
+    transaction.commit()
+    seconds = time.time() - start
+
+    result = {'seconds': seconds,
+              'rss_before': rss_before,
+              'rss_peak': peak_rss()}
+    conn.close()
+    db.close()
+    return result
+
+
+def run(chunk_size, savepoint_chunks, path, workdir):
+    output = subprocess.check_output([
+        sys.executable, '-m', 'OFS.tests.benchmark_upload', '--child',
+        path, workdir, str(chunk_size), str(savepoint_chunks)])
+    return json.loads(output.decode('ascii'))
+
+
+def main(sizes):
+    print('%-10s %-22s %10s %12s %14s' % (
+        'size', 'chunks', 'MiB/s', 'peak RSS MiB', 'RSS growth MiB'))
+    for size in sizes:
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'upload.bin')
+            with open(path, 'wb') as fd:
+                block = os.urandom(1 << 20)
+                for i in range(size):
+                    fd.write(block)
+            for label, chunk_size, savepoint_chunks in SETTINGS:
+                workdir = tempfile.mkdtemp(dir=tmp)
+                result = run(chunk_size, savepoint_chunks, path,
+                             workdir)
+                shutil.rmtree(workdir)
+                print('%-10s %-22s %10.1f %12.1f %14.1f' % (
+                    '%d MiB' % size, label,
+                    size / result['seconds'],
+                    result['rss_peak'] / 1024.0,
+                    (result['rss_peak'] - result['rss_before']) / 1024.0))
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        path, workdir, chunk_size, savepoint_chunks = sys.argv[2:]
+        print(json.dumps(upload(path, workdir, int(chunk_size),
+                                int(savepoint_chunks))))
+    else:
+        main([int(size) for size in sys.argv[1:]] or [10, 100, 1024])
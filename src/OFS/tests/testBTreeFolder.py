@@ -0,0 +1,175 @@
+import unittest
+
+from Acquisition import aq_base
+from zope.interface import implementer
+
+from OFS.BTreeFolder import BTreeObjectManager
+from OFS.interfaces import IItem
+from OFS.ObjectManager import REPLACEABLE
+from OFS.SimpleItem import SimpleItem
+from OFS.tests import testObjectManager
+from OFS.tests.testObjectManager import FauxRoot
+
+
+@implementer(IItem)
+class BTreeObjectManagerWithIItem(BTreeObjectManager):
+    """The event subscribers work on IItem."""
+
+
+class Item(SimpleItem):
+
+    def __init__(self, id, meta_type='Item'):
+        self.id = id
+        self.meta_type = meta_type
+
+
+class BTreeObjectManagerTests(testObjectManager.ObjectManagerTests):
+    # Run all ObjectManager tests against the BTree storage, too.
+
+    def _getTargetClass(self):
+        return BTreeObjectManagerWithIItem
+
+    def test_interfaces(self):
+        from OFS.interfaces import IObjectManager
+        from zope.container.interfaces import IContainer
+        from zope.interface.verify import verifyClass
+
+        verifyClass(IContainer, BTreeObjectManager)
+        verifyClass(IObjectManager, BTreeObjectManager)
+
+    def _makeFilled(self):
+        om = self._makeOne()
+        om._setObject('c', Item('c', 'Foo'), set_owner=0)
+        om._setObject('a', Item('a', 'Bar'), set_owner=0)
+        om._setObject('b', Item('b', 'Foo'), set_owner=0)
+        return om
+
+    def test_add_and_remove_inherited(self):
+        # Only the storage differs, events, ownership and the
+        # manage_afterAdd/manage_beforeDelete hooks are ObjectManager's.
+        from OFS.ObjectManager import ObjectManager
+        for name in ('_setObject', '_delObject', '_setObjects',
+                     '_delObjects'):
+            self.assertEqual(getattr(BTreeObjectManager, name),
+                             getattr(ObjectManager, name))
+
+    def test_storage(self):
+        om = self._makeFilled()
+        self.assertEqual(aq_base(om).__dict__.get('_objects'), None)
+        self.assertEqual(list(om._tree.keys()), ['a', 'b', 'c'])
+        self.assertEqual(om._count(), 3)
+        self.assertEqual(list(om._mt_index['Foo']), ['b', 'c'])
+
+    def test_objectIds_sorted(self):
+        om = self._makeFilled()
+        self.assertEqual(om.objectIds(), ['a', 'b', 'c'])
+        self.assertEqual(om.objectIds('Foo'), ['b', 'c'])
+        self.assertEqual(om.objectIds(['Bar', 'Foo']), ['a', 'b', 'c'])
+        self.assertEqual(om.objectIds('Baz'), [])
+
+    def test_objectValues_objectItems(self):
+        om = self._makeFilled()
+        self.assertEqual([ob.getId() for ob in om.objectValues()],
+                         ['a', 'b', 'c'])
+        self.assertEqual([ob.getId() for ob in om.objectValues('Bar')],
+                         ['a'])
+        items = om.objectItems('Foo')
+        self.assertEqual([id for id, ob in items], ['b', 'c'])
+        self.assertTrue(aq_base(items[0][1].aq_parent) is aq_base(om))
+
+    def test_objectMap(self):
+        om = self._makeFilled()
+        self.assertEqual(om.objectMap(), (
+            {'id': 'a', 'meta_type': 'Bar'},
+            {'id': 'b', 'meta_type': 'Foo'},
+            {'id': 'c', 'meta_type': 'Foo'},
+        ))
+
+    def test_delObject_updates_index(self):
+        om = self._makeFilled()
+        om._delObject('a')
+        self.assertEqual(om.objectIds(), ['b', 'c'])
+        self.assertFalse('Bar' in om._mt_index)
+        self.assertEqual(len(om), 2)
+
+    def test_setObject_replaces(self):
+        om = self._makeFilled()
+        om.a.__replaceable__ = REPLACEABLE
+        om._setObject('a', Item('a', 'Foo'), set_owner=0)
+        self.assertEqual(len(om), 3)
+        self.assertEqual(om.objectIds('Foo'), ['a', 'b', 'c'])
+        self.assertEqual(om.objectIds('Bar'), [])
+
+    def test_attribute_access(self):
+        om = self._makeFilled()
+        self.assertEqual(om.a.getId(), 'a')
+        self.assertTrue(aq_base(om.a.aq_parent) is aq_base(om))
+        self.assertRaises(AttributeError, getattr, om, 'missing')
+
+    def test_manage_get_sortedObjects(self):
+        om = self._makeFilled()
+        result = om.manage_get_sortedObjects('id', 'desc')
+        self.assertEqual([item['id'] for item in result], ['c', 'b', 'a'])
+        result = om.manage_get_sortedObjects('meta_type', 'asc')
+        self.assertEqual([item['id'] for item in result], ['a', 'b', 'c'])
+
+
+class MigrateFolderTests(unittest.TestCase):
+
+    def _makeContainer(self):
+        from OFS.Folder import Folder
+        root = Folder('root')
+        folder = Folder('folder')
+        folder.title = 'A folder'
+        folder.manage_addProperty('color', 'red', 'string')
+        folder._setObject('x', Item('x'), set_owner=0)
+        folder._setObject('y', Item('y', 'Other'), set_owner=0)
+        root._setObject('folder', folder, set_owner=0)
+        return root.__of__(FauxRoot())
+
+    def test_migrateFolder(self):
+        from OFS.BTreeFolder import BTreeFolder
+        from OFS.BTreeFolder import migrateFolder
+        root = self._makeContainer()
+        x = aq_base(root.folder.x)
+        new = migrateFolder(root, 'folder')
+        self.assertTrue(isinstance(aq_base(new), BTreeFolder))
+        self.assertTrue(aq_base(root._getOb('folder')) is aq_base(new))
+        self.assertEqual(root.objectMap(),
+                         ({'id': 'folder', 'meta_type': 'Folder (BTree)'},))
+        self.assertEqual(new.getId(), 'folder')
+        self.assertEqual(new.title, 'A folder')
+        self.assertEqual(new.getProperty('color'), 'red')
+        self.assertEqual(new.objectIds(), ['x', 'y'])
+        self.assertEqual(new.objectIds('Other'), ['y'])
+        self.assertTrue(aq_base(new.x) is x)
+        self.assertFalse('x' in aq_base(new).__dict__)
+        self.assertEqual(aq_base(new).__dict__.get('_objects'), None)
+
+    def test_migrateFolder_already_migrated(self):
+        from OFS.BTreeFolder import migrateFolder
+        root = self._makeContainer()
+        new = migrateFolder(root, 'folder')
+        self.assertTrue(aq_base(migrateFolder(root, 'folder'))
+                        is aq_base(new))
+
+
+class TestBTreeFolder(unittest.TestCase):
+
+    def test_interfaces(self):
+        from OFS.BTreeFolder import BTreeFolder
+        from OFS.interfaces import IBTreeFolder
+        from OFS.interfaces import IWriteLock
+        from zope.interface.verify import verifyClass
+
+        verifyClass(IBTreeFolder, BTreeFolder)
+        verifyClass(IWriteLock, BTreeFolder)
+
+    def test_manage_addBTreeFolder(self):
+        from OFS.BTreeFolder import manage_addBTreeFolder
+        from OFS.Folder import Folder
+        root = Folder('root').__of__(FauxRoot())
+        manage_addBTreeFolder(root, 'big', 'Big')
+        self.assertEqual(root.objectIds('Folder (BTree)'), ['big'])
+        self.assertEqual(root.big.title, 'Big')
+        self.assertEqual(len(root.big), 0)
@@ -1,6 +1,10 @@
 import unittest
 
+from Acquisition import aq_base
+
+from OFS.Cache import Cacheable
 from OFS.Cache import CacheManager
+from OFS.Cache import managersExist
 from OFS.Folder import Folder
 from OFS.SimpleItem import SimpleItem
 from OFS.metaconfigure import setDeprecatedManageAddDelete
@@ -34,6 +38,116 @@ class CacheTests(unittest.TestCase):
         self.assertTrue(managersExist(root.child.child_content))
 
 
+class DummyCache(object):
+
+    def __init__(self, path):
+        self.path = path
+
+
+class ResolvingCacheManager(DummyCacheManager):
+
+    def ZCacheManager_getCache(self):
+        return DummyCache('/'.join(self.getPhysicalPath()))
+
+
+class DummyCacheable(Cacheable, SimpleItem):
+
+    def __init__(self, id):
+        self.id = id
+
+
+class ManagerResolutionTests(unittest.TestCase):
+
+    def _makeRoot(self):
+        root = Folder('root')
+        root._setObject('cache', ResolvingCacheManager('cache'))
+        for id in ('site', 'other'):
+            root._setObject(id, Folder(id))
+        root.site._setObject('ob', DummyCacheable('ob'))
+        root.site.ob.ZCacheable_setManagerId('cache')
+        return root
+
+    def test_findManager(self):
+        from OFS.Cache import findManager
+        root = self._makeRoot()
+        manager, searched = findManager(root.site.ob, 'cache')
+        self.assertTrue(aq_base(manager) is aq_base(root.cache))
+        self.assertEqual([aq_base(ob) for ob, ids in searched],
+                         [aq_base(root.site.ob), aq_base(root.site),
+                          aq_base(root)])
+        self.assertEqual(findManager(root.site.ob, 'other'), (None, ()))
+
+    def test_findManager_stale_id_does_not_acquire(self):
+        from OFS.Cache import findManager
+        from OFS.Cache import ZCM_MANAGERS
+        root = self._makeRoot()
+        # A stale id in the list of cache managers of a container.
+        setattr(root.site, ZCM_MANAGERS, ('cache',))
+        manager, searched = findManager(root.site.ob, 'cache')
+        self.assertTrue(aq_base(manager) is aq_base(root.cache))
+        self.assertEqual(len(searched), 3)
+        self.assertTrue(aq_base(manager.aq_parent) is aq_base(root))
+        # Objects which are not cache managers are skipped.
+        root.site._setObject('cache', Folder('cache'))
+        manager, searched = findManager(root.site.ob, 'cache')
+        self.assertTrue(aq_base(manager) is aq_base(root.cache))
+
+    def test_unrelated_manager_added(self):
+        root = self._makeRoot()
+        cache = root.site.ob.ZCacheable_getCache()
+        self.assertEqual(cache.path, 'root/cache')
+        root.other._setObject('cache', ResolvingCacheManager('cache'))
+        self.assertTrue(root.site.ob.ZCacheable_getCache() is cache)
+
+    def test_shadowing_manager_added(self):
+        root = self._makeRoot()
+        root.site.ob.ZCacheable_getCache()
+        root.site._setObject('cache', ResolvingCacheManager('cache'))
+        self.assertEqual(root.site.ob.ZCacheable_getCache().path,
+                         'root/site/cache')
+
+    def test_manager_removed(self):
+        root = self._makeRoot()
+        root.site.ob.ZCacheable_getCache()
+        root._delObject('cache')
+        self.assertEqual(root.site.ob.ZCacheable_getCache(), None)
+        self.assertFalse(managersExist(root.site.ob))
+
+    def test_moved(self):
+        root = self._makeRoot()
+        root.site._setObject('cache', ResolvingCacheManager('cache'))
+        self.assertEqual(root.site.ob.ZCacheable_getCache().path,
+                         'root/site/cache')
+        ob = root.site._getOb('ob')
+        root.site._delObject('ob', suppress_events=True)
+        root.other._setObject('ob', aq_base(ob), suppress_events=True)
+        self.assertEqual(root.other.ob.ZCacheable_getCache().path,
+                         'root/cache')
+
+    def test_manager_added_in_other_connection(self):
+        import transaction
+        from ZODB.DB import DB
+        db = DB(None)
+        self.addCleanup(db.close)
+        tm = transaction.TransactionManager()
+        conn = db.open(tm)
+        conn.root()['root'] = self._makeRoot()
+        tm.commit()
+        ob = conn.root()['root'].site.ob
+        cache = ob.ZCacheable_getCache()
+        self.assertEqual(cache.path, 'root/cache')
+        other_tm = transaction.TransactionManager()
+        other = db.open(other_tm)
+        site = other.root()['root'].site
+        site._setObject('cache', ResolvingCacheManager('cache'))
+        other_tm.commit()
+        other.close()
+        self.assertTrue(ob.ZCacheable_getCache() is cache)
+        tm.begin()
+        self.assertEqual(ob.ZCacheable_getCache().path, 'root/site/cache')
+        tm.abort()
+
+
 class CacheableTests(unittest.TestCase):
 
     def _getTargetClass(self):
@@ -46,3 +160,287 @@ class CacheableTests(unittest.TestCase):
     def test_ZCacheable_getModTime(self):
         ob = self._makeOne()
         self.assertEqual(0, ob.ZCacheable_getModTime())
+
+
+class StoringCache(object):
+
+    def __init__(self):
+        self.data = {}
+
+    def ZCache_get(self, ob, view_name, keywords, mtime_func, default):
+        return self.data.get(view_name, default)
+
+    def ZCache_set(self, ob, data, view_name, keywords, mtime_func):
+        self.data[view_name] = data
+
+
+class StoringCacheManager(DummyCacheManager):
+
+    def __init__(self, id):
+        self.id = id
+        self._cache = StoringCache()
+
+    def ZCacheManager_getCache(self):
+        return self._cache
+
+
+class DummyResponse(object):
+
+    repeatable = False
+
+    def markBodyRepeatable(self):
+        self.repeatable = True
+
+
+class DummyRequest(object):
+
+    def __init__(self):
+        self.RESPONSE = DummyResponse()
+
+
+class CachedResponseTests(unittest.TestCase):
+
+    def _makeOne(self):
+        root = Folder('root')
+        root.REQUEST = DummyRequest()
+        root._setObject('cache', StoringCacheManager('cache'))
+        root._setObject('ob', DummyCacheable('ob'))
+        root.ob.ZCacheable_setManagerId('cache')
+        return root.ob
+
+    def test_miss_is_not_repeatable(self):
+        ob = self._makeOne()
+        self.assertEqual(ob.ZCacheable_get(default='miss'), 'miss')
+        self.assertFalse(ob.REQUEST.RESPONSE.repeatable)
+
+    def test_set_marks_body_repeatable(self):
+        ob = self._makeOne()
+        ob.ZCacheable_set('data')
+        self.assertTrue(ob.REQUEST.RESPONSE.repeatable)
+
+    def test_hit_marks_body_repeatable(self):
+        ob = self._makeOne()
+        ob.ZCacheable_set('data')
+        ob.REQUEST.RESPONSE = DummyResponse()
+        self.assertEqual(ob.ZCacheable_get(), 'data')
+        self.assertTrue(ob.REQUEST.RESPONSE.repeatable)
+
+    def test_disabled_is_not_repeatable(self):
+        ob = self._makeOne()
+        ob.ZCacheable_setEnabled(0)
+        ob.ZCacheable_set('data')
+        self.assertFalse(ob.REQUEST.RESPONSE.repeatable)
+
+
+class DependencyTestBase(unittest.TestCase):
+
+    def setUp(self):
+        import transaction
+        from persistent.mapping import PersistentMapping
+        from ZODB.DB import DB
+        self.db = DB(None)
+        # Closed after the dependency indexes following it.
+        self.addCleanup(self.db.close)
+        self.tm = transaction.TransactionManager()
+        self.conn = self.db.open(self.tm)
+        root = self.conn.root()
+        for name in ('a', 'b', 'c'):
+            root[name] = PersistentMapping(value=name)
+        self.tm.commit()
+
+    def tearDown(self):
+        self.tm.abort()
+
+    def _change(self, *names):
+        # Commit a change in another connection.
+        import transaction
+        tm = transaction.TransactionManager()
+        conn = self.db.open(tm)
+        for name in names:
+            conn.root()[name]['value'] += '!'
+        tm.commit()
+        conn.close()
+
+
+class RecordingTests(DependencyTestBase):
+
+    def _objects(self):
+        # Views do not access the root object of the database.
+        root = self.conn.root()
+        return [root[name] for name in ('a', 'b', 'c')]
+
+    def test_record(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        startRecording(a)
+        b['value']
+        dependencies = stopRecording(a)
+        self.assertTrue(dependencies.db is self.db)
+        self.assertIn(b._p_oid, dependencies.oids)
+        self.assertNotIn(c._p_oid, dependencies.oids)
+        self.assertEqual(dependencies.snapshot, self.conn._storage._start)
+        self.assertEqual(stopRecording(a), None)
+
+    def test_loaded(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        self.conn.cacheMinimize()
+        startRecording(a)
+        b['value']
+        dependencies = stopRecording(a)
+        self.assertIn(b._p_oid, dependencies.oids)
+        self.assertNotIn(c._p_oid, dependencies.oids)
+        self.assertFalse('setstate' in self.conn.__dict__)
+
+    def test_deactivated(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        startRecording(a)
+        b['value']
+        b._p_deactivate()
+        dependencies = stopRecording(a)
+        # b can not be found any more, the view must not be cached.
+        self.assertEqual(dependencies.snapshot, None)
+
+    def test_loaded_and_evicted(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        self.conn.cacheMinimize()
+        startRecording(a)
+        b['value']
+        self.conn.cacheMinimize()
+        dependencies = stopRecording(a)
+        self.assertIn(b._p_oid, dependencies.oids)
+        self.assertEqual(dependencies.snapshot, None)
+
+    def test_no_snapshot(self):
+        from OFS.Cache import DependencyIndex
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        storage = self.conn._storage
+        start = storage._start
+        del storage._start
+        try:
+            startRecording(a)
+            b['value']
+            dependencies = stopRecording(a)
+        finally:
+            storage._start = start
+        self.assertEqual(dependencies.snapshot, None)
+        index = DependencyIndex()
+        self.addCleanup(index.close)
+        self.assertFalse(index.add('key', dependencies))
+
+    def test_nested(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        startRecording(a)
+        a['value']
+        startRecording(b)
+        b['value']
+        inner = stopRecording(b)
+        c['value']
+        outer = stopRecording(a)
+        self.assertIn(b._p_oid, inner.oids)
+        self.assertNotIn(a._p_oid, inner.oids)
+        self.assertNotIn(c._p_oid, inner.oids)
+        for ob in (a, b, c):
+            self.assertIn(ob._p_oid, outer.oids)
+
+    def test_abandoned(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        startRecording(a)
+        startRecording(b)
+        b['value']
+        # The view of b failed, its objects are recorded for a.
+        dependencies = stopRecording(a)
+        self.assertIn(b._p_oid, dependencies.oids)
+        self.assertEqual(stopRecording(b), None)
+
+    def test_new_transaction(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        a, b, c = self._objects()
+        startRecording(a)
+        self.tm.abort()
+        self.assertEqual(stopRecording(a), None)
+
+    def test_not_persistent(self):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        ob = Folder('ob')
+        startRecording(ob)
+        self.assertEqual(stopRecording(ob), None)
+
+
+class DependencyIndexTests(DependencyTestBase):
+
+    def _record(self, *names):
+        from OFS.Cache import startRecording
+        from OFS.Cache import stopRecording
+        root = self.conn.root()
+        obs = [root[name] for name in ('a',) + names]
+        startRecording(obs[0])
+        for ob in obs[1:]:
+            ob['value']
+        return stopRecording(obs[0])
+
+    def test_poll(self):
+        from OFS.Cache import DependencyIndex
+        index = DependencyIndex()
+        self.addCleanup(index.close)
+        self.tm.begin()
+        self.assertTrue(index.add('key', self._record('b')))
+        self.assertEqual(index.poll(self.db), set())
+        self._change('c')
+        self.assertEqual(index.poll(self.db), set())
+        self._change('b')
+        self.assertEqual(index.poll(self.db), set(['key']))
+        index.remove('key')
+        self._change('b')
+        self.assertEqual(index.poll(self.db), set())
+
+    def test_changed_while_rendering(self):
+        from OFS.Cache import DependencyIndex
+        index = DependencyIndex()
+        self.addCleanup(index.close)
+        index.poll(self.db)
+        self.tm.begin()
+        dependencies = self._record('b')
+        self._change('b')
+        index.poll(self.db)
+        self.assertFalse(index.add('key', dependencies))
+        self.tm.begin()
+        self.assertTrue(index.add('key', self._record('b')))
+
+    def test_rendered_before_following(self):
+        # Changes committed before the index follows the database are
+        # unknown to it.
+        from OFS.Cache import DependencyIndex
+        index = DependencyIndex()
+        self.addCleanup(index.close)
+        self.tm.begin()
+        dependencies = self._record('b')
+        self._change('c')
+        self.assertFalse(index.add('key', dependencies))
+
+    def test_forget(self):
+        from OFS.Cache import DependencyIndex
+        index = DependencyIndex()
+        index.max_remembered = 1
+        self.addCleanup(index.close)
+        index.poll(self.db)
+        self.tm.begin()
+        dependencies = self._record('b')
+        self._change('a', 'c')
+        index.poll(self.db)
+        # The changes were forgotten, b may have changed too.
+        self.assertFalse(index.add('key', dependencies))
@@ -9,6 +9,7 @@ from AccessControl.SecurityManagement import noSecurityManager
 from Acquisition import aq_base
 from Acquisition import Implicit
 from OFS.Application import Application
+from OFS.Folder import Folder
 from OFS.Folder import manage_addFolder
 from OFS.Image import manage_addFile
 from Testing.makerequest import makerequest
@@ -46,6 +47,18 @@ class UnitTestUser(Implicit):
         return 1
 
 
+class RecordingFolder(Folder):
+    """Folder adding and removing objects its own way."""
+
+    def _setObject(self, id, object, *args, **kw):
+        self.calls = self.calls + [('_setObject', id)]
+        return Folder._setObject(self, id, object, *args, **kw)
+
+    def _delObject(self, id, *args, **kw):
+        self.calls = self.calls + [('_delObject', id)]
+        return Folder._delObject(self, id, *args, **kw)
+
+
 def makeConnection():
     import ZODB
     from ZODB.DemoStorage import DemoStorage
@@ -207,6 +220,46 @@ class TestCopySupport(CopySupportTestBase):
         self.assertEqual(result, [{'id': 'copy2_of_file',
                                    'new_id': 'copy4_of_file'}])
 
+    def testPasteSameIDTwiceInOnePaste(self):
+        cookie = self.folder1.manage_copyObjects(ids=('file', 'file'))
+        result = self.folder1.manage_pasteObjects(cookie)
+        self.assertEqual(self.folder1.objectIds(),
+                         ['file', 'copy_of_file', 'copy2_of_file'])
+        self.assertEqual(result, [{'id': 'file', 'new_id': 'copy_of_file'},
+                                  {'id': 'file', 'new_id': 'copy2_of_file'}])
+
+    def testCutMultiple(self):
+        manage_addFile(self.folder1, 'file2',
+                       file=b'', content_type='text/plain')
+        manage_addFile(self.folder2, 'file',
+                       file=b'', content_type='text/plain')
+        # Only objects with a _p_jar can be moved.
+        transaction.savepoint(optimistic=True)
+        cookie = self.folder1.manage_cutObjects(ids=('file', 'file2'))
+        result = self.folder2.manage_pasteObjects(cookie)
+        self.assertEqual(self.folder1.objectIds(), [])
+        self.assertEqual(self.folder2.objectIds(),
+                         ['file', 'copy_of_file', 'file2'])
+        self.assertEqual(result, [{'id': 'file', 'new_id': 'copy_of_file'},
+                                  {'id': 'file2', 'new_id': 'file2'}])
+        self.assertEqual(self.folder2.copy_of_file.getId(), 'copy_of_file')
+
+    def testPasteUsesOverriddenSetObjectDelObject(self):
+        self.app._setObject('folder3', RecordingFolder('folder3'))
+        folder3 = self.app._getOb('folder3')
+        folder3.all_meta_types = FILE_META_TYPES
+        folder3.calls = []
+        cookie = self.folder1.manage_copyObjects(ids=('file',))
+        folder3.manage_pasteObjects(cookie)
+        self.assertEqual(folder3.calls, [('_setObject', 'file')])
+        transaction.savepoint(optimistic=True)
+        cookie = folder3.manage_cutObjects(ids=('file',))
+        self.folder2.manage_pasteObjects(cookie)
+        self.assertEqual(folder3.calls, [('_setObject', 'file'),
+                                         ('_delObject', 'file')])
+        self.assertEqual(folder3.objectIds(), [])
+        self.assertEqual(self.folder2.objectIds(), ['file'])
+
     def testPasteSpecialName(self):
         manage_addFile(self.folder1, 'copy_of_',
                        file=b'', content_type='text/plain')
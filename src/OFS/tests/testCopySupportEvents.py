@@ -159,6 +159,42 @@ class TestCopySupport(EventTest):
              ('folder', 'ContainerModifiedEvent')]
         )
 
+    def test_5_CutPasteMultiple(self):
+        # Test cut/paste of several objects
+        self.folder._setObject('mydoc2', TestItem('mydoc2'))
+        transaction.savepoint(1)
+        eventlog.reset()
+        cb = self.folder.manage_cutObjects(['mydoc', 'mydoc2'])
+        self.subfolder.manage_pasteObjects(cb)
+        self.assertEqual(
+            eventlog.called(),
+            [('mydoc', 'ObjectWillBeMovedEvent'),
+             ('mydoc2', 'ObjectWillBeMovedEvent'),
+             ('mydoc', 'ObjectMovedEvent'),
+             ('folder', 'ContainerModifiedEvent'),
+             ('subfolder', 'ContainerModifiedEvent'),
+             ('mydoc2', 'ObjectMovedEvent'),
+             ('folder', 'ContainerModifiedEvent'),
+             ('subfolder', 'ContainerModifiedEvent')]
+        )
+
+    def test_6_CutPasteMultiple_coalesce_events(self):
+        # Test cut/paste of several objects, coalescing container events
+        self.folder._setObject('mydoc2', TestItem('mydoc2'))
+        transaction.savepoint(1)
+        eventlog.reset()
+        cb = self.folder.manage_cutObjects(['mydoc', 'mydoc2'])
+        self.subfolder._pasteObjects(cb, coalesce_events=True)
+        self.assertEqual(
+            eventlog.called(),
+            [('mydoc', 'ObjectWillBeMovedEvent'),
+             ('mydoc2', 'ObjectWillBeMovedEvent'),
+             ('mydoc', 'ObjectMovedEvent'),
+             ('mydoc2', 'ObjectMovedEvent'),
+             ('folder', 'ContainerModifiedEvent'),
+             ('subfolder', 'ContainerModifiedEvent')]
+        )
+
 
 class TestCopySupportSublocation(EventTest):
     '''Tests the order in which events are fired'''
@@ -5,6 +5,7 @@ import Zope2
 
 import codecs
 import os
+import struct
 import sys
 import time
 from io import BytesIO
@@ -90,6 +91,8 @@ ADummyCache = DummyCache()
 
 
 class DummyCacheManager(SimpleItem):
+    _isCacheManager = 1
+
     def ZCacheManager_getCache(self):
         return ADummyCache
 
@@ -126,6 +129,15 @@ class EventCatcher(object):
             self.modified.append(event)
 
 
+def makePdataChain(data, chunk_size):
+    head = None
+    for start in reversed(range(0, len(data), chunk_size)):
+        link = Pdata(data[start:start + chunk_size])
+        link.next = head
+        head = link
+    return head
+
+
 class FileTests(unittest.TestCase):
     content_type = 'application/octet-stream'
     factory = 'manage_addFile'
@@ -209,6 +221,89 @@ class FileTests(unittest.TestCase):
         data, size = self.file._read_data(s)
         self.assertNotEqual(data.next, None)
 
+    def testReadDataChunkSize(self):
+        s = b'abcdefghij' * 550
+        orig = OFS.Image.pdata_chunk_size
+        OFS.Image.pdata_chunk_size = 1000
+        try:
+            data, size = self.file._read_data(BytesIO(s))
+        finally:
+            OFS.Image.pdata_chunk_size = orig
+        self.assertEqual(size, len(s))
+        self.assertEqual([len(chunk) for chunk in data.chunks()],
+                         [1500, 1000, 1000, 1000, 1000])
+        self.assertEqual(bytes(data), s)
+
+    def testReadDataBatchesSavepoints(self):
+        s = b'a' * (1 << 16) * 10
+        savepoints = []
+        savepoint = transaction.savepoint
+
+        def counting_savepoint(*args, **kw):
+            savepoints.append(1)
+            return savepoint(*args, **kw)
+
+        orig = OFS.Image.pdata_savepoint_chunks
+        OFS.Image.pdata_savepoint_chunks = 4
+        transaction.savepoint = counting_savepoint
+        try:
+            data, size = self.file._read_data(BytesIO(s))
+        finally:
+            transaction.savepoint = savepoint
+            OFS.Image.pdata_savepoint_chunks = orig
+        # One to get a connection, then one per batch of 4 chunks.
+        self.assertEqual(len(savepoints), 4)
+        link = data
+        while link is not None:
+            self.assertEqual(link._p_state, -1)
+            link = link.next
+        self.assertEqual(bytes(data), s)
+
+    def testReadDataFromStream(self):
+        s = b'a' * (1 << 16) * 3 + b'b'
+
+        class Stream(object):
+            # Like the WSGI input, it can only be read.
+            def __init__(self, data):
+                self.read = BytesIO(data).read
+
+        data, size = self.file._read_data(Stream(s))
+        self.assertEqual(size, len(s))
+        self.assertNotEqual(data.next, None)
+        self.assertEqual(bytes(data), s)
+
+    def testPdataLength(self):
+        s = b'a' * (1 << 16) * 3 + b'b' * 5
+        data, size = self.file._read_data(BytesIO(s))
+        self.assertEqual(data._length, size)
+        self.assertEqual(data.next._length, size - len(data.data))
+        self.assertEqual(len(data), len(s))
+
+    def testPdataLengthWithoutStoredLength(self):
+        data = makePdataChain(b'abcdefgh', 3)
+        self.assertEqual(data._length, None)
+        self.assertEqual(len(data), 8)
+        self.assertEqual(data._v_length, 8)
+        self.assertEqual(len(data.next.next), 2)
+
+    def testPdataChunks(self):
+        data = makePdataChain(b'abcdefgh', 3)
+        self.assertEqual(list(data.chunks()), [b'abc', b'def', b'gh'])
+        self.assertEqual(list(Pdata(b'abc').chunks()), [b'abc'])
+
+    def testLenWithPdata(self):
+        s = b'a' * (1 << 16) * 3
+        self.file.manage_upload(BytesIO(s))
+        self.assertEqual(len(self.file), len(s))
+
+    def testLenDoesNotLoadPdata(self):
+        s = b'a' * (1 << 16) * 3
+        self.file.manage_upload(BytesIO(s))
+        transaction.commit()
+        self.connection.cacheMinimize()
+        self.assertEqual(len(self.file), len(s))
+        self.assertIsNone(self.file.data._p_changed)
+
     def testManageEditWithFileData(self):
         self.file.manage_edit('foobar', 'text/plain', filedata=b'ASD')
         self.assertEqual(self.file.title, 'foobar')
@@ -260,6 +355,56 @@ class FileTests(unittest.TestCase):
         self.assertEqual(resp.getStatus(), 200)
         self.assertEqual(data, bytes(self.file.data))
 
+    def _conditionalGET(self, **headers):
+        e = {'SERVER_NAME': 'foo',
+             'SERVER_PORT': '80',
+             'REQUEST_METHOD': 'GET'}
+        for name, value in headers.items():
+            e['HTTP_' + name.upper()] = value
+        resp = HTTPResponse(stdout=BytesIO())
+        req = HTTPRequest(sys.stdin, e, resp)
+        return self.file.index_html(req, resp), resp
+
+    def testIfNoneMatch(self):
+        etag = '"%s"' % self.file.http__etag()
+        data, resp = self._conditionalGET(if_none_match=etag)
+        self.assertEqual(resp.getStatus(), 304)
+        self.assertEqual(data, b'')
+        self.assertEqual(resp.getHeader('ETag'), etag)
+
+        data, resp = self._conditionalGET(
+            if_none_match='"other", W/%s' % etag)
+        self.assertEqual(resp.getStatus(), 304)
+
+        data, resp = self._conditionalGET(if_none_match='*')
+        self.assertEqual(resp.getStatus(), 304)
+
+    def testIfNoneMatchTakesPrecedence(self):
+        # If-Modified-Since is ignored if If-None-Match does not match.
+        data, resp = self._conditionalGET(
+            if_none_match='"other"',
+            if_modified_since=rfc1123_date(time.time()))
+        self.assertEqual(resp.getStatus(), 200)
+        self.assertEqual(data, bytes(self.file.data))
+
+    def testETagIsContentDigest(self):
+        import hashlib
+        self.assertEqual(self.file.http__etag(),
+                         'md5-' + hashlib.md5(self.data).hexdigest())
+        s = b'abcdefgh' * (1 << 16)
+        self.file.manage_upload(BytesIO(s))
+        self.assertIsInstance(aq_base(self.file.data), Pdata)
+        self.assertEqual(self.file.http__etag(),
+                         'md5-' + hashlib.md5(s).hexdigest())
+        self.file.update_data(makePdataChain(s, 1000))
+        self.assertEqual(self.file.http__etag(),
+                         'md5-' + hashlib.md5(s).hexdigest())
+
+    def testETagWithoutContentDigest(self):
+        # Files stored before the digest was kept use a timestamp.
+        del self.file._content_digest
+        self.assertTrue(self.file.http__etag().startswith('ts'))
+
     def testIndexHtmlWithPdata(self):
         self.file.manage_upload(b'a' * (2 << 16))  # 128K
         self.file.index_html(self.app.REQUEST, self.app.REQUEST.RESPONSE)
@@ -270,6 +415,13 @@ class FileTests(unittest.TestCase):
         self.file.index_html(self.app.REQUEST, self.app.REQUEST.RESPONSE)
         self.assertTrue(not self.app.REQUEST.RESPONSE._wrote)
 
+    def testIndexHtmlSetsETag(self):
+        self.file.manage_upload(b'a' * 100)
+        response = self.app.REQUEST.RESPONSE
+        self.file.index_html(self.app.REQUEST, response)
+        self.assertEqual(response.getHeader('ETag'),
+                         '"%s"' % self.file.http__etag())
+
     def testPrincipiaSearchSource_not_text(self):
         data = ''.join([chr(x) for x in range(256)])
         if PY3:
@@ -341,6 +493,175 @@ class ImageTests(FileTests):
                          ' alt="" title="" height="16" width="16" />')
 
 
+class BlobFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes(bytearray(range(256))) * 1000
+        self.connection = makeConnection()
+        self.root = self.connection.root()['Application'] = Application()
+        self.responseOut = BytesIO()
+        self.app = makerequest(self.root, stdout=self.responseOut)
+        self.app.manage_addFile('small', file=b'small data')
+        OFS.Image.blob_storage = True
+        try:
+            self.app.manage_addFile('file', file=self.data,
+                                    content_type='application/data')
+        finally:
+            OFS.Image.blob_storage = False
+        transaction.commit()
+        self.file = self.app.file
+
+    def tearDown(self):
+        del self.file
+        transaction.abort()
+        self.connection.close()
+        del self.app
+        del self.root
+        del self.connection
+
+    def _get(self, range=None):
+        request = self.app.REQUEST
+        if range is not None:
+            request.environ['HTTP_RANGE'] = 'bytes=%s' % range
+        return self.file.index_html(request, request.RESPONSE)
+
+    def _consume(self, iterator):
+        try:
+            return b''.join(iterator)
+        finally:
+            iterator.close()
+
+    def testStoredInBlob(self):
+        from OFS.Image import BlobData
+        self.assertIsInstance(aq_base(self.file.data), BlobData)
+        self.assertEqual(self.app.small.data, b'small data')
+        self.assertEqual(self.file.size, len(self.data))
+        self.assertEqual(len(self.file), len(self.data))
+        self.assertEqual(bytes(self.file), self.data)
+        self.assertEqual(self.file.data[10:20], self.data[10:20])
+
+    def testIndexHtmlReturnsFileIterator(self):
+        from ZPublisher.Iterators import filestream_iterator
+        result = self._get()
+        self.assertIsInstance(result, filestream_iterator)
+        self.assertEqual(self._consume(result), self.data)
+        self.assertFalse(self.app.REQUEST.RESPONSE._wrote)
+
+    def testIndexHtmlUncommitted(self):
+        self.file.manage_upload(self.data[::-1])
+        self.assertEqual(self._get(), b'')
+        body = self.responseOut.getvalue().split(b'\r\n\r\n', 1)[1]
+        self.assertEqual(body, self.data[::-1])
+
+    def testSingleRange(self):
+        from ZPublisher.Iterators import filestream_range_iterator
+        result = self._get('70000-200000')
+        self.assertIsInstance(result, filestream_range_iterator)
+        self.assertEqual(self._consume(result), self.data[70000:200001])
+        response = self.app.REQUEST.RESPONSE
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.getHeader('Content-Range'),
+                         'bytes 70000-200000/%d' % len(self.data))
+
+    def testMultipleRanges(self):
+        from ZPublisher.Iterators import byteranges_iterator
+        result = self._get('10-19,70000-70009')
+        self.assertIsInstance(result, byteranges_iterator)
+        body = self._consume(result)
+        self.assertIn(b'\r\n\r\n' + self.data[10:20] + b'\r\n', body)
+        self.assertIn(b'\r\n\r\n' + self.data[70000:70010] + b'\r\n', body)
+        response = self.app.REQUEST.RESPONSE
+        self.assertEqual(response.getHeader('Content-Length'), str(len(body)))
+        self.assertFalse(response._wrote)
+
+    def testMultipleRangesUncommitted(self):
+        self.file.manage_upload(self.data[::-1])
+        self.assertEqual(self._get('10-19,70000-70009'), b'')
+        body = self.responseOut.getvalue()
+        data = self.data[::-1]
+        self.assertIn(b'\r\n\r\n' + data[10:20] + b'\r\n', body)
+        self.assertIn(b'\r\n\r\n' + data[70000:70010] + b'\r\n', body)
+
+    def testImageInBlob(self):
+        with open(filedata, 'rb') as fd:
+            gif = fd.read()
+        OFS.Image.blob_storage = True
+        try:
+            self.app.manage_addImage('image', gif + b'\0' * (3 << 16))
+        finally:
+            OFS.Image.blob_storage = False
+        image = self.app.image
+        self.assertIsInstance(aq_base(image.data), OFS.Image.BlobData)
+        self.assertEqual(image.content_type, 'image/gif')
+        self.assertEqual((image.width, image.height), (16, 16))
+
+    def testETag(self):
+        import hashlib
+        self.assertEqual(self.file.http__etag(),
+                         'md5-' + hashlib.md5(self.data).hexdigest())
+
+    def testMigrateToBlob(self):
+        from OFS.Image import BlobData
+        from OFS.Image import migrateToBlob
+        self.file.manage_upload(self.data)
+        transaction.commit()
+        self.assertIsInstance(aq_base(self.file.data), Pdata)
+        self.assertTrue(migrateToBlob(self.file))
+        transaction.commit()
+        self.assertIsInstance(aq_base(self.file.data), BlobData)
+        self.assertEqual(self.file._pdata_index, None)
+        self.assertEqual(len(self.file.data), len(self.data))
+        self.assertEqual(self._consume(self._get()), self.data)
+        self.assertFalse(migrateToBlob(self.file))
+        self.assertFalse(migrateToBlob(self.app.small))
+
+
+class GetImageInfoTests(unittest.TestCase):
+
+    def _callFUT(self, data):
+        from OFS.Image import getImageInfo
+        return getImageInfo(data)
+
+    def _makeJPEG(self):
+        # An APP0 segment pushes the frame header out of the first chunks.
+        app0 = b'\xff\xe0' + struct.pack('>H', 1002) + b'\0' * 1000
+        sof0 = b'\xff\xc0' + struct.pack('>HBHH', 11, 8, 20, 30) + b'\0' * 6
+        return b'\xff\xd8' + app0 + sof0 + b'\xff\xda'
+
+    def test_gif(self):
+        with open(filedata, 'rb') as fd:
+            data = fd.read()
+        self.assertEqual(self._callFUT(data), ('image/gif', 16, 16))
+        self.assertEqual(self._callFUT(makePdataChain(data, 5)),
+                         ('image/gif', 16, 16))
+
+    def test_jpeg(self):
+        data = self._makeJPEG()
+        self.assertEqual(self._callFUT(data), ('image/jpeg', 30, 20))
+        self.assertEqual(self._callFUT(makePdataChain(data, 100)),
+                         ('image/jpeg', 30, 20))
+
+    def test_reads_header_only(self):
+        data = makePdataChain(b'GIF89a' + struct.pack('<HH', 3, 4) +
+                              b'\0' * 500, 7)
+        seen = []
+        chunks = data.chunks
+
+        def counting_chunks():
+            for chunk in chunks():
+                seen.append(chunk)
+                yield chunk
+
+        data.chunks = counting_chunks
+        self.assertEqual(self._callFUT(data), ('image/gif', 3, 4))
+        self.assertEqual(len(seen), 4)
+
+    def test_unknown(self):
+        self.assertEqual(self._callFUT(b'abc'), ('', -1, -1))
+        self.assertEqual(self._callFUT(makePdataChain(b'abc' * 20, 7)),
+                         ('', -1, -1))
+
+
 class FileEditTests(Testing.ZopeTestCase.FunctionalTestCase):
     """Browser testing ..Image.File"""
 
@@ -0,0 +1,53 @@
+import codecs
+
+import Testing.testbrowser
+import Testing.ZopeTestCase
+import Zope2.App
+
+
+class FindFormTests(Testing.ZopeTestCase.FunctionalTestCase):
+    """Browser testing the paged results of the ZMI Find tab"""
+
+    def setUp(self):
+        super(FindFormTests, self).setUp()
+
+        Zope2.App.zcml.load_site(force=True)
+
+        uf = self.app.acl_users
+        uf.userFolderAddUser('manager', 'manager_pass', ['Manager'], [])
+
+        self.app.manage_addFolder('findTest')
+        for i in range(5):
+            self.app.findTest.manage_addFile('file%d' % i)
+
+        self.browser = Testing.testbrowser.Browser()
+        self.browser.addHeader(
+            'Authorization',
+            'basic {}'.format(codecs.encode(
+                b'manager:manager_pass', 'base64').decode()))
+
+    def test_form(self):
+        self.browser.open('http://localhost/findTest/manage_findForm')
+        self.assertNotIn('zmi-find-results', self.browser.contents)
+        self.assertRaises(LookupError, self.browser.getControl,
+                          name='query_cursor')
+
+    def test_pages(self):
+        self.browser.open(
+            'http://localhost/findTest/manage_findForm'
+            '?obj_metatypes:list=File&search_sub:int=1&batch_size=2'
+            '&btn_submit=Find')
+        self.assertIn('Displaying 2 items', self.browser.contents)
+        self.assertIn('file0/manage_workspace', self.browser.contents)
+        self.assertNotIn('file2/manage_workspace', self.browser.contents)
+
+        self.browser.getControl(name='query_cursor').click()
+        self.assertIn('after <em>file1</em>', self.browser.contents)
+        self.assertIn('file2/manage_workspace', self.browser.contents)
+        self.assertNotIn('file0/manage_workspace', self.browser.contents)
+
+        self.browser.getControl(name='query_cursor').click()
+        self.assertIn('Displaying 1 items', self.browser.contents)
+        self.assertIn('file4/manage_workspace', self.browser.contents)
+        self.assertRaises(LookupError, self.browser.getControl,
+                          name='query_cursor')
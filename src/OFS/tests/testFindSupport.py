@@ -47,3 +47,129 @@ class TestFindSupport(unittest.TestCase):
         self.assertEqual(self.base['1'].id, '1')
         self.assertEqual(self.base['2'].id, 'foo2')
         self.assertEqual(self.base['3'].id, '3')
+
+
+class TestIncrementalFind(unittest.TestCase):
+
+    def setUp(self):
+        self.base = DummyFolder('base')
+        for id in ('a', 'b', 'c'):
+            folder = self.base[id] = DummyFolder(id)
+            for sub in ('1', '2'):
+                folder[sub] = DummyItem(sub)
+
+    def _paths(self, results):
+        return [path for path, ob in results]
+
+    def test_iterZopeFind(self):
+        results = self.base.iterZopeFind(self.base, search_sub=1)
+        self.assertEqual(self._paths(results),
+                         ['a', 'a/1', 'a/2', 'b', 'b/1', 'b/2',
+                          'c', 'c/1', 'c/2'])
+        results = self.base.iterZopeFind(self.base, obj_ids=['2'],
+                                         search_sub=1)
+        self.assertEqual(self._paths(results), ['a/2', 'b/2', 'c/2'])
+        self.assertEqual(
+            self._paths(self.base.iterZopeFind(self.base)), ['a', 'b', 'c'])
+
+    def test_iterZopeFind_cursor(self):
+        results = self.base.iterZopeFind(self.base, search_sub=1,
+                                         cursor='a/2')
+        self.assertEqual(self._paths(results),
+                         ['b', 'b/1', 'b/2', 'c', 'c/1', 'c/2'])
+        # After a container the search continues with its subobjects.
+        results = self.base.iterZopeFind(self.base, search_sub=1,
+                                         cursor='b')
+        self.assertEqual(self._paths(results),
+                         ['b/1', 'b/2', 'c', 'c/1', 'c/2'])
+        results = self.base.iterZopeFind(self.base, cursor='b')
+        self.assertEqual(self._paths(results), ['c'])
+
+    def test_iterZopeFind_cursor_gone(self):
+        del self.base['b']['1']
+        results = self.base.iterZopeFind(self.base, search_sub=1,
+                                         cursor='b/1')
+        self.assertEqual(self._paths(results),
+                         ['b/2', 'c', 'c/1', 'c/2'])
+
+    def test_ZopeFindPage(self):
+        found = []
+        cursor = None
+        while True:
+            page = self.base.ZopeFindPage(self.base, obj_ids=['1', 'c'],
+                                          search_sub=1, cursor=cursor,
+                                          size=2)
+            found.append(self._paths(page['results']))
+            cursor = page['cursor']
+            if cursor is None:
+                break
+        self.assertEqual(found, [['a/1', 'b/1'], ['c', 'c/1'], []])
+
+    def test_ZopeFindPage_scan_limit(self):
+        from OFS import FindSupport
+        orig = FindSupport.find_scan_limit
+        FindSupport.find_scan_limit = 4
+        try:
+            page = self.base.ZopeFindPage(self.base, obj_ids=['c'],
+                                          search_sub=1)
+            self.assertEqual(page, {'results': [], 'cursor': 'b'})
+            page = self.base.ZopeFindPage(self.base, obj_ids=['c'],
+                                          search_sub=1, cursor='b')
+            self.assertEqual(self._paths(page['results']), ['c'])
+            self.assertEqual(page['cursor'], 'c/1')
+            page = self.base.ZopeFindPage(self.base, obj_ids=['c'],
+                                          search_sub=1, cursor='c/1')
+            self.assertEqual(page, {'results': [], 'cursor': None})
+        finally:
+            FindSupport.find_scan_limit = orig
+
+
+class TestIncrementalFindLoading(unittest.TestCase):
+
+    def setUp(self):
+        import transaction
+        from ZODB.DB import DB
+        from OFS.Folder import Folder
+        from OFS.Image import File
+        self.db = DB(None)
+        self.addCleanup(self.db.close)
+        tm = transaction.TransactionManager()
+        conn = self.db.open(tm)
+        root = conn.root()['root'] = Folder('root')
+        for i in range(10):
+            folder = Folder('folder%d' % i)
+            root._setObject(folder.getId(), folder)
+            for j in range(10):
+                folder._setObject('file%d' % j, File('file%d' % j, '', b''))
+        tm.commit()
+        conn.cacheMinimize()
+        conn.close()
+        self.tm = transaction.TransactionManager()
+        self.conn = self.db.open(self.tm)
+        self.addCleanup(self.tm.abort)
+
+    def test_prefilter(self):
+        root = self.conn.root()['root']
+        results = root.iterZopeFind(root, obj_metatypes=['Folder'],
+                                    search_sub=1, prefilter=True)
+        self.assertEqual(len(list(results)), 10)
+        for folder in root.objectValues():
+            for ob in folder.objectValues():
+                self.assertEqual(ob._p_changed, None)
+
+    def test_deactivate(self):
+        from OFS import FindSupport
+        root = self.conn.root()['root']
+        orig = FindSupport.deactivate_batch
+        FindSupport.deactivate_batch = 7
+        try:
+            results = root.iterZopeFind(root, obj_ids=['file3'],
+                                        search_sub=1)
+            found = list(results)
+        finally:
+            FindSupport.deactivate_batch = orig
+        self.assertEqual(len(found), 10)
+        for path, ob in found:
+            self.assertEqual(ob._p_changed, False)
+        for folder in root.objectValues():
+            self.assertEqual(folder._getOb('file5')._p_changed, None)
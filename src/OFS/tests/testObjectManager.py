@@ -8,7 +8,7 @@ from AccessControl.SecurityManagement import noSecurityManager
 from AccessControl.SecurityManager import setSecurityPolicy
 from AccessControl.SpecialUsers import emergency_user, nobody, system
 from AccessControl.User import User  # before SpecialUsers
-from Acquisition import aq_self, Implicit
+from Acquisition import aq_base, aq_self, Implicit
 from six import PY2
 from zExceptions import BadRequest
 from zope.component.testing import PlacelessSetup
@@ -488,6 +488,231 @@ class ObjectManagerTests(PlacelessSetup, unittest.TestCase):
         om['1'] = si1
         self.assertTrue(si1 in list(om.values()))
 
+    def test_objectIds_spec(self):
+        om = self._makeOne()
+        for id, meta_type in (('a', 'Foo'), ('b', 'Bar'), ('c', 'Foo'),
+                              ('d', 'Baz')):
+            si = SimpleItem()
+            si.id = id
+            si.meta_type = meta_type
+            om._setObject(id, si, set_owner=0)
+        self.assertEqual(om.objectIds('Foo'), ['a', 'c'])
+        self.assertEqual(om.objectIds(['Foo', 'Baz']), ['a', 'c', 'd'])
+        self.assertEqual(om.objectIds(('Foo', 'Foo')), ['a', 'c'])
+        self.assertEqual(om.objectIds('Qux'), [])
+        om._delObject('a')
+        self.assertEqual(om.objectIds('Foo'), ['c'])
+        om._delObject('c')
+        self.assertEqual(om.objectIds('Foo'), [])
+        self.assertEqual([ob.getId() for ob in om.objectValues('Bar')],
+                         ['b'])
+
+    def test_iterObjectValues_iterObjectItems(self):
+        om = self._makeOne()
+        for id, meta_type in (('a', 'Foo'), ('b', 'Bar'), ('c', 'Foo')):
+            si = SimpleItem()
+            si.id = id
+            si.meta_type = meta_type
+            om._setObject(id, si, set_owner=0)
+        self.assertEqual([ob.getId() for ob in om.iterObjectValues()],
+                         ['a', 'b', 'c'])
+        self.assertEqual([ob.getId() for ob in om.iterObjectValues('Foo')],
+                         ['a', 'c'])
+        self.assertEqual([(id, ob.getId()) for id, ob
+                          in om.iterObjectItems(['Bar'])],
+                         [('b', 'b')])
+        ob = next(om.iterObjectValues())
+        self.assertTrue(aq_base(ob.aq_parent) is aq_base(om))
+
+    def test_iterObjectValues_iterObjectItems_w_overrides(self):
+        klass = self._getTargetClass()
+
+        class Filtering(klass):
+
+            def objectValues(self, spec=None):
+                return [ob for ob in klass.objectValues(self, spec)
+                        if ob.getId() != 'b']
+
+            def objectItems(self, spec=None):
+                return [(id, ob) for id, ob in klass.objectItems(self, spec)
+                        if id != 'b']
+
+        om = Filtering().__of__(FauxRoot())
+        for id in ('a', 'b', 'c'):
+            si = SimpleItem()
+            si.id = id
+            om._setObject(id, si, set_owner=0)
+        self.assertEqual([ob.getId() for ob in om.iterObjectValues()],
+                         ['a', 'c'])
+        self.assertEqual([id for id, ob in om.iterObjectItems()],
+                         ['a', 'c'])
+
+    def test_iterObjectItems_loads_on_demand(self):
+        om = self._makeOne()
+        for id in ('a', 'b', 'c'):
+            om._setObject(id, SimpleItem(), set_owner=0)
+        loaded = []
+        klass = self._getTargetClass()
+
+        def _getOb(id, default=None):
+            loaded.append(id)
+            return klass._getOb(om, id, default)
+
+        aq_base(om)._getOb = _getOb
+        try:
+            items = om.iterObjectItems()
+            self.assertEqual(loaded, [])
+            self.assertEqual(next(items)[0], 'a')
+            self.assertEqual(loaded, ['a'])
+        finally:
+            del aq_base(om)._getOb
+
+    def _recordEvents(self):
+        import zope.event
+        events = []
+        zope.event.subscribers.append(events.append)
+        self.addCleanup(zope.event.subscribers.remove, events.append)
+        return events
+
+    def _eventNames(self, events):
+        return [e.__class__.__name__ for e in events]
+
+    def test_setObjects(self):
+        om = self._makeOne()
+        items = []
+        for id in ('a', 'b', 'c'):
+            si = SimpleItem()
+            si.id = id
+            si.meta_type = 'Foo'
+            items.append((id, si))
+        events = self._recordEvents()
+        self.assertEqual(om._setObjects(items, set_owner=0),
+                         ['a', 'b', 'c'])
+        self.assertEqual(om.objectIds(), ['a', 'b', 'c'])
+        self.assertEqual(om.objectIds('Foo'), ['a', 'b', 'c'])
+        self.assertEqual(om.a.getId(), 'a')
+        self.assertEqual(self._eventNames(events), [
+            'ObjectWillBeAddedEvent', 'ObjectWillBeAddedEvent',
+            'ObjectWillBeAddedEvent',
+            'ObjectAddedEvent', 'ContainerModifiedEvent',
+            'ObjectAddedEvent', 'ContainerModifiedEvent',
+            'ObjectAddedEvent', 'ContainerModifiedEvent'])
+
+    def test_setObjects_coalesce_events(self):
+        om = self._makeOne()
+        events = self._recordEvents()
+        om._setObjects({'a': SimpleItem(), 'b': SimpleItem()},
+                       set_owner=0, coalesce_events=True)
+        self.assertEqual(sorted(om.objectIds()), ['a', 'b'])
+        self.assertEqual(self._eventNames(events)[2:], [
+            'ObjectAddedEvent', 'ObjectAddedEvent', 'ContainerModifiedEvent'])
+
+    def test_setObjects_suppress_events(self):
+        om = self._makeOne()
+        events = self._recordEvents()
+        om._setObjects([('a', SimpleItem())], set_owner=0,
+                       suppress_events=True)
+        self.assertEqual(om.objectIds(), ['a'])
+        self.assertEqual(events, [])
+
+    def test_setObjects_duplicate_ids(self):
+        om = self._makeOne()
+        self.assertRaises(BadRequest, om._setObjects,
+                          [('a', SimpleItem()), ('a', SimpleItem())])
+        self.assertEqual(om.objectIds(), [])
+
+    def test_setObjects_set_owner(self):
+        om = self._makeOne()
+        user = User('user', '123', (), ()).__of__(FauxRoot())
+        newSecurityManager(None, user)
+        si = SimpleItem()
+        om._setObjects([('a', si)])
+        self.assertEqual(si.__ac_local_roles__, {'user': ['Owner']})
+
+    def test_delObjects(self):
+        om = self._makeOne()
+        for id in ('a', 'b', 'c'):
+            om._setObject(id, SimpleItem(), set_owner=0)
+        events = self._recordEvents()
+        om._delObjects(['c', 'a'])
+        self.assertEqual(om.objectIds(), ['b'])
+        self.assertFalse(om.hasObject('a'))
+        self.assertEqual(self._eventNames(events), [
+            'ObjectWillBeRemovedEvent', 'ObjectWillBeRemovedEvent',
+            'ObjectRemovedEvent', 'ContainerModifiedEvent',
+            'ObjectRemovedEvent', 'ContainerModifiedEvent'])
+
+    def test_delObjects_coalesce_events(self):
+        om = self._makeOne()
+        for id in ('a', 'b', 'c'):
+            om._setObject(id, SimpleItem(), set_owner=0)
+        events = self._recordEvents()
+        om._delObjects(['a', 'b', 'a'], coalesce_events=True)
+        self.assertEqual(om.objectIds(), ['c'])
+        self.assertEqual(self._eventNames(events)[2:], [
+            'ObjectRemovedEvent', 'ObjectRemovedEvent',
+            'ContainerModifiedEvent'])
+
+    def test_manage_delObjects_multiple(self):
+        om = self._makeOne()
+        for id in ('a', 'b', 'c'):
+            om._setObject(id, SimpleItem(), set_owner=0)
+        ids = ['a', 'c']
+        om.manage_delObjects(ids)
+        self.assertEqual(om.objectIds(), ['b'])
+
+    def test_manage_delObjects_w_overridden_delObject(self):
+        klass = self._getTargetClass()
+        deleted = []
+
+        class Recording(klass):
+
+            def _delObject(self, id, *args, **kw):
+                deleted.append(id)
+                return klass._delObject(self, id, *args, **kw)
+
+        om = Recording().__of__(FauxRoot())
+        for id in ('a', 'b', 'c'):
+            om._setObject(id, SimpleItem(), set_owner=0)
+        om.manage_delObjects(['a', 'c'])
+        self.assertEqual(om.objectIds(), ['b'])
+        self.assertEqual(sorted(deleted), ['a', 'c'])
+
+    def test_manage_delObjects_missing_deletes_nothing(self):
+        om = self._makeOne()
+        om._setObject('a', SimpleItem(), set_owner=0)
+        self.assertRaises(BadRequest, om.manage_delObjects, ['a', 'x'])
+        self.assertEqual(om.objectIds(), ['a'])
+
+    def test_tpValues(self):
+        om = self._makeOne()
+        for id in ('c', 'b', 'a'):
+            sub = self._getTargetClass()()
+            sub.id = id
+            om._setObject(id, sub, set_owner=0)
+        om._setObject('item', SimpleItem(), set_owner=0)
+        self.assertEqual([ob.id for ob in om.tpValues()], ['a', 'b', 'c'])
+
+    def test_superValues(self):
+        om = self._makeOne()
+        si = SimpleItem()
+        si.id = 'a'
+        si.meta_type = 'Foo'
+        om._setObject('a', si, set_owner=0)
+        sub = self._getTargetClass()()
+        sub.meta_type = 'Sub'
+        om._setObject('sub', sub, set_owner=0)
+        sub = om.sub
+        si = SimpleItem()
+        si.id = 'b'
+        si.meta_type = 'Foo'
+        sub._setObject('b', si, set_owner=0)
+        self.assertEqual([ob.getId() for ob in sub.superValues('Foo')],
+                         ['b', 'a'])
+        self.assertEqual([aq_base(ob) for ob in sub.superValues(['Sub'])],
+                         [aq_base(sub)])
+        self.assertEqual(sub.superValues('Qux'), [])
+
     def test_list_imports(self):
         om = self._makeOne()
         # This must work whether we've done "make instance" or not.
@@ -498,6 +723,63 @@ class ObjectManagerTests(PlacelessSetup, unittest.TestCase):
             self.assertTrue(filename.endswith('.zexp') or
                             filename.endswith('.xml'))
 
+
+class MetaTypeIndexTests(unittest.TestCase):
+
+    def _makeOne(self):
+        om = ObjectManager()
+        for id, meta_type in (('a', 'Foo'), ('b', 'Bar'), ('c', 'Foo')):
+            si = SimpleItem(id)
+            si.meta_type = meta_type
+            om._setObject(id, si, set_owner=0, suppress_events=True)
+        return om
+
+    def test_index_stored(self):
+        om = self._makeOne()
+        objects, index = om._meta_type_index
+        self.assertTrue(objects is om._objects)
+        self.assertEqual(index, {'Foo': ['a', 'c'], 'Bar': ['b']})
+
+    def test_index_survives_pickling(self):
+        from ZODB.DB import DB
+        import transaction
+        db = DB(None)
+        try:
+            conn = db.open()
+            conn.root()['om'] = self._makeOne()
+            transaction.commit()
+            conn.close()
+            conn = db.open()
+            om = conn.root()['om']
+            self.assertTrue(om._meta_type_index[0] is om._objects)
+            self.assertEqual(om.objectIds('Foo'), ['a', 'c'])
+            self.assertFalse(om._p_changed)
+            conn.close()
+        finally:
+            transaction.abort()
+            db.close()
+
+    def test_index_rebuilt_after_direct_change(self):
+        om = self._makeOne()
+        stored = om._meta_type_index
+        om._objects = tuple(i for i in om._objects if i['id'] != 'a')
+        self.assertEqual(om.objectIds('Foo'), ['c'])
+        # Reading does not store the rebuilt index, the next change does.
+        self.assertTrue(om._meta_type_index is stored)
+        si = SimpleItem('d')
+        si.meta_type = 'Foo'
+        om._setObject('d', si, set_owner=0, suppress_events=True)
+        self.assertEqual(om._meta_type_index[1],
+                         {'Foo': ['c', 'd'], 'Bar': ['b']})
+
+    def test_index_built_for_existing_instances(self):
+        om = ObjectManager()
+        om._objects = ({'id': 'a', 'meta_type': 'Foo'},
+                       {'id': 'b', 'meta_type': 'Bar'})
+        self.assertEqual(om._meta_type_index, None)
+        self.assertEqual(om.objectIds('Bar'), ['b'])
+
+
 _marker = object()
 
 
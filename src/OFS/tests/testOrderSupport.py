@@ -130,6 +130,17 @@ class TestOrderSupport(unittest.TestCase):
              (('position', 0), ['o1', 'o2', 'o3', 'o4'], 0),
              (('position', 1), ['o4', 'o3', 'o2', 'o1'], 3)))
 
+    def test_moveObjectsByDelta_reorders_spec(self):
+        f = self._makeOne()
+        self.assertEqual(f.objectIds('mt1'), ['o1', 'o3'])
+        f.moveObjectsToTop('o3')
+        self.assertEqual(f.objectIds('mt1'), ['o3', 'o1'])
+        self.assertEqual(f.objectIds(['mt1', 'mt2']),
+                         ['o3', 'o1', 'o2', 'o4'])
+        self.assertEqual(f._meta_type_index,
+                         (f._objects, {'mt1': ['o3', 'o1'],
+                                       'mt2': ['o2', 'o4']}))
+
     def test_getObjectPosition(self):
         self._doCanonTest(
             'getObjectPosition',
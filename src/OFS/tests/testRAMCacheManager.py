@@ -0,0 +1,349 @@
+import unittest
+
+from Acquisition import aq_base
+from Acquisition import Implicit
+
+from OFS.Cache import Cacheable
+from OFS.Folder import Folder
+from OFS.metaconfigure import setDeprecatedManageAddDelete
+from OFS.RAMCacheManager import RAMCacheManager
+from OFS.SimpleItem import SimpleItem
+
+setDeprecatedManageAddDelete(RAMCacheManager)
+
+
+class FauxRequest(dict):
+    pass
+
+
+class FauxRoot(Implicit):
+
+    def __init__(self):
+        self.REQUEST = FauxRequest(AUTHENTICATED_USER='alice')
+
+    def getPhysicalRoot(self):
+        return self
+
+    def getPhysicalPath(self):
+        return ('',)
+
+
+class CacheableItem(Cacheable, SimpleItem):
+
+    def __init__(self, id):
+        self.id = id
+
+
+class RAMCacheTests(unittest.TestCase):
+
+    def _makeCache(self, **settings):
+        from OFS.RAMCacheManager import RAMCache
+        return RAMCache(**settings)
+
+    def _makeItems(self, *ids):
+        root = Folder('root').__of__(FauxRoot())
+        for id in ids:
+            root._setObject(id, CacheableItem(id))
+        return [root._getOb(id) for id in ids]
+
+    def test_get_set(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, 'miss'), 'miss')
+        cache.ZCache_set(ob, 'data', '', None, None)
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, 'miss'), 'data')
+        self.assertEqual(cache.ZCache_get(ob, 'other', None, None, 'miss'),
+                         'miss')
+        stats = cache.getStatistics()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['objects'],
+                         [{'path': '/root/ob', 'entries': 1}])
+
+    def test_keywords(self):
+        cache = self._makeCache()
+        ob, other = self._makeItems('ob', 'other')
+        cache.ZCache_set(ob, 'a', '', {'here': other, 'n': [1]}, None)
+        self.assertEqual(
+            cache.ZCache_get(ob, '', {'n': [1], 'here': other}, None, None),
+            'a')
+        self.assertEqual(
+            cache.ZCache_get(ob, '', {'n': [2], 'here': other}, None, None),
+            None)
+
+    def test_request_vars(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'alice', '', None, None)
+        ob.REQUEST['AUTHENTICATED_USER'] = 'bob'
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+        cache.configure(request_vars=())
+        cache.ZCache_set(ob, 'anyone', '', None, None)
+        ob.REQUEST['AUTHENTICATED_USER'] = 'alice'
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), 'anyone')
+
+    def test_mtime(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'data', '', None, lambda: 10)
+        self.assertEqual(cache.ZCache_get(ob, '', None, lambda: 10, None),
+                         'data')
+        self.assertEqual(cache.ZCache_get(ob, '', None, lambda: 11, None),
+                         None)
+        self.assertEqual(cache.getStatistics()['entries'], 0)
+
+    def test_max_age(self):
+        from OFS import RAMCacheManager
+        cache = self._makeCache(max_age=10)
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'data', '', None, None)
+        orig = RAMCacheManager.time
+        now = orig.time()
+
+        class Time(object):
+            def time(self):
+                return now + 11
+        RAMCacheManager.time = Time()
+        try:
+            self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+        finally:
+            RAMCacheManager.time = orig
+
+    def test_lru_eviction(self):
+        cache = self._makeCache(max_entries=2, policy='lru')
+        a, b, c = self._makeItems('a', 'b', 'c')
+        cache.ZCache_set(a, 'a', '', None, None)
+        cache.ZCache_set(b, 'b', '', None, None)
+        self.assertEqual(cache.ZCache_get(a, '', None, None, None), 'a')
+        cache.ZCache_set(c, 'c', '', None, None)
+        self.assertEqual(cache.ZCache_get(b, '', None, None, None), None)
+        self.assertEqual(cache.ZCache_get(a, '', None, None, None), 'a')
+        self.assertEqual(cache.ZCache_get(c, '', None, None, None), 'c')
+        self.assertEqual(cache.getStatistics()['evictions'], 1)
+
+    def test_tinylfu_admission(self):
+        cache = self._makeCache(max_entries=2, policy='tinylfu')
+        a, b, c = self._makeItems('a', 'b', 'c')
+        for ob in (a, b):
+            cache.ZCache_get(ob, '', None, None, None)
+            cache.ZCache_set(ob, ob.getId(), '', None, None)
+            for i in range(3):
+                cache.ZCache_get(ob, '', None, None, None)
+        # c was requested less often than a, the least recently used entry.
+        cache.ZCache_get(c, '', None, None, None)
+        cache.ZCache_set(c, 'c', '', None, None)
+        self.assertEqual(cache.ZCache_get(c, '', None, None, None), None)
+        self.assertEqual(cache.ZCache_get(a, '', None, None, None), 'a')
+        # Once it is requested often enough, it is admitted.
+        for i in range(5):
+            cache.ZCache_get(c, '', None, None, None)
+        cache.ZCache_set(c, 'c', '', None, None)
+        self.assertEqual(cache.ZCache_get(c, '', None, None, None), 'c')
+        self.assertEqual(cache.ZCache_get(b, '', None, None, None), None)
+
+    def test_invalidate(self):
+        cache = self._makeCache()
+        a, b = self._makeItems('a', 'b')
+        cache.ZCache_set(a, 'a1', 'view1', None, None)
+        cache.ZCache_set(a, 'a2', 'view2', None, None)
+        cache.ZCache_set(b, 'b', '', None, None)
+        self.assertEqual(cache.ZCache_invalidate(a),
+                         'Invalidated 2 cache entries.')
+        self.assertEqual(cache.ZCache_get(a, 'view1', None, None, None), None)
+        self.assertEqual(cache.ZCache_get(b, '', None, None, None), 'b')
+
+    def test_configure_shrinks(self):
+        cache = self._makeCache(max_entries=3)
+        for ob in self._makeItems('a', 'b', 'c'):
+            cache.ZCache_set(ob, ob.getId(), '', None, None)
+        cache.configure(max_entries=1)
+        stats = cache.getStatistics()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['evictions'], 2)
+
+
+class RAMCacheManagerTests(unittest.TestCase):
+
+    def _makeRoot(self):
+        from OFS.RAMCacheManager import manage_addRAMCacheManager
+        root = Folder('root').__of__(FauxRoot())
+        manage_addRAMCacheManager(root, 'cache', 'Cache')
+        root._setObject('ob', CacheableItem('ob'))
+        root.ob.ZCacheable_setManagerId('cache')
+        return root
+
+    def tearDown(self):
+        from OFS import RAMCacheManager
+        RAMCacheManager.caches.clear()
+        RAMCacheManager._cacheids.clear()
+        RAMCacheManager._swept[0] = 0
+
+    def test_cacheable(self):
+        root = self._makeRoot()
+        self.assertEqual(root.ob.ZCacheable_getManagerIds(),
+                         ({'id': 'cache', 'title': 'Cache'},))
+        root.ob.ZCacheable_set('data')
+        self.assertEqual(root.ob.ZCacheable_get(), 'data')
+        self.assertEqual(root.cache.getStatistics()['hits'], 1)
+        root.ob.ZCacheable_invalidate()
+        self.assertEqual(root.ob.ZCacheable_get(), None)
+
+    def test_cache_per_manager(self):
+        from OFS.RAMCacheManager import manage_addRAMCacheManager
+        root = self._makeRoot()
+        manage_addRAMCacheManager(root, 'other')
+        self.assertFalse(root.cache.ZCacheManager_getCache() is
+                         root.other.ZCacheManager_getCache())
+
+    def test_delete_drops_cache(self):
+        from OFS.RAMCacheManager import caches
+        root = self._makeRoot()
+        root.ob.ZCacheable_set('data')
+        self.assertEqual(len(caches), 1)
+        root._delObject('cache')
+        self.assertEqual(len(caches), 0)
+
+    def test_moved_in_other_process(self):
+        import transaction
+        from ZODB.DB import DB
+        from OFS.RAMCacheManager import caches
+        db = DB(None)
+        self.addCleanup(db.close)
+        tm = transaction.TransactionManager()
+        conn = db.open(tm)
+        self.addCleanup(tm.abort)
+        root = self._makeRoot()
+        conn.root()['root'] = aq_base(root)
+        tm.commit()
+        old = root.cache._cacheid
+        root.cache.ZCacheManager_getCache()
+        # Moving the manager elsewhere gave it a new cache id.
+        root.cache._resetCacheId()
+        root.cache.ZCacheManager_getCache()
+        self.assertNotIn(old, caches)
+        self.assertIn(root.cache._cacheid, caches)
+
+    def test_idle_cache_closed(self):
+        from OFS import RAMCacheManager
+        from OFS.RAMCacheManager import caches
+        from OFS.RAMCacheManager import manage_addRAMCacheManager
+        root = self._makeRoot()
+        manage_addRAMCacheManager(root, 'other')
+        root.cache.ZCacheManager_getCache()
+        orig = RAMCacheManager.time
+        now = orig.time()
+
+        class Time(object):
+            def time(self):
+                return now + 3601
+        RAMCacheManager.time = Time()
+        try:
+            # The manager of the idle cache may have been deleted.
+            root.other.ZCacheManager_getCache()
+        finally:
+            RAMCacheManager.time = orig
+        self.assertNotIn(root.cache._cacheid, caches)
+        self.assertIn(root.other._cacheid, caches)
+
+    def test_manage_editProps(self):
+        root = self._makeRoot()
+        root.ob.ZCacheable_set('data')
+        root.cache.manage_editProps('New', {
+            'max_entries': '10', 'max_age': '0',
+            'request_vars': 'AUTHENTICATED_USER HTTP_ACCEPT',
+            'policy': 'lru'})
+        self.assertEqual(root.cache.title, 'New')
+        self.assertEqual(root.cache.getSettings(), {
+            'max_entries': 10, 'max_age': 0,
+            'request_vars': ('AUTHENTICATED_USER', 'HTTP_ACCEPT'),
+            'policy': 'lru', 'track_dependencies': False})
+        cache = root.cache.ZCacheManager_getCache()
+        self.assertEqual(cache.max_entries, 10)
+        self.assertEqual(cache.policy, 'lru')
+        self.assertRaises(ValueError, root.cache.manage_editProps,
+                          'New', {'policy': 'random'})
+
+    def test_manage_invalidate(self):
+        root = self._makeRoot()
+        root.ob.ZCacheable_set('data')
+        root.cache.manage_invalidate()
+        self.assertEqual(root.ob.ZCacheable_get(), None)
+        self.assertEqual(root.cache.getStatistics()['entries'], 0)
+
+
+class DependencyTrackingTests(unittest.TestCase):
+
+    def setUp(self):
+        import transaction
+        from ZODB.DB import DB
+        from OFS.RAMCacheManager import manage_addRAMCacheManager
+        self.db = DB(None)
+        self.addCleanup(self.db.close)
+        self.tm = transaction.TransactionManager()
+        conn = self.db.open(self.tm)
+        root = Folder('root')
+        conn.root()['root'] = root
+        manage_addRAMCacheManager(root, 'cache')
+        root.cache.manage_editProps('', {'track_dependencies': True})
+        for id in ('ob', 'dep', 'other'):
+            root._setObject(id, CacheableItem(id))
+        root.ob.ZCacheable_setManagerId('cache')
+        self.tm.commit()
+        self.root = root.__of__(FauxRoot())
+
+    def tearDown(self):
+        from OFS.RAMCacheManager import caches
+        self.tm.abort()
+        for cache in caches.values():
+            cache.close()
+        caches.clear()
+
+    def _render(self):
+        ob = self.root.ob
+        data = ob.ZCacheable_get()
+        if data is None:
+            data = self.root.dep.title
+            ob.ZCacheable_set(data)
+        return data
+
+    def _change(self, id):
+        import transaction
+        tm = transaction.TransactionManager()
+        conn = self.db.open(tm)
+        ob = conn.root()['root']._getOb(id)
+        ob.title = ob.title + '!'
+        tm.commit()
+        conn.close()
+
+    def test_invalidate_on_change(self):
+        self.tm.begin()
+        self.assertEqual(self._render(), '')
+        self.assertEqual(self.root.ob.ZCacheable_get(), '')
+        self._change('other')
+        self.tm.begin()
+        self.assertEqual(self.root.ob.ZCacheable_get(), '')
+        self._change('dep')
+        self.tm.begin()
+        self.assertEqual(self.root.ob.ZCacheable_get(), None)
+        self.assertEqual(self._render(), '!')
+        self.assertEqual(self.root.ob.ZCacheable_get(), '!')
+
+    def test_changed_while_rendering(self):
+        self.tm.begin()
+        self.root.ob.ZCacheable_get()
+        self._change('dep')
+        data = self.root.dep.title
+        self.root.ob.ZCacheable_set(data)
+        self.assertEqual(self.root.ob.ZCacheable_get(), None)
+        self.tm.begin()
+        self.assertEqual(self._render(), '!')
+        self.assertEqual(self.root.ob.ZCacheable_get(), '!')
+
+    def test_disable(self):
+        self.root.cache.manage_editProps('', {})
+        self.tm.commit()
+        self.assertEqual(self._render(), '')
+        self._change('dep')
+        self.tm.begin()
+        self.assertEqual(self.root.ob.ZCacheable_get(), '')
@@ -13,6 +13,8 @@
 ##############################################################################
 import unittest
 
+from Acquisition import aq_base
+
 
 def makeConnection():
     import ZODB
@@ -110,6 +112,14 @@ class TestRequestRange(unittest.TestCase):
         if body:
             body = body.split(b'\r\n\r\n', 1)[1]
 
+        # Multiple ranges of small files are returned as an iterator.
+        if not isinstance(rv, bytes):
+            iterator = rv
+            try:
+                rv = b''.join(iterator)
+            finally:
+                iterator.close()
+
         return body + rv
 
     def createLastModifiedDate(self, offset=0):
@@ -272,6 +282,49 @@ class TestRequestRange(unittest.TestCase):
         range = '%d-%d' % (start, end - 1)
         self.expectSingleRange(range, start, end)
 
+    def testBigFileIndex(self):
+        # The start offsets of the Pdata links of big files are indexed.
+        self.uploadBigFile()
+        head, tree = self.file._pdata_index
+        self.assertTrue(head is aq_base(self.file.data))
+        offsets = []
+        pos, data = 0, self.file.data
+        while data is not None:
+            offsets.append(pos)
+            self.assertTrue(tree[pos] is aq_base(data))
+            pos += len(data.data)
+            data = data.next
+        self.assertEqual(list(tree.keys()), offsets)
+        self.assertEqual(self.file._pdata_seek(0), (0, head))
+        self.assertEqual(self.file._pdata_seek(offsets[1]),
+                         (offsets[1], tree[offsets[1]]))
+        pos = offsets[2]
+        self.assertEqual(self.file._pdata_seek(pos + 10), (pos, tree[pos]))
+
+    def testBigFileWithoutIndex(self):
+        # Ranges of files uploaded before the index existed are served
+        # by walking the Pdata chain.
+        self.uploadBigFile()
+        del self.file._pdata_index
+        pos, data = self.file._pdata_seek(100000)
+        self.assertEqual(pos, 0)
+        self.assertTrue(aq_base(data) is aq_base(self.file.data))
+        join = 3 * (1 << 16)
+        self.expectSingleRange('%d-%d' % (join - 1000, join + 999),
+                               join - 1000, join + 1000)
+
+    def testMultipleRangesBigFileWithoutIndex(self):
+        self.uploadBigFile()
+        del self.file._pdata_index
+        self.expectMultipleRanges(
+            '200000-200010,70000-80000,210000-210010',
+            [(200000, 200011), (70000, 80001), (210000, 210011)])
+
+    def testBigFileIndexDroppedOnUpdate(self):
+        self.uploadBigFile()
+        self.file.update_data(b'Small data')
+        self.assertEqual(self.file._pdata_index, None)
+
     def testBigFileEndOverflow(self):
         self.uploadBigFile()
         l = len(self.data)
@@ -286,6 +339,40 @@ class TestRequestRange(unittest.TestCase):
     def testMultipleRanges(self):
         self.expectMultipleRanges('3-7,10-15', [(3, 8), (10, 16)])
 
+    def testMultipleRangesIterator(self):
+        from ZPublisher.Iterators import byteranges_iterator
+        req = self.app.REQUEST
+        req.environ['HTTP_RANGE'] = 'bytes=3-7,10-15'
+        rv = self.file.index_html(req, req.RESPONSE)
+        self.assertIsInstance(rv, byteranges_iterator)
+        rv.close()
+        self.assertEqual(self.responseOut.getvalue(), b'')
+
+    def testOverlappingRanges(self):
+        self.expectMultipleRanges('20-30,3-7,5-10,25-26',
+                                  [(20, 31), (3, 11)])
+
+    def testOverlappingRangesSingle(self):
+        self.expectSingleRange('3-7,5-10,0-4', 0, 11)
+
+    def testTooManyRanges(self):
+        from OFS import Image
+        old = Image.max_ranges
+        Image.max_ranges = 2
+        try:
+            self.expectOK('bytes=1-2,4-5,7-8')
+        finally:
+            Image.max_ranges = old
+
+    def testTooManyRangesOverlapping(self):
+        from OFS import Image
+        old = Image.max_ranges
+        Image.max_ranges = 2
+        try:
+            self.expectMultipleRanges('1-2,4-5,1-3', [(1, 4), (4, 6)])
+        finally:
+            Image.max_ranges = old
+
     def testMultipleRangesDraft(self):
         self.expectMultipleRanges('3-7,10-15', [(3, 8), (10, 16)], draft=1)
 
@@ -293,7 +380,7 @@ class TestRequestRange(unittest.TestCase):
         self.uploadBigFile()
         self.expectMultipleRanges(
             '3-700,10-15,-10000',
-            [(3, 701), (10, 16), (len(self.data) - 10000, len(self.data))])
+            [(3, 701), (len(self.data) - 10000, len(self.data))])
 
     def testMultipleRangesBigFileOutOfOrder(self):
         self.uploadBigFile()
@@ -336,6 +423,16 @@ class TestRequestRange(unittest.TestCase):
             '10-25', 10, 26,
             if_range=self.file.http__etag())
 
+    def testEqualIfRangeQuotedEtag(self):
+        self.expectSingleRange(
+            '10-25', 10, 26,
+            if_range='"%s"' % self.file.http__etag())
+
+    def testWeakIfRangeEtag(self):
+        self.expectOK(
+            '10-25',
+            if_range='W/"%s"' % self.file.http__etag())
+
     def testNotEqualIfRangeEtag(self):
         self.expectOK(
             '10-25',
@@ -0,0 +1,260 @@
+import shutil
+import tempfile
+import unittest
+
+from OFS.Folder import Folder
+from OFS.metaconfigure import setDeprecatedManageAddDelete
+from OFS.SharedCacheManager import fcntl
+from OFS.SharedCacheManager import SharedCacheManager
+from OFS.tests.testRAMCacheManager import CacheableItem
+from OFS.tests.testRAMCacheManager import FauxRoot
+
+setDeprecatedManageAddDelete(SharedCacheManager)
+
+
+class SharedCacheTestBase(unittest.TestCase):
+
+    def setUp(self):
+        from OFS import SharedCacheManager
+        self.directory = tempfile.mkdtemp()
+        SharedCacheManager.directory = self.directory
+
+    def tearDown(self):
+        from OFS import SharedCacheManager
+        from OFS.RAMCacheManager import caches
+        for cache in list(caches.values()):
+            cache.close()
+        caches.clear()
+        SharedCacheManager.directory = None
+        shutil.rmtree(self.directory)
+
+
+@unittest.skipIf(fcntl is None, 'Shared caches need fcntl')
+class SharedCacheTests(SharedCacheTestBase):
+
+    def _makeCache(self, name='test', **settings):
+        from OFS.SharedCacheManager import SharedCache
+        cache = SharedCache(name, **settings)
+        self.addCleanup(cache.close)
+        return cache
+
+    def _makeItems(self, *ids):
+        root = Folder('root').__of__(FauxRoot())
+        for id in ids:
+            root._setObject(id, CacheableItem(id))
+        return [root._getOb(id) for id in ids]
+
+    def test_get_set(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, 'miss'), 'miss')
+        cache.ZCache_set(ob, {'text': u'data'}, '', None, None)
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, 'miss'),
+                         {'text': u'data'})
+        self.assertEqual(cache.ZCache_get(ob, 'other', None, None, 'miss'),
+                         'miss')
+        stats = cache.getStatistics()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_shared(self):
+        # Caches with the same name share their entries, like the caches
+        # of one manager in different processes.
+        first = self._makeCache()
+        second = self._makeCache()
+        ob, = self._makeItems('ob')
+        first.ZCache_set(ob, 'data', '', {'n': 1}, None)
+        self.assertEqual(second.ZCache_get(ob, '', {'n': 1}, None, None),
+                         'data')
+        self.assertEqual(second.ZCache_invalidate(ob),
+                         'Invalidated 1 cache entries.')
+        self.assertEqual(first.ZCache_get(ob, '', {'n': 1}, None, None),
+                         None)
+        other = self._makeCache('other')
+        first.ZCache_set(ob, 'data', '', None, None)
+        self.assertEqual(other.ZCache_get(ob, '', None, None, None), None)
+
+    def test_geometry(self):
+        first = self._makeCache(max_entries=8)
+        second = self._makeCache(max_entries=16)
+        self.assertNotEqual(first.getPath(), second.getPath())
+        ob, = self._makeItems('ob')
+        first.ZCache_set(ob, 'data', '', None, None)
+        self.assertEqual(second.ZCache_get(ob, '', None, None, None), None)
+        second.configure(max_entries=8)
+        self.assertEqual(second.getPath(), first.getPath())
+        self.assertEqual(second.ZCache_get(ob, '', None, None, None), 'data')
+
+    def test_mtime_and_max_age(self):
+        from OFS import SharedCacheManager
+        cache = self._makeCache(max_age=10)
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'data', '', None, lambda: 10)
+        self.assertEqual(cache.ZCache_get(ob, '', None, lambda: 10, None),
+                         'data')
+        self.assertEqual(cache.ZCache_get(ob, '', None, lambda: 11, None),
+                         None)
+        orig = SharedCacheManager.time
+        now = orig.time()
+
+        class Time(object):
+            def time(self):
+                return now + 11
+        SharedCacheManager.time = Time()
+        try:
+            self.assertEqual(
+                cache.ZCache_get(ob, '', None, lambda: 10, None), None)
+            self.assertEqual(cache.getStatistics()['entries'], 0)
+        finally:
+            SharedCacheManager.time = orig
+
+    def test_too_large(self):
+        cache = self._makeCache(slot_size=1024)
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, b'x' * 2048, '', None, None)
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+
+    def test_unpicklable(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, lambda: None, '', None, None)
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+
+    def test_eviction(self):
+        cache = self._makeCache(max_entries=4)
+        obs = self._makeItems('a', 'b', 'c', 'd', 'e')
+        for ob in obs:
+            cache.ZCache_set(ob, ob.getId(), '', None, None)
+        stats = cache.getStatistics()
+        self.assertEqual(stats['entries'], 4)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(cache.ZCache_get(obs[-1], '', None, None, None), 'e')
+        self.assertEqual(cache.ZCache_get(obs[0], '', None, None, None), None)
+
+    def test_clear(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'data', '', None, None)
+        cache.clear()
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+
+    def test_closed(self):
+        cache = self._makeCache()
+        ob, = self._makeItems('ob')
+        cache.ZCache_set(ob, 'data', '', None, None)
+        cache.close()
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+        cache.ZCache_set(ob, 'data', '', None, None)
+        self.assertEqual(cache.ZCache_get(ob, '', None, None, None), None)
+        self.assertEqual(cache.getStatistics()['entries'], 0)
+
+
+@unittest.skipIf(fcntl is None, 'Shared caches need fcntl')
+class SharedCacheFileTests(SharedCacheTestBase):
+
+    def _path(self, name='test'):
+        import os
+        return os.path.join(self.directory, 'zope-cache-%s-8x1024' % name)
+
+    def _makeCache(self, name='test'):
+        from OFS.SharedCacheManager import SharedCache
+        cache = SharedCache(name, max_entries=8, slot_size=1024)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_private_file(self):
+        import os
+        cache = self._makeCache()
+        self.assertEqual(cache.getPath(), self._path())
+        self.assertEqual(os.stat(self._path()).st_mode & 0o777, 0o600)
+
+    def test_default_directory_is_private(self):
+        import os
+        from OFS import SharedCacheManager
+        SharedCacheManager.directory = None
+        orig = tempfile.tempdir
+        tempfile.tempdir = self.directory
+        try:
+            cache = self._makeCache()
+            path = cache.getPath()
+        finally:
+            tempfile.tempdir = orig
+        private = os.path.join(self.directory, 'zope-cache-%d' % os.getuid())
+        self.assertEqual(os.path.dirname(path), private)
+        self.assertEqual(os.stat(private).st_mode & 0o777, 0o700)
+
+    def test_refuses_shared_default_directory(self):
+        import os
+        from OFS import SharedCacheManager
+        SharedCacheManager.directory = None
+        private = os.path.join(self.directory, 'zope-cache-%d' % os.getuid())
+        os.mkdir(private)
+        os.chmod(private, 0o777)
+        orig = tempfile.tempdir
+        tempfile.tempdir = self.directory
+        try:
+            self.assertRaises(RuntimeError, self._makeCache)
+        finally:
+            tempfile.tempdir = orig
+
+    def test_refuses_file_accessible_by_others(self):
+        import os
+        with open(self._path(), 'wb'):
+            pass
+        os.chmod(self._path(), 0o644)
+        self.assertRaises(RuntimeError, self._makeCache)
+
+    def test_refuses_symlink(self):
+        import os
+        target = os.path.join(self.directory, 'target')
+        with open(target, 'wb'):
+            pass
+        os.chmod(target, 0o600)
+        os.symlink(target, self._path())
+        self.assertRaises(OSError, self._makeCache)
+        self.assertEqual(os.path.getsize(target), 0)
+
+
+@unittest.skipIf(fcntl is None, 'Shared caches need fcntl')
+class SharedCacheManagerTests(SharedCacheTestBase):
+
+    def _makeRoot(self):
+        from OFS.SharedCacheManager import manage_addSharedCacheManager
+        root = Folder('root').__of__(FauxRoot())
+        manage_addSharedCacheManager(root, 'cache', 'Cache')
+        root._setObject('ob', CacheableItem('ob'))
+        root.ob.ZCacheable_setManagerId('cache')
+        return root
+
+    def test_cacheable(self):
+        from OFS.SharedCacheManager import SharedCache
+        root = self._makeRoot()
+        self.assertIsInstance(root.cache.ZCacheManager_getCache(),
+                              SharedCache)
+        root.ob.ZCacheable_set('data')
+        self.assertEqual(root.ob.ZCacheable_get(), 'data')
+        root.ob.ZCacheable_invalidate()
+        self.assertEqual(root.ob.ZCacheable_get(), None)
+
+    def test_manage_editProps(self):
+        root = self._makeRoot()
+        root.ob.ZCacheable_set('data')
+        root.cache.manage_editProps('New', {
+            'max_entries': '64', 'slot_size': '4096', 'max_age': '60',
+            'request_vars': ''})
+        self.assertEqual(root.cache.getSettings(), {
+            'max_entries': 64, 'slot_size': 4096, 'max_age': 60,
+            'request_vars': ()})
+        cache = root.cache.ZCacheManager_getCache()
+        self.assertEqual((cache.slots, cache.slot_size), (64, 4096))
+        self.assertEqual(root.ob.ZCacheable_get(), None)
+
+    def test_delete_removes_file(self):
+        import os
+        root = self._makeRoot()
+        root.ob.ZCacheable_set('data')
+        path = root.cache.ZCacheManager_getCache().getPath()
+        self.assertTrue(os.path.exists(path))
+        root._delObject('cache')
+        self.assertFalse(os.path.exists(path))
@@ -22,10 +22,12 @@ from ExtensionClass import Base
 from six.moves.urllib.parse import quote as urllib_quote
 from zExceptions import Forbidden
 from zExceptions import NotFound
+from zope.component import getSiteManager
 from zope.component import queryMultiAdapter
 from zope.event import notify
 from zope.interface import implementer
 from zope.interface import Interface
+from zope.interface import providedBy
 from zope.location.interfaces import LocationError
 from zope.publisher.defaultview import queryDefaultViewName
 from zope.publisher.interfaces import EndRequestEvent
@@ -192,6 +194,8 @@ class BaseRequest(object):
     common = {}  # Common request data
     _auth = None
     _held = ()
+    # The ZPublisher.timing.RequestTiming of a timed request.
+    _timing = None
 
     # Allow (reluctantly) access to unprotected attributes
     __allow_access_to_unprotected_subobjects__ = 1
@@ -339,7 +343,7 @@ class BaseRequest(object):
         if IPublishTraverse.providedBy(ob):
             ob2 = ob.publishTraverse(self, name)
         else:
-            adapter = queryMultiAdapter((ob, self), IPublishTraverse)
+            adapter = self._queryPublisher(ob, IPublishTraverse)
             if adapter is None:
                 # Zope2 doesn't set up its own adapters in a lot of cases
                 # so we will just use a default adapter.
@@ -350,6 +354,15 @@ class BaseRequest(object):
         return ob2
     traverseName__roles__ = ()
 
+    def _queryPublisher(self, ob, interface):
+        # Equivalent to queryMultiAdapter((ob, self), interface), without
+        # the indirections on the way to the adapter registry.
+        factory = getSiteManager().adapters.lookup(
+            (providedBy(ob), providedBy(self)), interface, u'')
+        if factory is None:
+            return None
+        return factory(ob, self)
+
     def traverse(self, path, response=None, validated_hook=None):
         """Traverse the object space
 
@@ -478,8 +491,8 @@ class BaseRequest(object):
                     if IBrowserPublisher.providedBy(object):
                         adapter = object
                     else:
-                        adapter = queryMultiAdapter((object, self),
-                                                    IBrowserPublisher)
+                        adapter = self._queryPublisher(object,
+                                                       IBrowserPublisher)
                         if adapter is None:
                             # Zope2 doesn't set up its own adapters in a lot
                             # of cases so we will just use a default adapter.
@@ -626,6 +639,9 @@ class BaseRequest(object):
                 else:
                     user = v(request, auth, self.roles)
 
+                # The parents below a user folder acquire it, validate
+                # against each user folder once.
+                tried = [aq_base(groups)]
                 while user is None and i < last_parent_index:
                     parent = parents[i]
                     i = i + 1
@@ -633,6 +649,9 @@ class BaseRequest(object):
                         groups = parent.__allow_groups__
                     else:
                         continue
+                    if any(aq_base(groups) is g for g in tried):
+                        continue
+                    tried.append(aq_base(groups))
                     if hasattr(groups, 'validate'):
                         v = groups.validate
                     else:
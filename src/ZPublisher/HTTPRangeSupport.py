@@ -126,6 +126,26 @@ def expandRanges(ranges, size):
     return expanded
 
 
+def coalesceRanges(ranges):
+    """Merge overlapping expanded Range sets.
+
+    A merged set takes the place of the first of the sets it was merged
+    from, the order of the other sets is kept. Adjacent sets are not merged.
+    """
+
+    merged = []
+    for index in sorted(range(len(ranges)), key=ranges.__getitem__):
+        start, end = ranges[index]
+        if merged and start < merged[-1][2]:
+            last = merged[-1]
+            last[0] = min(last[0], index)
+            last[2] = max(last[2], end)
+        else:
+            merged.append([index, start, end])
+    merged.sort()
+    return [(start, end) for index, start, end in merged]
+
+
 class HTTPRangeInterface(Interface):
     """Objects implementing this Interface support the HTTP Range header.
 
@@ -18,7 +18,6 @@ from cgi import FieldStorage
 import codecs
 from copy import deepcopy
 import os
-import random
 import re
 import time
 
@@ -41,6 +40,8 @@ from zope.publisher.interfaces.browser import IBrowserRequest
 from ZPublisher.BaseRequest import BaseRequest
 from ZPublisher.BaseRequest import quote
 from ZPublisher.Converters import get_converter
+from ZPublisher.formparser import FormParser
+from ZPublisher.retry import getRetryPolicy
 from ZPublisher.utils import basic_auth_decode
 from ZPublisher import xmlrpc
 
@@ -110,6 +111,16 @@ _marker = []
 
 trusted_proxies = []
 
+# With lazy_inputs enabled, cookies are parsed on first access and the
+# form data of GET and HEAD requests is parsed on first access as long as
+# the query string cannot change the published method or fail to convert.
+# The ZConfig machinery may set this attribute on initialization.
+lazy_inputs = False
+
+# Query strings containing a colon may carry marshalling or method
+# directives and are always parsed eagerly.
+_eager_query = re.compile(r':|%3a', re.I).search
+
 
 class NestedLoopExit(Exception):
     pass
@@ -175,13 +186,17 @@ class HTTPRequest(BaseRequest):
 
     charset = default_encoding
     retry_max_count = 0
+    _inputs_pending = None
+    _cookie_header = None
 
     def supports_retry(self):
         if self.retry_count < self.retry_max_count:
-            time.sleep(random.uniform(0, 2 ** (self.retry_count)))
             return 1
 
     def retry(self):
+        delay = getRetryPolicy().delay(self.retry_count)
+        if delay > 0:
+            time.sleep(delay)
         self.retry_count = self.retry_count + 1
         self.stdin.seek(0)
         r = self.__class__(stdin=self.stdin,
@@ -195,7 +210,8 @@ class HTTPRequest(BaseRequest):
         # removing tempfiles.
         self.stdin = None
         self._file = None
-        self.form.clear()
+        self._inputs_pending = False
+        self._form.clear()
         # we want to clear the lazy dict here because BaseRequests don't have
         # one.  Without this, there's the possibility of memory leaking
         # after every request.
@@ -441,9 +457,15 @@ class HTTPRequest(BaseRequest):
         # Cookie values should *not* be appended to existing form
         # vars with the same name - they are more like default values
         # for names not otherwise specified in the form.
+        self._cookie_header = get_env('HTTP_COOKIE', '')
+        if not lazy_inputs:
+            self._parseCookies()
+
+    def _parseCookies(self):
         cookies = {}
         taintedcookies = {}
-        k = get_env('HTTP_COOKIE', '')
+        k = self._cookie_header
+        self._cookie_header = None
         if k:
             parse_cookie(k, cookies)
             for k, v in cookies.items():
@@ -456,8 +478,58 @@ class HTTPRequest(BaseRequest):
                     istainted = 1
                 if istainted:
                     taintedcookies[k] = v
-        self.cookies = cookies
-        self.taintedcookies = taintedcookies
+        self._cookies = cookies
+        self._taintedcookies = taintedcookies
+
+    @property
+    def cookies(self):
+        if self._cookie_header is not None:
+            self._parseCookies()
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value):
+        self._cookie_header = None
+        self._cookies = value
+
+    @property
+    def taintedcookies(self):
+        if self._cookie_header is not None:
+            self._parseCookies()
+        return self._taintedcookies
+
+    @taintedcookies.setter
+    def taintedcookies(self, value):
+        self._cookie_header = None
+        self._taintedcookies = value
+
+    @property
+    def form(self):
+        if self._inputs_pending:
+            self.processInputs()
+        return self._form
+
+    @form.setter
+    def form(self, value):
+        self._form = value
+
+    @property
+    def taintedform(self):
+        if self._inputs_pending:
+            self.processInputs()
+        return self._taintedform
+
+    @taintedform.setter
+    def taintedform(self, value):
+        self._taintedform = value
+
+    def _canDeferInputs(self):
+        # Only defer parsing which can neither fail nor affect traversal.
+        environ = self.environ
+        method = environ.get('REQUEST_METHOD', 'GET').upper()
+        if method not in ('GET', 'HEAD'):
+            return False
+        return not _eager_query(environ.get('QUERY_STRING', ''))
 
     def processInputs(
             self,
@@ -476,11 +548,25 @@ class HTTPRequest(BaseRequest):
 
         We need to delay input parsing so that it is done under
         publisher control for error handling purposes.
+
+        If `lazy_inputs` is enabled and parsing is safe to defer, it
+        only happens when the form is accessed for the first time.
         """
         response = self.response
         environ = self.environ
         method = environ.get('REQUEST_METHOD', 'GET')
 
+        # Code reading the environment expects 'QUERY_STRING'
+        # to be present, even if it is empty.
+        if 'QUERY_STRING' not in environ:
+            environ['QUERY_STRING'] = ''
+
+        if (self._inputs_pending is None and lazy_inputs and
+                self._canDeferInputs()):
+            self._inputs_pending = True
+            return
+        self._inputs_pending = False
+
         if method != 'GET':
             fp = self.stdin
         else:
@@ -490,26 +576,15 @@ class HTTPRequest(BaseRequest):
         other = self.other
         taintedform = self.taintedform
 
-        # If 'QUERY_STRING' is not present in environ
-        # FieldStorage will try to get it from sys.argv[1]
-        # which is not what we need.
-        if 'QUERY_STRING' not in environ:
-            environ['QUERY_STRING'] = ''
-
         meth = None
         fs_kw = {}
         if PY3:
             # In Python 3 we need the proper encoding to parse the input.
             fs_kw['encoding'] = self.charset
 
-        fs = ZopeFieldStorage(
-            fp=fp, environ=environ, keep_blank_values=1, **fs_kw)
-
-        # Keep a reference to the FieldStorage. Otherwise it's
-        # __del__ method is called too early and closing FieldStorage.file.
-        self._hold(fs)
+        fs = FormParser(environ, fp=fp, **fs_kw)
 
-        if not hasattr(fs, 'list') or fs.list is None:
+        if not fs.is_form:
             if 'HTTP_SOAPACTION' in environ:
                 # Stash XML request for interpretation by a SOAP-aware view
                 other['SOAPXML'] = fs.value
@@ -524,7 +599,9 @@ class HTTPRequest(BaseRequest):
             else:
                 self._file = fs.file
         else:
-            fslist = fs.list
+            # The parser reads the body while we iterate over it, so
+            # fields are marshalled as soon as they have been received.
+            fslist = fs
             tuple_items = {}
             defaults = {}
             tainteddefaults = {}
@@ -537,17 +614,11 @@ class HTTPRequest(BaseRequest):
                 if key is None:
                     continue
 
-                if (hasattr(item, 'file') and hasattr(item, 'filename') and
-                        hasattr(item, 'headers')):
-                    if (item.file and
-                        (item.filename is not None
-                         # RFC 1867 says that all fields get a content-type.
-                         # or 'content-type' in map(lower, item.headers.keys())
-                         )):
-                        item = FileUpload(item)
-                        isFileUpload = 1
-                    else:
-                        item = item.value
+                if item.file is not None and item.filename is not None:
+                    item = FileUpload(item)
+                    isFileUpload = 1
+                else:
+                    item = item.value
 
                 flags = 0
                 character_encoding = ''
@@ -1637,6 +1708,8 @@ class ZopeFieldStorage(FieldStorage):
     """This subclass exists to work around a Python bug
     (see https://bugs.python.org/issue27777) to make sure
     we can read binary data from a request body.
+
+    BBB: `processInputs` uses `ZPublisher.formparser.FormParser` now.
     """
 
     def read_binary(self):
@@ -1717,47 +1790,54 @@ PARMRE = re.compile(
 PARAMLESSRE = re.compile(
     '([\x00- ]*([^\x00- ;,="]+)[\x00- ]*[;,][\x00- ]*)')
 
+# The three patterns above combined into a single one.  The alternatives
+# are tried in the same order: quoted correct cookies, evil MSIE cookies
+# and broken cookies without = nor value.
+COOKIERE = re.compile(
+    '[\x00- ]*(?:'
+    '([^\x00- ;,="]+)="([^"]*)"(?:[\x00- ]*[;,])?|'
+    '([^\x00- ;,="]+)=([^;]*)(?:[\x00- ]*[;,])?|'
+    '([^\x00- ;,="]+)[\x00- ]*[;,]'
+    ')[\x00- ]*')
 
-def parse_cookie(text,
-                 result=None,
-                 qparmre=QPARMRE,
-                 parmre=PARMRE,
-                 paramlessre=PARAMLESSRE,
-                 ):
-
-    if result is None:
-        result = {}
+# The maximum number of cookies parsed from a single request, 0 means
+# no limit.  The ZConfig machinery may set this attribute on initialization.
+cookie_limit = 0
 
-    mo_q = qparmre.match(text)
 
-    if mo_q:
-        # Match quoted correct cookies
-        l = len(mo_q.group(1))
-        name = mo_q.group(2)
-        value = mo_q.group(3)
-
-    else:
-        # Match evil MSIE cookies ;)
-        mo_p = parmre.match(text)
+def parse_cookie(text, result=None, limit=None, cookiere=COOKIERE):
+    """Parse the cookie header `text` into the mapping `result`.
 
-        if mo_p:
-            l = len(mo_p.group(1))
-            name = mo_p.group(2)
-            value = mo_p.group(3)
-        else:
-            # Broken Cookie without = nor value.
-            broken_p = paramlessre.match(text)
-            if broken_p:
-                l = len(broken_p.group(1))
-                name = broken_p.group(2)
-                value = ''
-            else:
-                return result
-
-    if name not in result:
-        result[name] = unquote(value)
+    The header is scanned in a single pass.  If a cookie name occurs more
+    than once, the first value wins.  At most `limit` cookies are parsed,
+    the module level `cookie_limit` is used if `limit` is None.
+    """
+    if result is None:
+        result = {}
+    if limit is None:
+        limit = cookie_limit
+
+    match = cookiere.match
+    pos = 0
+    count = 0
+    end = len(text)
+    while pos < end:
+        if limit and count >= limit:
+            break
+        mo = match(text, pos)
+        if mo is None:
+            break
+        pos = mo.end()
+        count += 1
+        qname, qvalue, name, value, pname = mo.groups()
+        if qname is not None:
+            name, value = qname, qvalue
+        elif pname is not None:
+            name, value = pname, ''
+        if name not in result:
+            result[name] = unquote(value)
 
-    return parse_cookie(text[l:], result)
+    return result
 
 
 class record(object):
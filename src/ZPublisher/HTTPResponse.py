@@ -13,12 +13,11 @@
 """ CGI Response Output formatter
 """
 from io import BytesIO
+import hashlib
 import os
 import re
-import struct
 import sys
 import time
-import zlib
 
 from six import class_types
 from six import PY2
@@ -38,6 +37,7 @@ from zExceptions import (
 from zExceptions.ExceptionFormatter import format_exception
 from ZPublisher.BaseResponse import BaseResponse
 from ZPublisher.Iterators import IUnboundStreamIterator, IStreamIterator
+from ZPublisher import compression
 from ZPublisher import pubevents
 
 try:
@@ -88,12 +88,18 @@ charset_re_match = re.compile(
 absuri_match = re.compile(r'\w+://[\w\.]+').match
 tag_search = re.compile('[a-zA-Z]>').search
 
-_gzip_header = (b"\037\213"  # magic
-                b"\010"  # compression method
-                b"\000"  # flags
-                b"\000\000\000\000"  # time
-                b"\002"
-                b"\377")
+# The gzip and deflate compression level and the minimum size in bytes of
+# bodies compressed for HTTP content encoding.  The ZConfig machinery may set
+# these attributes on initialization.
+compression_level = 6
+compression_min_size = 0
+
+# File bodies up to this size are read into memory to be compressed, larger
+# ones are sent as they are.
+compression_max_file_size = 1 << 20
+
+# Size of the slices in which a body is fed to the compressor.
+_COMPRESS_CHUNK_SIZE = 1 << 16
 
 # these mime major types should not be gzip content encoded
 uncompressableMimeMajorTypes = ('image',)
@@ -163,6 +169,10 @@ class HTTPBaseResponse(BaseResponse):
     # 1 - compress if accept-encoding ok
     # 2 - ignore accept-encoding (i.e. force)
     use_HTTP_content_compression = 0
+    # The content encoding chosen by enableHTTPCompression.
+    _content_encoding = 'gzip'
+    # Set by markBodyRepeatable.
+    _repeatable_body = False
 
     def __init__(self,
                  body=b'',
@@ -550,41 +560,84 @@ class HTTPBaseResponse(BaseResponse):
 
         self.insertBase()
 
-        if (self.use_HTTP_content_compression and
-                self.headers.get('content-encoding', 'gzip') == 'gzip'):
-            # use HTTP content encoding to compress body contents unless
-            # this response already has another type of content encoding
-            if content_type.split('/')[0] not in uncompressableMimeMajorTypes:
-                # only compress if not listed as uncompressable
-                body = self.body
-                startlen = len(body)
-                co = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS,
-                                      zlib.DEF_MEM_LEVEL, 0)
-                chunks = [_gzip_header, co.compress(body),
-                          co.flush(),
-                          struct.pack("<LL",
-                                      zlib.crc32(body) & 0xffffffff,
-                                      startlen)]
-                z = b''.join(chunks)
-                newlen = len(z)
-                if newlen < startlen:
-                    self.body = z
-                    self.setHeader('content-length', newlen)
-                    self.setHeader('content-encoding', 'gzip')
-                    if self.use_HTTP_content_compression == 1:
-                        # use_HTTP_content_compression == 1 if force was
-                        # NOT used in enableHTTPCompression().
-                        # If we forced it, then Accept-Encoding
-                        # was ignored anyway, so cache should not
-                        # vary on it. Otherwise if not forced, cache should
-                        # respect Accept-Encoding client header
-                        vary = self.getHeader('Vary')
-                        if vary is None or 'Accept-Encoding' not in vary:
-                            self.appendHeader('Vary', 'Accept-Encoding')
+        if self._shouldCompress():
+            self._compressBody()
         return self
 
+    def _shouldCompress(self):
+        # Use HTTP content encoding to compress body contents unless
+        # this response already has another type of content encoding
+        # or the major mime type is listed as uncompressable.
+        if not self.use_HTTP_content_compression:
+            return False
+        # Partial content is counted in bytes of the unencoded body.
+        if self.status in (206, 304) or 'content-range' in self.headers:
+            return False
+        encoding = self._content_encoding
+        if self.headers.get('content-encoding', encoding) != encoding:
+            return False
+        content_type = self.headers.get('content-type', '')
+        return content_type.split('/')[0] not in uncompressableMimeMajorTypes
+
+    def _compressBody(self):
+        body = self.body
+        startlen = len(body)
+        if startlen < compression_min_size:
+            return
+        encoding = self._content_encoding
+        digest = self._variantKey()
+        cache = compression.variant_cache
+        compressed = None
+        if digest is not None:
+            compressed = cache.get(digest, encoding, compression_level)
+        if compressed is None:
+            compressed = b''.join(compression.compress(
+                body, encoding, compression_level, _COMPRESS_CHUNK_SIZE))
+            if digest is not None:
+                cache.set(digest, encoding, compression_level, compressed)
+        newlen = len(compressed)
+        if newlen < startlen:
+            self.body = compressed
+            self.setHeader('content-length', newlen)
+            self._setContentEncoding()
+
+    def _variantKey(self):
+        # Bodies of responses with an ETag, or marked as repeatable, are
+        # likely to be sent again, so their compressed variants are cached
+        # by the digest of the body.  ETags are not unique across objects.
+        if self._repeatable_body or self.headers.get('etag'):
+            return hashlib.sha1(self.body).digest()
+        return None
+
+    def markBodyRepeatable(self):
+        """Note that the body is likely to be sent again unchanged.
+
+        The compressed variants of a repeatable body are cached even if
+        the response has no ETag header.
+        Output of cached views, see OFS.Cache.Cacheable, is repeatable.
+        """
+        self._repeatable_body = True
+
+    def _setContentEncoding(self):
+        self.setHeader('content-encoding', self._content_encoding)
+        # The encoded variants of a body are not byte for byte equal, a
+        # strong ETag would allow to combine ranges of them.
+        etag = self.headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            self.setHeader('ETag', 'W/' + etag)
+        if self.use_HTTP_content_compression == 1:
+            # use_HTTP_content_compression == 1 if force was
+            # NOT used in enableHTTPCompression().
+            # If we forced it, then Accept-Encoding
+            # was ignored anyway, so cache should not
+            # vary on it. Otherwise if not forced, cache should
+            # respect Accept-Encoding client header
+            vary = self.getHeader('Vary')
+            if vary is None or 'Accept-Encoding' not in vary:
+                self.appendHeader('Vary', 'Accept-Encoding')
+
     def enableHTTPCompression(self, REQUEST={}, force=0, disable=0, query=0):
-        """Enable HTTP Content Encoding with gzip compression if possible
+        """Enable HTTP Content Encoding with compression if possible
 
            REQUEST -- used to check if client can accept compression
            force   -- set true to ignore REQUEST headers
@@ -602,9 +655,12 @@ class HTTPBaseResponse(BaseResponse):
            on a request-by-request basis that the response content should
            be compressed.
 
-           The REQUEST headers are used to determine if the client accepts
-           gzip content encoding. The force parameter can force the use
-           of gzip encoding regardless of REQUEST, and the disable parameter
+           The Accept-Encoding REQUEST header is used to choose the content
+           encoding, respecting its quality values. The encodings gzip and
+           deflate are always available, br and zstd if the brotli and
+           zstandard packages are installed. The force parameter can force
+           the use of an encoding, gzip if the client accepts none,
+           regardless of REQUEST, and the disable parameter
            can be used to "turn off" previously enabled encoding (but note
            that any existing content-encoding header will not be changed).
            The query parameter can be used to determine the if compression
@@ -626,11 +682,14 @@ class HTTPBaseResponse(BaseResponse):
             # compression is off
             self.use_HTTP_content_compression = 0
 
-        elif (force or
-              (REQUEST.get('HTTP_ACCEPT_ENCODING', '').find('gzip') != -1)):
+        else:
+            encoding = compression.negotiate(
+                REQUEST.get('HTTP_ACCEPT_ENCODING', ''))
             if force:
+                self._content_encoding = encoding or 'gzip'
                 self.use_HTTP_content_compression = 2
-            else:
+            elif encoding is not None:
+                self._content_encoding = encoding
                 self.use_HTTP_content_compression = 1
 
         return self.use_HTTP_content_compression
@@ -989,6 +1048,7 @@ class WSGIResponse(HTTPBaseResponse):
     """A response object for WSGI
     """
     _streaming = 0
+    _stream_encoding = None
     _http_version = None
     _server_version = None
 
@@ -1057,7 +1117,45 @@ class WSGIResponse(HTTPBaseResponse):
 
         reraise(t, v, tb)
 
+    def _compressBody(self):
+        # Postponed to finalize, when all output of the response is known.
+        pass
+
+    def _compressFile(self):
+        # Small files, like the App.ImageFile resources of the ZMI, are
+        # read into memory and compressed as a repeatable body.
+        body = self.body
+        size = int(self.headers.get('content-length', 0))
+        if size < compression_min_size or size > compression_max_file_size:
+            return
+        body.seek(0)
+        data = body.read()
+        body.close()
+        self.body = data
+        self._repeatable_body = True
+        HTTPBaseResponse._compressBody(self)
+
+    def _compressStream(self):
+        if isinstance(self.body, IOBase):
+            return
+        if not IUnboundStreamIterator.providedBy(self.body):
+            size = self.stdout.tell() + len(self.body)
+            if size < compression_min_size:
+                return
+        # The compressed length is not known in advance.
+        self.headers.pop('content-length', None)
+        self._setContentEncoding()
+        self._stream_encoding = self._content_encoding
+
     def finalize(self):
+        if self._shouldCompress():
+            if self._streaming:
+                self._compressStream()
+            elif isinstance(self.body, IOBase):
+                self._compressFile()
+            elif isinstance(self.body, bytes) and self.body:
+                HTTPBaseResponse._compressBody(self)
+
         # Set 204 (no content) status if 200 and response is empty
         # and not streaming.
         if ('content-type' not in self.headers and
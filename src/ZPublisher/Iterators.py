@@ -3,6 +3,8 @@ import io
 from zope.interface import Interface
 from zope.interface import implementer
 
+from ZPublisher import compression
+
 
 class IUnboundStreamIterator(Interface):
     """
@@ -63,3 +65,131 @@ class filestream_iterator(io.FileIO):
         size = self.tell()
         self.seek(cur_pos, io.SEEK_SET)
         return size
+
+
+@implementer(IStreamIterator)
+class filestream_range_iterator(object):
+    """
+    An iterator which returns the bytes from `start` up to `end` of
+    a file in fixed-sized sequences.
+    """
+
+    def __init__(self, name, start, end, streamsize=1 << 16):
+        self._file = open(name, 'rb')
+        self._file.seek(start)
+        self._size = self._remaining = end - start
+        self.streamsize = streamsize
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._remaining <= 0:
+            raise StopIteration
+        data = self._file.read(min(self.streamsize, self._remaining))
+        if not data:
+            raise StopIteration
+        self._remaining -= len(data)
+        return data
+
+    next = __next__
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        self._file.close()
+
+
+@implementer(IStreamIterator)
+class byteranges_iterator(object):
+    """
+    An iterator which returns a multipart/byteranges body with the
+    `ranges` of `file`, which has `size` bytes, in fixed-sized sequences.
+    """
+
+    def __init__(self, file, ranges, boundary, content_type, size,
+                 streamsize=1 << 16):
+        self._file = file
+        self.streamsize = streamsize
+        boundary = boundary.encode('ascii')
+        part_header = (b'\r\n--' + boundary + b'\r\n' +
+                       b'Content-Type: ' + content_type.encode('ascii') +
+                       b'\r\n')
+        self._parts = []
+        length = 0
+        for start, end in ranges:
+            header = part_header + (
+                'Content-Range: bytes %d-%d/%d\r\n\r\n' % (
+                    start, end - 1, size)).encode('ascii')
+            self._parts.append((header, start, end))
+            length += len(header) + end - start
+        self._trailer = b'\r\n--' + boundary + b'--\r\n'
+        self._length = length + len(self._trailer)
+        self._chunks = self._iterate()
+
+    def _iterate(self):
+        read = self._file.read
+        for header, start, end in self._parts:
+            yield header
+            self._file.seek(start)
+            pos = start
+            while pos < end:
+                data = read(min(self.streamsize, end - pos))
+                if not data:
+                    break
+                pos += len(data)
+                yield data
+        yield self._trailer
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    next = __next__
+
+    def __len__(self):
+        return self._length
+
+    def close(self):
+        self._file.close()
+
+
+@implementer(IUnboundStreamIterator)
+class CompressedStreamIterator(object):
+    """
+    Compress the chunks of a response body iterable on the fly.
+
+    Each chunk is flushed after compression, so streamed output reaches
+    the client without waiting for the compressor to fill its buffer.
+    """
+
+    def __init__(self, iterable, encoding='gzip', level=6):
+        self._iterable = iterable
+        self._chunks = iter(iterable)
+        self._compressor = compression.compressobj(encoding, level)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        compressor = self._compressor
+        while compressor is not None:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._compressor = None
+                return compressor.flush()
+            if chunk:
+                return (compressor.compress(chunk) +
+                        compressor.flush(sync=True))
+        raise StopIteration
+
+    next = __next__
+
+    def close(self):
+        close = getattr(self._iterable, 'close', None)
+        if close is not None:
+            close()
@@ -37,9 +37,13 @@ from zope.publisher.skinnable import setDefaultSkin
 
 from ZPublisher.HTTPRequest import WSGIRequest
 from ZPublisher.HTTPResponse import WSGIResponse
+from ZPublisher import HTTPResponse
+from ZPublisher.Iterators import CompressedStreamIterator
 from ZPublisher.Iterators import IUnboundStreamIterator
 from ZPublisher.mapply import mapply
 from ZPublisher import pubevents
+from ZPublisher.retry import conflict_stats
+from ZPublisher import timing
 from ZPublisher.utils import recordMetaData
 
 if sys.version_info >= (3, ):
@@ -180,6 +184,7 @@ def publish(request, module_info):
     obj, realm, debug_mode = module_info
 
     request.processInputs()
+    timing.mark(request, 'inputs')
     response = request.response
 
     if debug_mode:
@@ -198,6 +203,7 @@ def publish(request, module_info):
     obj = request.traverse(path, validated_hook=validate_user)
     notify(pubevents.PubAfterTraversal(request))
     recordMetaData(obj, request)
+    timing.mark(request, 'metadata')
 
     result = mapply(obj,
                     request.args,
@@ -214,6 +220,15 @@ def publish(request, module_info):
     return response
 
 
+def _wrap_file(environ, body):
+    # Let the server send file bodies itself if it offers to, e.g. using
+    # sendfile(), otherwise the file is iterated in Python.
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is None:
+        return body
+    return file_wrapper(body, getattr(body, 'streamsize', 1 << 16))
+
+
 @contextmanager
 def load_app(module_info):
     app_wrapper, realm, debug_mode = module_info
@@ -261,6 +276,7 @@ def publish_module(environ, start_response,
 
         request = (_request if _request is not None else
                    _request_factory(environ['wsgi.input'], environ, response))
+        timing.start(request)
 
         for i in range(getattr(request, 'retry_max_count', 3) + 1):
             setRequest(request)
@@ -269,30 +285,41 @@ def publish_module(environ, start_response,
                     with transaction_pubevents(request, response):
                         response = _publish(request, new_mod_info)
                 break
-            except (ConflictError, TransientError) as exc:
+            except (ConflictError, TransientError):
                 if request.supports_retry():
+                    conflict_stats.record(path_info or '/', True)
                     new_request = request.retry()
-                    request.close()
-                    request = new_request
-                    response = new_request.response
+                    new_request._timing = request._timing
                 else:
+                    conflict_stats.record(path_info or '/', False)
                     raise
             finally:
                 request.close()
                 clearRequest()
+            # The retried request must not be closed before it is published.
+            request = new_request
+            response = new_request.response
 
         # Start the WSGI server response
         status, headers = response.finalize()
+        timing.mark(request, 'finalize')
+        timing.finish(request, headers)
         start_response(status, headers)
 
-        if (isinstance(response.body, _FILE_TYPES) or
-                IUnboundStreamIterator.providedBy(response.body)):
+        if isinstance(response.body, _FILE_TYPES):
+            result = _wrap_file(environ, response.body)
+        elif IUnboundStreamIterator.providedBy(response.body):
             result = response.body
         else:
             # If somebody used response.write, that data will be in the
             # response.stdout BytesIO, so we put that before the body.
             result = (response.stdout.getvalue(), response.body)
 
+        encoding = getattr(response, '_stream_encoding', None)
+        if encoding is not None:
+            result = CompressedStreamIterator(
+                result, encoding, HTTPResponse.compression_level)
+
         for func in response.after_list:
             func()
 
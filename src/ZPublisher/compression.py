@@ -0,0 +1,225 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""HTTP content encodings for response compression.
+
+Supports gzip and deflate, and br and zstd if the optional `brotli` and
+`zstandard` packages are installed.
+"""
+
+from collections import OrderedDict
+import re
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _ZlibCompressor(object):
+
+    def __init__(self, level, wbits):
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def flush(self, sync=False):
+        if sync:
+            return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressobj.flush()
+
+
+class _BrotliCompressor(object):
+
+    def __init__(self, level):
+        # The zlib levels 1-9 are valid brotli qualities (0-11) as well.
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, sync=False):
+        if sync:
+            return self._compressor.flush()
+        return self._compressor.finish()
+
+
+class _ZstdCompressor(object):
+
+    def __init__(self, level):
+        # The zlib levels 1-9 are valid zstd levels (1-22) as well.
+        self._compressobj = zstandard.ZstdCompressor(
+            level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def flush(self, sync=False):
+        if sync:
+            return self._compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressobj.flush()
+
+
+_FACTORIES = {
+    'gzip': lambda level: _ZlibCompressor(level, 16 + zlib.MAX_WBITS),
+    'deflate': lambda level: _ZlibCompressor(level, zlib.MAX_WBITS),
+}
+if brotli is not None:
+    _FACTORIES['br'] = _BrotliCompressor
+if zstandard is not None:
+    _FACTORIES['zstd'] = _ZstdCompressor
+
+# The available encodings, preferred ones first.
+ENCODINGS = tuple(name for name in ('br', 'zstd', 'gzip', 'deflate')
+                  if name in _FACTORIES)
+
+
+def compressobj(encoding, level=6):
+    """Return a compressor for `encoding`.
+
+    It has a `compress(data)` method, and a `flush(sync=False)` method
+    which ends the stream, or, with `sync`, only flushes pending output.
+    `level` is a zlib compression level from 1 to 9, and is used as the
+    brotli quality or zstd level unchanged.
+    """
+    return _FACTORIES[encoding](level)
+
+
+def compress(data, encoding, level=6, chunk_size=1 << 16):
+    """Return a list of chunks holding `data` compressed with `encoding`."""
+    compressor = compressobj(encoding, level)
+    chunks = [compressor.compress(data[i:i + chunk_size])
+              for i in range(0, len(data), chunk_size)]
+    chunks.append(compressor.flush())
+    return chunks
+
+
+_coding_re = re.compile(
+    r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+)\s*)?(?:[;,]|$)')
+_negotiated = {}
+_NEGOTIATED_MAX = 1000
+
+
+def _parse_accept_encoding(header):
+    qualities = {}
+    for match in _coding_re.finditer(header.lower()):
+        coding, q = match.groups()
+        try:
+            q = float(q) if q is not None else 1.0
+        except ValueError:
+            q = 0.0
+        qualities.setdefault(coding, q)
+    return qualities
+
+
+def negotiate(accept_encoding, encodings=None):
+    """Return the best encoding acceptable to the client, or None.
+
+    `accept_encoding` is the value of the Accept-Encoding request header.
+    Quality values are honored, codings with a quality of zero are
+    refused, and a ``*`` matches any coding not mentioned explicitly.
+    Among codings of equal quality, the order of `encodings` decides,
+    which defaults to the available `ENCODINGS`.
+    """
+    if not accept_encoding:
+        return None
+    if encodings is None:
+        encodings = ENCODINGS
+    key = (accept_encoding, encodings)
+    try:
+        return _negotiated[key]
+    except KeyError:
+        pass
+
+    qualities = _parse_accept_encoding(accept_encoding)
+    if 'x-gzip' in qualities:
+        qualities.setdefault('gzip', qualities['x-gzip'])
+    wildcard = qualities.get('*', 0.0)
+    best = None
+    best_q = 0.0
+    for encoding in encodings:
+        q = qualities.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+
+    if len(_negotiated) >= _NEGOTIATED_MAX:
+        _negotiated.clear()
+    _negotiated[key] = best
+    return best
+
+
+class VariantCache(object):
+    """Bounded LRU cache of compressed response bodies.
+
+    Entries are keyed by the SHA-1 digest of the uncompressed body, the
+    content encoding and the compression level, so a variant is only
+    served for the body it was compressed from.  At most `max_size` bytes
+    of compressed data are kept, a size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size=8 << 20, max_entry_size=1 << 20):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = self.misses = 0
+
+    def get(self, digest, encoding, level):
+        """Return the body with `digest` compressed or None."""
+        key = (digest, encoding, level)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                # Move the entry to the end of the LRU order.
+                del self._entries[key]
+                self._entries[key] = compressed
+                self.hits += 1
+                return compressed
+            self.misses += 1
+        return None
+
+    def set(self, digest, encoding, level, compressed):
+        size = len(compressed)
+        if size > self.max_entry_size or size > self.max_size:
+            return
+        key = (digest, encoding, level)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = compressed
+            self._size += size
+            while self._size > self.max_size:
+                _, dropped = self._entries.popitem(last=False)
+                self._size -= len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The ZConfig machinery may replace the cache on initialization.
+variant_cache = VariantCache()
@@ -0,0 +1,475 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Incremental parser for request bodies.
+
+`FormParser` replaces `cgi.FieldStorage` for `HTTPRequest.processInputs`.
+It reads the request body in fixed-size chunks and yields the form fields
+one by one as soon as they are complete, so the caller can marshal them
+while the rest of the body is still being read.  Uploaded files and
+non-form bodies are kept in memory up to `spool_threshold` bytes and are
+spilled to an anonymous temporary file beyond that.
+"""
+
+from email.parser import HeaderParser
+from io import BytesIO
+import re
+import tempfile
+
+from six import PY3
+from six.moves.urllib.parse import parse_qsl
+
+# Request bodies and uploaded files larger than this many bytes are
+# written to a temporary file instead of being kept in memory.
+# The ZConfig machinery may set this attribute on initialization.
+spool_threshold = 1 << 16
+
+# Number of bytes read from the input stream at a time.
+CHUNK_SIZE = 1 << 16
+
+# Upper bound for a single header or boundary line of a multipart body.
+MAX_LINE_SIZE = 1 << 16
+
+_valid_boundary = re.compile(br'^[ -~]{0,200}[!-~]$').match
+
+
+def parse_header(line):
+    """Parse a Content-Type like header.
+
+    Return the main value and a dictionary of its parameters.
+    """
+    parts = _parse_params(';' + line)
+    key = next(parts).lower()
+    pdict = {}
+    for p in parts:
+        i = p.find('=')
+        if i >= 0:
+            name = p[:i].strip().lower()
+            value = p[i + 1:].strip()
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+                value = value.replace('\\\\', '\\').replace('\\"', '"')
+            pdict[name] = value
+    return key, pdict
+
+
+def _parse_params(s):
+    while s[:1] == ';':
+        s = s[1:]
+        end = s.find(';')
+        while end > 0 and (s.count('"', 0, end) - s.count('\\"', 0, end)) % 2:
+            end = s.find(';', end + 1)
+        if end < 0:
+            end = len(s)
+        f = s[:end]
+        yield f.strip()
+        s = s[end:]
+
+
+class _InputReader(object):
+    """Buffered reader that never reads beyond `length` bytes of `fp`."""
+
+    def __init__(self, fp, length=-1, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.remaining = length
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.eof = fp is None
+
+    def fill(self):
+        """Append the next chunk of input to the buffer.
+
+        Return False when the input is exhausted.
+        """
+        if self.eof:
+            return False
+        size = self.chunk_size
+        if self.remaining >= 0:
+            size = min(size, self.remaining)
+        data = size and self.fp.read(size)
+        if not data:
+            self.eof = True
+            return False
+        if self.remaining >= 0:
+            self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    def readline(self):
+        """Return the next line including its line ending.
+
+        Lines longer than MAX_LINE_SIZE are returned in pieces.
+        """
+        start = 0
+        while True:
+            pos = self.buffer.find(b'\n', start)
+            if pos >= 0:
+                pos += 1
+                break
+            if len(self.buffer) >= MAX_LINE_SIZE:
+                pos = MAX_LINE_SIZE
+                break
+            start = len(self.buffer)
+            if not self.fill():
+                pos = len(self.buffer)
+                break
+        line, self.buffer = self.buffer[:pos], self.buffer[pos:]
+        return line
+
+    def chunks(self):
+        """Yield the remaining input."""
+        if self.buffer:
+            yield self.buffer
+            self.buffer = b''
+        while self.fill():
+            yield self.buffer
+            self.buffer = b''
+
+
+def _make_spool():
+    return BytesIO()
+
+
+def _spool_write(file, data, threshold):
+    """Write `data` to `file` and return the file to continue with.
+
+    An in-memory spool is swapped for a temporary file once it grows
+    beyond `threshold` bytes.
+    """
+    if isinstance(file, BytesIO) and file.tell() + len(data) > threshold:
+        spilled = tempfile.TemporaryFile('w+b')
+        spilled.write(file.getvalue())
+        file = spilled
+    file.write(data)
+    return file
+
+
+class FormField(object):
+    """A single field of a parsed form.
+
+    Provides the `name`, `filename`, `headers`, `file` and `value`
+    attributes used by `HTTPRequest.processInputs` and `FileUpload`.
+    """
+
+    def __init__(self, name, value=None, filename=None, headers=None):
+        self.name = name
+        self.filename = filename
+        self.headers = headers if headers is not None else {}
+        self.file = None
+        self._value = value
+
+    @property
+    def value(self):
+        if self.file is not None:
+            pos = self.file.tell()
+            self.file.seek(0)
+            value = self.file.read()
+            self.file.seek(pos)
+            return value
+        return self._value
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.name)
+
+
+class FormParser(object):
+    """Parse the query string and body of a request.
+
+    Iterating over the parser yields `FormField` objects for
+    application/x-www-form-urlencoded and multipart request bodies (or
+    for the query string of GET and HEAD requests).  Any other body is
+    available as the seekable `file` attribute, `is_form` is false then.
+
+    With a true `encoding` field names, values and file names are
+    decoded text, otherwise they are kept as native strings.
+    """
+
+    def __init__(self, environ, fp=None, encoding=None, errors='replace',
+                 threshold=None, chunk_size=CHUNK_SIZE):
+        self.encoding = encoding
+        self.errors = errors
+        if threshold is None:
+            threshold = spool_threshold
+        self.threshold = threshold
+        self.file = None
+        self.qs_on_post = None
+        self._closed = False
+
+        method = environ.get('REQUEST_METHOD', 'GET').upper()
+        headers = self.headers = {}
+        if method in ('GET', 'HEAD'):
+            self.query_string = environ.get('QUERY_STRING', '')
+            fp = None
+            headers['content-type'] = 'application/x-www-form-urlencoded'
+        else:
+            self.query_string = ''
+            if method == 'POST':
+                headers['content-type'] = 'application/x-www-form-urlencoded'
+            if 'CONTENT_TYPE' in environ:
+                headers['content-type'] = environ['CONTENT_TYPE']
+            if 'QUERY_STRING' in environ:
+                self.qs_on_post = environ['QUERY_STRING']
+            if 'CONTENT_LENGTH' in environ:
+                headers['content-length'] = environ['CONTENT_LENGTH']
+
+        if 'content-type' in headers:
+            self.type, self.type_options = parse_header(
+                headers['content-type'])
+        else:
+            self.type, self.type_options = 'text/plain', {}
+
+        try:
+            self.length = int(headers.get('content-length', -1))
+        except (TypeError, ValueError):
+            self.length = -1
+
+        self._reader = _InputReader(fp, self.length, chunk_size)
+        self.is_form = (self.type == 'application/x-www-form-urlencoded' or
+                        self.type[:10] == 'multipart/')
+        if not self.is_form:
+            self._read_body()
+
+    @property
+    def value(self):
+        """The raw body of a request which does not carry a form."""
+        if self.file is None:
+            return None
+        self.file.seek(0)
+        value = self.file.read()
+        self.file.seek(0)
+        return value
+
+    def __iter__(self):
+        if not self.is_form:
+            return iter(())
+        if self.type[:10] == 'multipart/':
+            return self._iter_multipart()
+        return self._iter_urlencoded()
+
+    def _decode(self, value):
+        if self.encoding and not isinstance(value, str):
+            return value.decode(self.encoding, self.errors)
+        return value
+
+    def _parse_qs(self, qs):
+        if not qs:
+            return []
+        if PY3:
+            return parse_qsl(qs, keep_blank_values=True,
+                             encoding=self.encoding or 'utf-8',
+                             errors=self.errors)
+        return parse_qsl(qs, keep_blank_values=True)
+
+    def _query_fields(self, qs):
+        for key, value in self._parse_qs(qs):
+            yield FormField(key, value)
+
+    def _read_body(self):
+        file = _make_spool()
+        threshold = self.threshold
+        for chunk in self._reader.chunks():
+            file = _spool_write(file, chunk, threshold)
+        file.seek(0)
+        self.file = file
+
+    def _iter_urlencoded(self):
+        for field in self._query_fields(self.query_string):
+            yield field
+        # The chunks after the last '&' seen.  Only the new chunk is
+        # searched for the next one, so a long value costs linear time.
+        pending = []
+        for chunk in self._reader.chunks():
+            # Only hand complete key/value pairs to the query parser,
+            # so multi-byte characters are never split.
+            pos = chunk.rfind(b'&')
+            if pos < 0:
+                pending.append(chunk)
+                continue
+            pending.append(chunk[:pos])
+            data = b''.join(pending)
+            pending = [chunk[pos + 1:]]
+            for field in self._query_fields(self._decode(data)):
+                yield field
+        pending = b''.join(pending)
+        if pending:
+            for field in self._query_fields(self._decode(pending)):
+                yield field
+        if self.qs_on_post:
+            for field in self._query_fields(self.qs_on_post):
+                yield field
+
+    def _iter_multipart(self):
+        boundary = self.type_options.get('boundary', '')
+        if not isinstance(boundary, bytes):
+            boundary = boundary.encode('latin-1', 'replace')
+        if not _valid_boundary(boundary):
+            raise ValueError(
+                'Invalid boundary in multipart form: %r' % (boundary,))
+
+        if self.qs_on_post:
+            for field in self._query_fields(self.qs_on_post):
+                yield field
+
+        reader = self._reader
+        delimiter = b'--' + boundary
+        closing = delimiter + b'--'
+
+        # Skip the preamble
+        while True:
+            line = reader.readline()
+            if not line:
+                return
+            line = line.strip()
+            if line == delimiter:
+                break
+            if line == closing:
+                return
+
+        while True:
+            headers = self._read_part_headers()
+            if headers is None:
+                return
+            field = self._make_field(headers)
+            done = self._read_part_body(field, delimiter)
+            yield field
+            if done:
+                return
+
+    def _read_part_headers(self):
+        reader = self._reader
+        lines = []
+        size = 0
+        while True:
+            line = reader.readline()
+            if not line:
+                if not lines:
+                    return None
+                break
+            if not line.strip():
+                break
+            size += len(line)
+            if size > MAX_LINE_SIZE:
+                raise ValueError('Multipart part headers too large')
+            lines.append(line)
+        text = b''.join(lines).decode(self.encoding or 'latin-1',
+                                      self.errors)
+        if not PY3 and self.encoding is None:
+            text = text.encode('latin-1')
+        return HeaderParser().parsestr(text)
+
+    def _make_field(self, headers):
+        name = filename = None
+        if 'content-disposition' in headers:
+            dummy, params = parse_header(headers['content-disposition'])
+            name = params.get('name')
+            filename = params.get('filename')
+        field = FormField(name, filename=filename, headers=headers)
+        if filename is not None:
+            field.file = _make_spool()
+        return field
+
+    def _read_part_body(self, field, delimiter):
+        """Read the body of a part up to the next delimiter line.
+
+        Return True if it was the last part of the body.
+        """
+        reader = self._reader
+        threshold = self.threshold
+        marker = b'\n' + delimiter
+        keep = len(marker) + 2
+        chunks = []
+
+        if field.file is not None:
+            def write(data):
+                if data:
+                    field.file = _spool_write(field.file, data, threshold)
+        else:
+            write = chunks.append
+
+        # An empty part may be directly followed by the delimiter
+        while len(reader.buffer) < keep and reader.fill():
+            pass
+        if reader.buffer.startswith(delimiter):
+            found = self._delimiter_end(reader.buffer, len(delimiter))
+            while found is None and reader.fill():
+                found = self._delimiter_end(reader.buffer, len(delimiter))
+            if found:
+                reader.buffer = reader.buffer[found:]
+                return self._finish_part(field, chunks)
+
+        start = 0
+        while True:
+            buf = reader.buffer
+            pos = buf.find(marker, start)
+            if pos >= 0:
+                found = self._delimiter_end(buf, pos + len(marker))
+                if found is None:
+                    # Need more input to decide about this match
+                    reader.fill()
+                    continue
+                if found is False:
+                    # Data which just happens to look like the delimiter
+                    start = pos + 1
+                    continue
+                end = pos
+                if end and buf[end - 1:end] == b'\r':
+                    end -= 1
+                write(buf[:end])
+                reader.buffer = buf[found:]
+                return self._finish_part(field, chunks)
+
+            if len(buf) > keep:
+                write(buf[:-keep])
+                reader.buffer = buf = buf[-keep:]
+            start = max(len(buf) - keep, 0)
+            if not reader.fill():
+                # The body ended without a closing delimiter.
+                buf = reader.buffer
+                for ending in (b'\r\n', b'\n', b'\r'):
+                    if buf.endswith(ending):
+                        buf = buf[:-len(ending)]
+                        break
+                write(buf)
+                reader.buffer = b''
+                self._finish_part(field, chunks)
+                return True
+
+    def _delimiter_end(self, buf, pos):
+        """Check the rest of a delimiter line found in `buf`.
+
+        Return the offset of the next part, False if this is no delimiter
+        or None if more input is needed to decide.
+        """
+        end = buf.find(b'\n', pos)
+        if end < 0:
+            if not self._reader.eof and len(buf) - pos < MAX_LINE_SIZE:
+                return None
+            end = len(buf)
+        rest = buf[pos:end].strip()
+        if rest == b'--':
+            # Closing delimiter: ignore the epilogue
+            self._closed = True
+            return len(buf)
+        if rest:
+            return False
+        return end + 1
+
+    def _finish_part(self, field, chunks):
+        if field.file is not None:
+            field.file.seek(0)
+        else:
+            field._value = self._decode(b''.join(chunks))
+        if self._closed:
+            # Drain the epilogue so the input stream is fully consumed.
+            for chunk in self._reader.chunks():
+                pass
+        return self._closed
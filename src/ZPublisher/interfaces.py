@@ -75,3 +75,15 @@ class UseTraversalDefault(Exception):
     indicate that it has no special casing for the given name and that standard
     traversal logic should be applied.
     """
+
+
+class IRetryPolicy(Interface):
+    """Decide how long to wait before a conflicting request is retried.
+    """
+
+    def delay(retry_count):
+        """Return the number of seconds to wait before the next retry.
+
+        `retry_count` is the number of retries already done for the
+        request, i.e. 0 before the first retry.
+        """
@@ -0,0 +1,120 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Conflict retry policies and conflict statistics.
+
+The publisher retries requests failing with a `ConflictError`.  The
+configured retry policy decides how long to wait before each retry, the
+conflict statistics count conflicts and retries per path.
+"""
+
+import random
+import threading
+
+from zope.interface import implementer
+
+from ZPublisher.interfaces import IRetryPolicy
+
+JITTER_STRATEGIES = ('full', 'equal', 'none')
+
+
+@implementer(IRetryPolicy)
+class ExponentialBackoff(object):
+    """Wait `base` * 2 ** `retry_count` seconds, at most `cap` seconds.
+
+    `jitter` randomizes the delay to spread out conflicting requests:
+    'full' waits between 0 and the delay, 'equal' waits between half the
+    delay and the delay and 'none' waits exactly the delay.
+    """
+
+    def __init__(self, base=1.0, cap=None, jitter='full'):
+        if jitter not in JITTER_STRATEGIES:
+            raise ValueError(
+                'jitter must be one of %r' % (JITTER_STRATEGIES, ))
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+
+    def delay(self, retry_count):
+        delay = self.base * 2 ** retry_count
+        if self.cap is not None:
+            delay = min(delay, self.cap)
+        if self.jitter == 'full':
+            return random.uniform(0, delay)
+        if self.jitter == 'equal':
+            return random.uniform(delay / 2.0, delay)
+        return delay
+
+
+# The ZConfig machinery may replace the policy on initialization.
+_policy = ExponentialBackoff(base=1.0, cap=4.0)
+
+
+def getRetryPolicy():
+    return _policy
+
+
+def setRetryPolicy(policy):
+    global _policy
+    last, _policy = _policy, policy
+    return last
+
+
+class ConflictStats(object):
+    """Thread safe conflict and retry counters per path.
+
+    At most `max_paths` paths are tracked separately, conflicts on any
+    further paths are counted under `OTHER`.
+    """
+
+    OTHER = '(other)'
+
+    def __init__(self, max_paths=1000):
+        self.max_paths = max_paths
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, path, retried):
+        """Count a conflict on `path`, and whether it is retried."""
+        with self._lock:
+            counters = self._counters.get(path)
+            if counters is None:
+                if len(self._counters) >= self.max_paths:
+                    path = self.OTHER
+                counters = self._counters.setdefault(path, [0, 0])
+            counters[0] += 1
+            if retried:
+                counters[1] += 1
+
+    def items(self):
+        """Return a list of statistics, most conflicting paths first.
+
+        Each entry is a mapping with the keys 'path', 'conflicts',
+        'retries' and 'failures', the latter being conflicts which were
+        not retried anymore.
+        """
+        with self._lock:
+            counters = [(path, c[0], c[1])
+                        for path, c in self._counters.items()]
+        counters.sort(key=lambda item: (-item[1], item[0]))
+        return [{'path': path,
+                 'conflicts': conflicts,
+                 'retries': retries,
+                 'failures': conflicts - retries}
+                for path, conflicts, retries in counters]
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+conflict_stats = ConflictStats()
@@ -0,0 +1,98 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare `parse_cookie` with the former recursive implementation.
+
+Run with ``python -m ZPublisher.tests.benchmark_cookies``.
+"""
+
+import json
+import timeit
+
+from six.moves.urllib.parse import quote
+from six.moves.urllib.parse import unquote
+
+from ZPublisher.HTTPRequest import PARAMLESSRE
+from ZPublisher.HTTPRequest import PARMRE
+from ZPublisher.HTTPRequest import QPARMRE
+from ZPublisher.HTTPRequest import parse_cookie
+
+
+def recursive_parse_cookie(text, result=None):
+    # The implementation used up to Zope 4.0b5.
+    if result is None:
+        result = {}
+    mo_q = QPARMRE.match(text)
+    if mo_q:
+        l = len(mo_q.group(1))
+        name = mo_q.group(2)
+        value = mo_q.group(3)
+    else:
+        mo_p = PARMRE.match(text)
+        if mo_p:
+            l = len(mo_p.group(1))
+            name = mo_p.group(2)
+            value = mo_p.group(3)
+        else:
+            broken_p = PARAMLESSRE.match(text)
+            if broken_p:
+                l = len(broken_p.group(1))
+                name = broken_p.group(2)
+                value = ''
+            else:
+                return result
+    if name not in result:
+        result[name] = unquote(value)
+    return recursive_parse_cookie(text[l:], result)
+
+
+def zope_login():
+    return ('__ac="%s"; _ZopeId="19797037A5yh7ZBdGM"; '
+            'tree-s="eJzTiFZ3hANPW3WtWE0ANj4FWw"' % ('QWxhZGRpbjpvcGVu' * 4))
+
+
+def analytics(count):
+    cookies = ['_ga=GA1.2.1366474811.1530088345',
+               '_gid=GA1.2.1520214402.1530088345',
+               'prefs=%s' % quote(json.dumps({'lang': 'de', 'tz': 'CET'})),
+               'json={"intkey":123,"stringkey":"blah"}',
+               'optout']
+    cookies.extend('_utm%d=%s' % (i, 'x' * 40) for i in range(count))
+    return '; '.join(cookies)
+
+
+SCENARIOS = [
+    ('Zope login, 3 cookies', zope_login()),
+    ('tracking, 25 cookies', analytics(20)),
+    ('tracking, 150 cookies', analytics(145)),
+    ('abusive, 2000 cookies', analytics(1995)),
+]
+
+
+def main():
+    print('%-26s %-12s %12s' % ('scenario', 'parser', 'us/header'))
+    for name, header in SCENARIOS:
+        number = max(10, 100000 // len(header))
+        for label, func in (('recursive', recursive_parse_cookie),
+                            ('single-pass', parse_cookie)):
+            try:
+                seconds = min(timeit.repeat(
+                    lambda: func(header), number=number, repeat=3))
+            except RuntimeError:  # maximum recursion depth exceeded
+                print('%-26s %-12s %12s' % (name, label, 'RecursionError'))
+                continue
+            print('%-26s %-12s %12.1f' % (
+                name, label, seconds * 1000000 / number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare `FormParser` with the former `cgi.FieldStorage` based parsing.
+
+Run with ``python -m ZPublisher.tests.benchmark_formparser``.
+"""
+
+from io import BytesIO
+import timeit
+
+from six import PY3
+
+from ZPublisher.formparser import FormParser
+from ZPublisher.HTTPRequest import ZopeFieldStorage
+
+BOUNDARY = b'----------benchmark'
+
+
+def multipart_body(fields=0, files=0, file_size=0):
+    parts = []
+    for i in range(fields):
+        parts.append(
+            b'--' + BOUNDARY + b'\r\n'
+            b'Content-Disposition: form-data; name="field%d:int"\r\n'
+            b'\r\n%d\r\n' % (i, i))
+    data = b'\x00\xffbinary data\r\n' * (file_size // 15 + 1)
+    for i in range(files):
+        parts.append(
+            b'--' + BOUNDARY + b'\r\n'
+            b'Content-Disposition: form-data; name="file%d"; '
+            b'filename="file%d.bin"\r\n'
+            b'Content-Type: application/octet-stream\r\n'
+            b'\r\n' % (i, i) + data[:file_size] + b'\r\n')
+    parts.append(b'--' + BOUNDARY + b'--\r\n')
+    return b''.join(parts)
+
+
+def environ(body, content_type):
+    return {
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'QUERY_STRING': '',
+    }
+
+
+def parse_fieldstorage(env, body):
+    kw = {'encoding': 'utf-8'} if PY3 else {}
+    fs = ZopeFieldStorage(fp=BytesIO(body), environ=env,
+                          keep_blank_values=1, **kw)
+    for item in fs.list:
+        item.value if item.filename is None else item.file
+
+
+def parse_formparser(env, body):
+    kw = {'encoding': 'utf-8'} if PY3 else {}
+    for item in FormParser(env, BytesIO(body), **kw):
+        item.value if item.filename is None else item.file
+
+
+def peak_memory(func, *args):
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+SCENARIOS = [
+    ('urlencoded, 200 fields',
+     '&'.join('field%d:int=%d' % (i, i) for i in range(200)).encode('ascii'),
+     'application/x-www-form-urlencoded'),
+    ('multipart, 50 fields',
+     multipart_body(fields=50),
+     'multipart/form-data; boundary=' + BOUNDARY.decode('ascii')),
+    ('multipart, 5 x 20 KiB files',
+     multipart_body(fields=5, files=5, file_size=20 << 10),
+     'multipart/form-data; boundary=' + BOUNDARY.decode('ascii')),
+    ('multipart, 1 x 10 MiB file',
+     multipart_body(fields=2, files=1, file_size=10 << 20),
+     'multipart/form-data; boundary=' + BOUNDARY.decode('ascii')),
+]
+
+
+def main():
+    print('%-30s %-14s %12s %12s' % ('scenario', 'parser', 'ms/request',
+                                     'peak KiB'))
+    for name, body, content_type in SCENARIOS:
+        env = environ(body, content_type)
+        number = max(1, (1 << 20) // len(body))
+        for label, func in (('FieldStorage', parse_fieldstorage),
+                            ('FormParser', parse_formparser)):
+            seconds = min(timeit.repeat(
+                lambda: func(env, body), number=number, repeat=3))
+            peak = peak_memory(func, env, body)
+            print('%-30s %-14s %12.3f %12s' % (
+                name, label, seconds * 1000 / number,
+                '-' if peak is None else peak >> 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -218,6 +218,30 @@ class TestBaseRequest(unittest.TestCase, BaseRequest_factory):
         self.assertEqual(r.URL, '/folder/objBasic')
         self.assertEqual(r.response.base, '')
 
+    def test_traverse_validates_each_user_folder_once(self):
+        from Acquisition import Implicit
+        from AccessControl.ZopeSecurityPolicy import _noroles
+
+        class UserFolder(Implicit):
+
+            def __init__(self, user):
+                self.user = user
+                self.calls = 0
+
+            def validate(self, request, auth='', roles=_noroles):
+                self.calls += 1
+                return self.user
+
+        root, folder = self._makeRootAndFolder()
+        folder._setObject('objBasic', self._makeBasicObject())
+        root.__allow_groups__ = UserFolder('user')
+        folder.__allow_groups__ = UserFolder(None)
+        r = self._makeOne(root)
+        r.traverse('folder/objBasic/view')
+        self.assertEqual(r['AUTHENTICATED_USER'], 'user')
+        self.assertEqual(folder.__allow_groups__.calls, 1)
+        self.assertEqual(root.__allow_groups__.calls, 1)
+
     def test_traverse_withDefault(self):
         root, folder = self._makeRootAndFolder()
         folder._setObject('objWithDefault', self._makeObjectWithDefault())
@@ -759,3 +783,35 @@ class TestBaseRequestViews(TestRequestViewsBase):
         self.assertEqual(ob(), 'Test page')
         # make sure we can acquire
         self.assertEqual(ob.ob2, ob2)
+
+    def test_traverse_after_registry_change(self):
+        from zope.component import getGlobalSiteManager
+        from zope.publisher.browser import IDefaultBrowserLayer
+        root, folder = self._makeRootAndFolder()
+        r = self._makeOne(root)
+        self.assertRaises(NotFound, r.traverse, 'folder/dummy')
+
+        getGlobalSiteManager().registerAdapter(
+            lambda context, request: DummyTraverser(),
+            (self._dummyInterface(), IDefaultBrowserLayer),
+            IPublishTraverse)
+        r = self._makeOne(root)
+        self.assertEqual(r.traverse('folder/dummy'), 'dummy object')
+
+    def test_traverse_w_other_request_layer(self):
+        from zope.interface import alsoProvides
+        from zope.publisher.browser import IDefaultBrowserLayer
+        from zope.component import getGlobalSiteManager
+
+        class ILayer(IDefaultBrowserLayer):
+            pass
+
+        getGlobalSiteManager().registerAdapter(
+            lambda context, request: DummyTraverser(),
+            (self._dummyInterface(), ILayer), IPublishTraverse)
+        root, folder = self._makeRootAndFolder()
+        self.assertRaises(NotFound, self._makeOne(root).traverse,
+                          'folder/dummy')
+        r = self._makeOne(root)
+        alsoProvides(r, ILayer)
+        self.assertEqual(r.traverse('folder/dummy'), 'dummy object')
@@ -128,3 +128,29 @@ class TestExpandRanges(unittest.TestCase):
 
     def testRemoveUnsatisfiable(self):
         self.expectSets([(sys.maxsize, None), (10, 20)], 50, [(10, 20)])
+
+
+class TestCoalesceRanges(unittest.TestCase):
+
+    def expectSets(self, sets, expect):
+        from ZPublisher.HTTPRangeSupport import coalesceRanges
+        self.assertEqual(coalesceRanges(sets), expect)
+
+    def testNoOverlap(self):
+        self.expectSets([(1000, 2000), (3000, 5000), (1, 5)],
+                        [(1000, 2000), (3000, 5000), (1, 5)])
+
+    def testOverlapInOrder(self):
+        self.expectSets([(1, 10), (8, 20), (25, 5000)],
+                        [(1, 20), (25, 5000)])
+
+    def testOverlapOutOfOrder(self):
+        self.expectSets([(25, 50), (8, 5000), (1, 10)], [(1, 5000)])
+        self.expectSets([(60, 70), (25, 50), (30, 40)],
+                        [(60, 70), (25, 50)])
+
+    def testAdjacent(self):
+        self.expectSets([(1, 10), (10, 20)], [(1, 10), (10, 20)])
+
+    def testDuplicates(self):
+        self.expectSets([(5, 10)] * 100, [(5, 10)])
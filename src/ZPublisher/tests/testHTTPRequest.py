@@ -791,6 +791,75 @@ class HTTPRequestTests(unittest.TestCase, HTTPRequestFactoryMixin):
         self.assertEqual(req.form['foo'], '1')
         self.assertEqual(req.form['bar'], '2')
 
+    def _makeLazyOne(self, environ):
+        from ZPublisher import HTTPRequest
+        orig = HTTPRequest.lazy_inputs
+        HTTPRequest.lazy_inputs = True
+        try:
+            req = self._makeOne(environ=environ)
+            req.processInputs()
+        finally:
+            HTTPRequest.lazy_inputs = orig
+        return req
+
+    def test_processInputs_lazy_defers_until_form_access(self):
+        env = {'QUERY_STRING': 'foo=bar&spam=eggs'}
+        req = self._makeLazyOne(env)
+        self.assertTrue(req._inputs_pending)
+        self.assertEqual(req._form, {})
+        self.assertEqual(req.get('foo'), 'bar')
+        self.assertFalse(req._inputs_pending)
+        self.assertEqual(req.form, {'foo': 'bar', 'spam': 'eggs'})
+
+    def test_processInputs_lazy_taintedform_triggers_parsing(self):
+        env = {'QUERY_STRING': 'foo=%3Cscript%3E'}
+        req = self._makeLazyOne(env)
+        self.assertEqual(list(req.taintedform.keys()), ['foo'])
+        self.assertEqual(req.form['foo'], '<script>')
+
+    def test_processInputs_lazy_w_marshalling_is_eager(self):
+        env = {'QUERY_STRING': 'num%3Aint=42'}
+        req = self._makeLazyOne(env)
+        self.assertFalse(req._inputs_pending)
+        self.assertEqual(req._form, {'num': 42})
+
+        env = {'QUERY_STRING': 'x=1&meth:method=1'}
+        req = self._makeLazyOne(env)
+        self.assertFalse(req._inputs_pending)
+        self.assertEqual(req.other['PATH_INFO'], '/meth')
+
+    def test_processInputs_lazy_w_body_is_eager(self):
+        body = b'foo=1'
+        environ = {
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': len(body),
+            'REQUEST_METHOD': 'POST',
+        }
+        from ZPublisher import HTTPRequest
+        orig = HTTPRequest.lazy_inputs
+        HTTPRequest.lazy_inputs = True
+        try:
+            req = self._makeOne(stdin=BytesIO(body), environ=environ)
+            req.processInputs()
+        finally:
+            HTTPRequest.lazy_inputs = orig
+        self.assertFalse(req._inputs_pending)
+        self.assertEqual(req._form, {'foo': '1'})
+
+    def test_lazy_cookies(self):
+        env = {'HTTP_COOKIE': 'foo=bar; baz=%3Cgee%3E'}
+        req = self._makeLazyOne(env)
+        self.assertEqual(req._cookie_header, 'foo=bar; baz=%3Cgee%3E')
+        self.assertEqual(req['foo'], 'bar')
+        self.assertIsNone(req._cookie_header)
+        self.assertEqual(req.cookies, {'foo': 'bar', 'baz': '<gee>'})
+        self.assertEqual(list(req.taintedcookies.keys()), ['baz'])
+
+    def test_lazy_close_does_not_parse(self):
+        req = self._makeLazyOne({'QUERY_STRING': 'foo=bar'})
+        req.close()
+        self.assertEqual(req.form, {})
+
     def test_postProcessInputs(self):
         from ZPublisher.HTTPRequest import default_encoding
 
@@ -819,6 +888,32 @@ class HTTPRequestTests(unittest.TestCase, HTTPRequestFactoryMixin):
         self.assertIsInstance(req.form['foo_dict']['bar'], unicode)
         self.assertEqual(req.form['foo_dict']['bar'], u'EGGS')
 
+    def test_supports_retry(self):
+        req = self._makeOne()
+        req.retry_max_count = 1
+        self.assertTrue(req.supports_retry())
+        req.retry_count = 1
+        self.assertFalse(req.supports_retry())
+
+    def test_retry_waits_as_told_by_retry_policy(self):
+        from ZPublisher import retry
+
+        class Policy(object):
+            def delay(self, retry_count):
+                self.retry_count = retry_count
+                return 0
+
+        policy = Policy()
+        orig = retry.setRetryPolicy(policy)
+        try:
+            req = self._makeOne()
+            req.retry_count = 2
+            new_req = req.retry()
+        finally:
+            retry.setRetryPolicy(orig)
+        self.assertEqual(policy.retry_count, 2)
+        self.assertEqual(new_req.retry_count, 3)
+
     def test_close_removes_stdin_references(self):
         # Verifies that all references to the input stream go away on
         # request.close().  Otherwise a tempfile may stick around.
@@ -843,6 +938,21 @@ class HTTPRequestTests(unittest.TestCase, HTTPRequestFactoryMixin):
         self.assertTrue(f.name)
         self.assertEqual(4006, len(f.file.read()))
 
+    def test_processInputs_w_large_input_honors_spool_threshold(self):
+        from ZPublisher import formparser
+        s = BytesIO(TEST_LARGEFILE_DATA)
+        environ = self._makePostEnviron(body=TEST_LARGEFILE_DATA)
+        req = self._makeOne(stdin=s, environ=environ)
+        orig = formparser.spool_threshold
+        formparser.spool_threshold = 10000
+        try:
+            req.processInputs()
+        finally:
+            formparser.spool_threshold = orig
+        f = req.form.get('largefile')
+        self.assertIsInstance(f.file, BytesIO)
+        self.assertEqual(4006, len(f.read()))
+
     def test_processInputs_with_file_upload_gets_iterator(self):
         # checks fileupload object supports the iterator protocol
         # collector entry 1837
@@ -1185,6 +1295,17 @@ class HTTPRequestTests(unittest.TestCase, HTTPRequestFactoryMixin):
                          '{"intkey":123,"stringkey":"blah"}')
         self.assertEqual(req.cookies['anothercookie'], 'boring')
 
+    def test_cookie_limit(self):
+        from ZPublisher import HTTPRequest
+        env = {'HTTP_COOKIE': 'a=1; b=2; a=3; c=4'}
+        orig = HTTPRequest.cookie_limit
+        HTTPRequest.cookie_limit = 3
+        try:
+            req = self._makeOne(environ=env)
+        finally:
+            HTTPRequest.cookie_limit = orig
+        self.assertEqual(req.cookies, {'a': '1', 'b': '2'})
+
     def test_getVirtualRoot(self):
         # https://bugs.launchpad.net/zope2/+bug/193122
         req = self._makeOne()
@@ -1196,6 +1317,44 @@ class HTTPRequestTests(unittest.TestCase, HTTPRequestFactoryMixin):
         self.assertEqual(req.getVirtualRoot(), '/foo/bar')
 
 
+class ParseCookieTests(unittest.TestCase):
+
+    def _callFUT(self, text, **kw):
+        from ZPublisher.HTTPRequest import parse_cookie
+        return parse_cookie(text, **kw)
+
+    def test_empty(self):
+        self.assertEqual(self._callFUT(''), {})
+        self.assertEqual(self._callFUT(' ; '), {})
+
+    def test_first_value_wins(self):
+        self.assertEqual(self._callFUT('a=1; a=2'), {'a': '1'})
+
+    def test_quoted_msie_and_paramless(self):
+        self.assertEqual(
+            self._callFUT('q="x; y"; msie=a b,c; broken; u=%3Cu%3E'),
+            {'q': 'x; y', 'msie': 'a b,c', 'broken': '', 'u': '<u>'})
+
+    def test_stops_at_unparseable_text(self):
+        self.assertEqual(self._callFUT('a=1; =2; b=3'), {'a': '1'})
+
+    def test_fills_result(self):
+        result = {'a': 'old'}
+        self.assertIs(self._callFUT('a=1; b=2', result=result), result)
+        self.assertEqual(result, {'a': 'old', 'b': '2'})
+
+    def test_many_cookies(self):
+        text = '; '.join('c%d=%d' % (i, i) for i in range(10000))
+        result = self._callFUT(text)
+        self.assertEqual(len(result), 10000)
+        self.assertEqual(result['c9999'], '9999')
+
+    def test_limit(self):
+        text = '; '.join('c%d=%d' % (i, i) for i in range(10))
+        self.assertEqual(self._callFUT(text, limit=2), {'c0': '0', 'c1': '1'})
+        self.assertEqual(len(self._callFUT(text, limit=0)), 10)
+
+
 class TestHTTPRequestZope3Views(TestRequestViewsBase):
 
     def _makeOne(self, root):
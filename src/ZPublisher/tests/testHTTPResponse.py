@@ -727,6 +727,90 @@ class HTTPResponseTests(unittest.TestCase):
         response.setBody(b'foo' * 100)  # body must get smaller on compression
         self.assertEqual(response.getHeader('Vary'), None)
 
+    def test_enableHTTPCompression_negotiates_encoding(self):
+        response = self._makeOne()
+        self.assertEqual(response.enableHTTPCompression(
+            {'HTTP_ACCEPT_ENCODING': 'gzip;q=0.2, deflate;q=0.8'}), 1)
+        response.setBody(b'foo' * 100)
+        self.assertEqual(response.getHeader('Content-Encoding'), 'deflate')
+
+    def test_enableHTTPCompression_refused_encodings(self):
+        response = self._makeOne()
+        self.assertEqual(response.enableHTTPCompression(
+            {'HTTP_ACCEPT_ENCODING': 'identity, gzip;q=0'}), 0)
+        response.setBody(b'foo' * 100)
+        self.assertFalse(response.getHeader('Content-Encoding'))
+
+    def test_enableHTTPCompression_forced_wo_accepted_encoding(self):
+        response = self._makeOne()
+        self.assertEqual(response.enableHTTPCompression({}, force=True), 2)
+        response.setBody(b'foo' * 100)
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+
+    def test_setBody_compression_weakens_etag(self):
+        response = self._makeOne()
+        response.setHeader('ETag', '"ts1"')
+        response.enableHTTPCompression({'HTTP_ACCEPT_ENCODING': 'gzip'})
+        response.setBody(b'foo' * 100)
+        self.assertEqual(response.getHeader('ETag'), 'W/"ts1"')
+
+    def test_setBody_wo_compression_keeps_strong_etag(self):
+        response = self._makeOne()
+        response.setHeader('ETag', '"ts1"')
+        response.enableHTTPCompression({'HTTP_ACCEPT_ENCODING': 'gzip'})
+        response.setBody(b'foo')
+        self.assertEqual(response.getHeader('ETag'), '"ts1"')
+
+    def test_setBody_compression_w_etag_uses_variant_cache(self):
+        from ZPublisher import compression
+        orig = compression.variant_cache
+        compression.variant_cache = cache = compression.VariantCache()
+        try:
+            for i in range(2):
+                response = self._makeOne()
+                response.setHeader('ETag', '"ts1"')
+                response.enableHTTPCompression(
+                    {'HTTP_ACCEPT_ENCODING': 'gzip'})
+                response.setBody(b'foo' * 100)
+                self.assertEqual(response.getHeader('Content-Encoding'),
+                                 'gzip')
+            self.assertEqual(len(cache), 1)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            # A changed body with the same ETag is not served from the cache
+            response = self._makeOne()
+            response.setHeader('ETag', '"ts1"')
+            response.enableHTTPCompression({'HTTP_ACCEPT_ENCODING': 'gzip'})
+            response.setBody(b'bar' * 100)
+            self.assertEqual(cache.hits, 1)
+        finally:
+            compression.variant_cache = orig
+        import zlib
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         b'bar' * 100)
+
+    def test_setBody_compression_of_repeatable_body_uses_variant_cache(self):
+        from ZPublisher import compression
+        orig = compression.variant_cache
+        compression.variant_cache = cache = compression.VariantCache()
+        try:
+            response = self._makeOne()
+            response.enableHTTPCompression({'HTTP_ACCEPT_ENCODING': 'gzip'})
+            response.setBody(b'foo' * 100)
+            self.assertEqual(len(cache), 0)
+            for i in range(2):
+                response = self._makeOne()
+                response.markBodyRepeatable()
+                response.enableHTTPCompression(
+                    {'HTTP_ACCEPT_ENCODING': 'gzip'})
+                response.setBody(b'foo' * 100)
+                self.assertEqual(response.getHeader('Content-Encoding'),
+                                 'gzip')
+            self.assertEqual(len(cache), 1)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        finally:
+            compression.variant_cache = orig
+
     def test_redirect_defaults(self):
         URL = 'http://example.com'
         response = self._makeOne()
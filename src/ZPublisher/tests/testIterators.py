@@ -1,3 +1,4 @@
+import os
 import unittest
 from zope.interface.verify import verifyClass
 from ZPublisher.Iterators import IStreamIterator, filestream_iterator
@@ -7,3 +8,110 @@ class TestFileStreamIterator(unittest.TestCase):
 
     def testInterface(self):
         verifyClass(IStreamIterator, filestream_iterator)
+
+
+class TestFileStreamRangeIterator(unittest.TestCase):
+
+    def _makeOne(self, data, start, end, streamsize=1 << 16):
+        import tempfile
+        from ZPublisher.Iterators import filestream_range_iterator
+        with tempfile.NamedTemporaryFile(delete=False) as fd:
+            fd.write(data)
+        self.addCleanup(os.remove, fd.name)
+        iterator = filestream_range_iterator(fd.name, start, end, streamsize)
+        self.addCleanup(iterator.close)
+        return iterator
+
+    def testInterface(self):
+        from ZPublisher.Iterators import filestream_range_iterator
+        verifyClass(IStreamIterator, filestream_range_iterator)
+
+    def test_range(self):
+        iterator = self._makeOne(b'0123456789' * 10, 15, 42, streamsize=10)
+        self.assertEqual(len(iterator), 27)
+        chunks = list(iterator)
+        self.assertEqual(chunks, [b'5678901234', b'5678901234', b'5678901'])
+
+    def test_range_beyond_end_of_file(self):
+        iterator = self._makeOne(b'0123456789', 5, 20)
+        self.assertEqual(list(iterator), [b'56789'])
+
+
+class TestByteRangesIterator(unittest.TestCase):
+
+    def _makeOne(self, file, ranges, streamsize=1 << 16):
+        from ZPublisher.Iterators import byteranges_iterator
+        return byteranges_iterator(
+            file, ranges, 'BOUNDARY', 'text/plain', 100, streamsize)
+
+    def testInterface(self):
+        from ZPublisher.Iterators import byteranges_iterator
+        verifyClass(IStreamIterator, byteranges_iterator)
+
+    def test_parts(self):
+        import io
+        iterator = self._makeOne(io.BytesIO(b'0123456789' * 10),
+                                 [(15, 42), (0, 3)], streamsize=10)
+        chunks = list(iterator)
+        self.assertEqual(chunks, [
+            b'\r\n--BOUNDARY\r\nContent-Type: text/plain\r\n'
+            b'Content-Range: bytes 15-41/100\r\n\r\n',
+            b'5678901234', b'5678901234', b'5678901',
+            b'\r\n--BOUNDARY\r\nContent-Type: text/plain\r\n'
+            b'Content-Range: bytes 0-2/100\r\n\r\n',
+            b'012',
+            b'\r\n--BOUNDARY--\r\n'])
+        self.assertEqual(len(iterator), len(b''.join(chunks)))
+
+    def test_close(self):
+        import io
+        file = io.BytesIO(b'data')
+        iterator = self._makeOne(file, [(0, 1), (2, 3)])
+        iterator.close()
+        self.assertTrue(file.closed)
+
+
+class TestCompressedStreamIterator(unittest.TestCase):
+
+    def _makeOne(self, iterable, encoding='gzip', level=6):
+        from ZPublisher.Iterators import CompressedStreamIterator
+        return CompressedStreamIterator(iterable, encoding, level)
+
+    def _decompress(self, data):
+        import zlib
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+    def testInterface(self):
+        from ZPublisher.Iterators import CompressedStreamIterator
+        from ZPublisher.Iterators import IUnboundStreamIterator
+        verifyClass(IUnboundStreamIterator, CompressedStreamIterator)
+
+    def test_compresses_all_chunks(self):
+        chunks = [b'abc' * 100, b'', b'def' * 100]
+        data = b''.join(self._makeOne(chunks))
+        self.assertEqual(self._decompress(data), b''.join(chunks))
+
+    def test_empty(self):
+        self.assertEqual(self._decompress(b''.join(self._makeOne([]))), b'')
+
+    def test_chunks_are_flushed(self):
+        import zlib
+        iterator = self._makeOne([b'first', b'second'])
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(next(iterator)), b'first')
+
+    def test_deflate(self):
+        import zlib
+        data = b''.join(self._makeOne([b'abc', b'def'], 'deflate'))
+        self.assertEqual(zlib.decompress(data), b'abcdef')
+
+    def test_close(self):
+        class Body(list):
+            closed = False
+
+            def close(self):
+                self.closed = True
+        body = Body([b'data'])
+        iterator = self._makeOne(body)
+        iterator.close()
+        self.assertTrue(body.closed)
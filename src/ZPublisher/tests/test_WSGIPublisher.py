@@ -66,6 +66,134 @@ class WSGIResponseTests(unittest.TestCase):
         response.finalize()
         self.assertFalse(response.getHeader('Content-Length'))
 
+    def _makeCompressing(self):
+        response = self._makeOne(stdout=io.BytesIO())
+        response.enableHTTPCompression({'HTTP_ACCEPT_ENCODING': 'gzip'})
+        return response
+
+    def test_finalize_compresses_body(self):
+        import zlib
+        response = self._makeCompressing()
+        response.setBody(b'TESTING' * 100)
+        self.assertEqual(response.body, b'TESTING' * 100)
+        response.finalize()
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+        self.assertEqual(response.getHeader('Vary'), 'Accept-Encoding')
+        self.assertEqual(response.getHeader('Content-Length'),
+                         str(len(response.body)))
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         b'TESTING' * 100)
+
+    def test_finalize_compresses_streamed_output(self):
+        response = self._makeCompressing()
+        response.write(b'TESTING' * 100)
+        response.finalize()
+        self.assertEqual(response._stream_encoding, 'gzip')
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+        self.assertFalse(response.getHeader('Content-Length'))
+
+    def test_finalize_compresses_body_w_negotiated_encoding(self):
+        import zlib
+        response = self._makeOne(stdout=io.BytesIO())
+        response.enableHTTPCompression(
+            {'HTTP_ACCEPT_ENCODING': 'gzip;q=0.5, deflate'})
+        response.setBody(b'TESTING' * 100)
+        response.finalize()
+        self.assertEqual(response.getHeader('Content-Encoding'), 'deflate')
+        self.assertEqual(zlib.decompress(response.body), b'TESTING' * 100)
+
+    def test_finalize_skips_compression_below_min_size(self):
+        from ZPublisher import HTTPResponse
+        orig = HTTPResponse.compression_min_size
+        HTTPResponse.compression_min_size = 1000
+        try:
+            response = self._makeCompressing()
+            response.write(b'TESTING' * 100)
+            response.finalize()
+            self.assertIsNone(response._stream_encoding)
+            response = self._makeCompressing()
+            response.setBody(b'TESTING' * 100)
+            response.finalize()
+            self.assertFalse(response.getHeader('Content-Encoding'))
+        finally:
+            HTTPResponse.compression_min_size = orig
+
+    def test_finalize_skips_compression_of_partial_content(self):
+        response = self._makeCompressing()
+        response.setStatus(206)
+        response.setHeader('Content-Type', 'video/mp4')
+        response.setHeader('Content-Length', '10000')
+        response.setHeader('Content-Range', 'bytes 100-10099/100000')
+        response.write(b'x' * 10000)
+        response.finalize()
+        self.assertIsNone(response._stream_encoding)
+        self.assertFalse(response.getHeader('Content-Encoding'))
+        self.assertEqual(response.getHeader('Content-Length'), '10000')
+
+    def test_finalize_skips_compression_w_content_range(self):
+        response = self._makeCompressing()
+        response.setHeader('Content-Range', 'bytes 0-699/700')
+        response.setBody(b'TESTING' * 100)
+        response.finalize()
+        self.assertFalse(response.getHeader('Content-Encoding'))
+
+    def test_finalize_skips_compression_of_not_modified(self):
+        response = self._makeCompressing()
+        response.setStatus(304)
+        response.write(b'TESTING' * 100)
+        response.finalize()
+        self.assertIsNone(response._stream_encoding)
+        self.assertFalse(response.getHeader('Content-Encoding'))
+
+    def test_finalize_skips_compression_of_streamed_files(self):
+        response = self._makeCompressing()
+        response.setHeader('Content-Type', 'text/plain')
+        response.setBody(io.BytesIO(b'TESTING' * 100))
+        response._streaming = 1
+        response.finalize()
+        self.assertIsNone(response._stream_encoding)
+        self.assertFalse(response.getHeader('Content-Encoding'))
+
+    def test_finalize_compresses_files_w_variant_cache(self):
+        import zlib
+        from ZPublisher import compression
+        orig = compression.variant_cache
+        compression.variant_cache = cache = compression.VariantCache()
+        try:
+            for i in range(2):
+                response = self._makeCompressing()
+                response.setHeader('Content-Type', 'text/css')
+                body = io.BytesIO(b'TESTING' * 100)
+                response.setBody(body)
+                response.finalize()
+                self.assertTrue(body.closed)
+                self.assertEqual(response.getHeader('Content-Encoding'),
+                                 'gzip')
+                self.assertEqual(response.getHeader('Content-Length'),
+                                 str(len(response.body)))
+                self.assertEqual(
+                    zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                    b'TESTING' * 100)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        finally:
+            compression.variant_cache = orig
+
+    def test_finalize_skips_compression_of_large_files(self):
+        from ZPublisher import HTTPResponse
+        orig = HTTPResponse.compression_max_file_size
+        HTTPResponse.compression_max_file_size = 100
+        try:
+            response = self._makeCompressing()
+            response.setHeader('Content-Type', 'text/css')
+            body = io.BytesIO(b'TESTING' * 100)
+            response.setBody(body)
+            response.finalize()
+        finally:
+            HTTPResponse.compression_max_file_size = orig
+        self.assertIs(response.body, body)
+        self.assertFalse(response.getHeader('Content-Encoding'))
+        self.assertEqual(response.getHeader('Content-Length'), '700')
+
     def test_listHeaders_skips_Server_header_wo_server_version_set(self):
         response = self._makeOne()
         response.setBody('TESTING')
@@ -203,6 +331,11 @@ class TestPublish(unittest.TestCase):
 
 class TestPublishModule(ZopeTestCase):
 
+    def tearDown(self):
+        for for_ in (IUnauthorized, IForbidden, INotFound, IException):
+            unregisterExceptionView(for_)
+        super(TestPublishModule, self).tearDown()
+
     def _callFUT(self, environ, start_response,
                  _publish=None, _response_factory=None, _request_factory=None):
         from ZPublisher.WSGIPublisher import publish_module
@@ -273,6 +406,81 @@ class TestPublishModule(ZopeTestCase):
         self.assertEqual(self._callFUT(environ, noopStartResponse),
                          (b'', b'foobar'))
 
+    def _enableTiming(self, server_timing=False):
+        from zope.component import getGlobalSiteManager
+        from ZPublisher import timing
+        handlers = (timing.afterStart, timing.afterTraversal,
+                    timing.beforeCommit, timing.afterSuccess,
+                    timing.afterFailure)
+        gsm = getGlobalSiteManager()
+        for handler in handlers:
+            gsm.registerHandler(handler)
+        timing.enabled = True
+        timing.server_timing = server_timing
+
+        def cleanUp():
+            for handler in handlers:
+                gsm.unregisterHandler(handler)
+            timing.enabled = timing.server_timing = False
+            timing.timing_stats.clear()
+        self.addCleanup(cleanUp)
+
+    def test_request_timing(self):
+        from ZPublisher import timing
+
+        class TestView(object):
+            __name__ = 'testing'
+
+            def __init__(self, context, request):
+                pass
+
+            def __call__(self):
+                return 'foobar'
+
+        self._registerView(TestView, 'testing')
+        self._enableTiming(server_timing=True)
+        environ = self._makeEnviron(PATH_INFO='/testing')
+        start_response = DummyCallable()
+        self.assertEqual(self._callFUT(environ, start_response),
+                         (b'', b'foobar'))
+        (status, headers), kw = start_response._called_with
+        header = dict(headers)['Server-Timing']
+        self.assertEqual(
+            [item.split(';')[0] for item in header.split(', ')],
+            ['app', 'inputs', 'traversal', 'metadata', 'call', 'commit',
+             'finalize', 'total'])
+        stats = timing.timing_stats.items()
+        self.assertEqual(stats[-1]['phase'], 'total')
+        self.assertEqual(stats[-1]['count'], 1)
+
+    def test_request_timing_wo_server_timing_header(self):
+        from ZPublisher import timing
+        self._enableTiming()
+        _response = DummyResponse()
+        _response._status = '200 OK'
+        _response._headers = []
+        _response.body = b'BODY'
+        _publish = DummyCallable()
+        _publish._result = _response
+        start_response = DummyCallable()
+        self._callFUT(self._makeEnviron(), start_response, _publish)
+        (status, headers), kw = start_response._called_with
+        self.assertEqual(headers, [])
+        self.assertEqual([item['phase']
+                          for item in timing.timing_stats.items()],
+                         ['app', 'call', 'commit', 'finalize', 'total'])
+
+    def test_request_timing_disabled(self):
+        from ZPublisher import timing
+        _response = DummyResponse()
+        _response._status = '200 OK'
+        _response._headers = []
+        _response.body = b'BODY'
+        _publish = DummyCallable()
+        _publish._result = _response
+        self._callFUT(self._makeEnviron(), DummyCallable(), _publish)
+        self.assertEqual(timing.timing_stats.items(), [])
+
     def test_publish_can_return_new_response(self):
         from ZPublisher.HTTPRequest import HTTPRequest
         _response = DummyResponse()
@@ -370,6 +578,28 @@ class TestPublishModule(ZopeTestCase):
         app_iter = self._callFUT(environ, start_response, _publish)
         self.assertTrue(app_iter is body)
 
+    def test_response_body_is_file_w_file_wrapper(self):
+        from ZPublisher.Iterators import filestream_iterator
+
+        class FileWrapper(object):
+            def __init__(self, filelike, block_size=8192):
+                self.filelike = filelike
+                self.block_size = block_size
+
+        _response = DummyResponse()
+        _response._status = '200 OK'
+        _response._headers = [('Content-Length', '4')]
+        body = _response.body = filestream_iterator(__file__, 'rb')
+        self.addCleanup(body.close)
+        environ = self._makeEnviron(**{'wsgi.file_wrapper': FileWrapper})
+        start_response = DummyCallable()
+        _publish = DummyCallable()
+        _publish._result = _response
+        app_iter = self._callFUT(environ, start_response, _publish)
+        self.assertIsInstance(app_iter, FileWrapper)
+        self.assertIs(app_iter.filelike, body)
+        self.assertEqual(app_iter.block_size, 1 << 16)
+
     def test_response_is_stream(self):
         from ZPublisher.Iterators import IStreamIterator
         from zope.interface import implementer
@@ -425,6 +655,30 @@ class TestPublishModule(ZopeTestCase):
         app_iter = self._callFUT(environ, start_response, _publish)
         self.assertTrue(app_iter is body)
 
+    def test_response_is_compressed_stream(self):
+        import zlib
+        from ZPublisher.HTTPResponse import WSGIResponse
+        from ZPublisher.Iterators import CompressedStreamIterator
+        from ZPublisher.WSGIPublisher import publish_module
+
+        def _publish(request, module_info):
+            response = request.response
+            response.enableHTTPCompression(request)
+            response.write(b'streamed ')
+            response.setBody(b'body')
+            return response
+
+        environ = self._makeEnviron(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        start_response = DummyCallable()
+        app_iter = publish_module(environ, start_response, _publish,
+                                  _response_factory=WSGIResponse)
+        self.assertIsInstance(app_iter, CompressedStreamIterator)
+        self.assertEqual(zlib.decompress(b''.join(app_iter),
+                                         16 + zlib.MAX_WBITS),
+                         b'streamed body')
+        (status, headers), kw = start_response._called_with
+        self.assertIn(('Content-Encoding', 'gzip'), headers)
+
     def test_request_closed(self):
         environ = self._makeEnviron()
         start_response = DummyCallable()
@@ -443,6 +697,79 @@ class TestPublishModule(ZopeTestCase):
                       _request_factory=_request_factory)
         self.assertTrue(_request._closed)
 
+    def _publishConflicting(self, conflicts, retry_max_count, **kw):
+        from ZODB.POSException import ConflictError
+        from ZPublisher.HTTPRequest import WSGIRequest
+        from ZPublisher import retry
+
+        class NoDelay(object):
+            delays = []
+
+            def delay(self, retry_count):
+                self.delays.append(retry_count)
+                return 0
+
+        class Request(WSGIRequest):
+            pass
+        Request.retry_max_count = retry_max_count
+
+        calls = []
+        self._inputs = []
+
+        def _publish(request, module_info):
+            request.processInputs()
+            self._inputs.append(request.form.get('foo'))
+            calls.append(request)
+            if len(calls) <= conflicts:
+                raise ConflictError()
+            response = request.response
+            response.setBody(b'OK')
+            return response
+
+        environ = self._makeEnviron(PATH_INFO='/conflicting', **kw)
+        policy = NoDelay()
+        orig = retry.setRetryPolicy(policy)
+        retry.conflict_stats.clear()
+        try:
+            self._callFUT(environ, noopStartResponse, _publish,
+                          _request_factory=Request)
+        except ConflictError:
+            raised = True
+        else:
+            raised = False
+        finally:
+            retry.setRetryPolicy(orig)
+            stats = retry.conflict_stats.items()
+            retry.conflict_stats.clear()
+        return calls, policy.delays, stats, raised
+
+    def test_conflict_is_retried_and_counted(self):
+        calls, delays, stats, raised = self._publishConflicting(1, 1)
+        self.assertFalse(raised)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[1].retry_count, 1)
+        self.assertEqual(delays, [0])
+        self.assertEqual(stats, [{'path': '/conflicting', 'conflicts': 1,
+                                  'retries': 1, 'failures': 0}])
+
+    def test_conflict_retries_reread_input(self):
+        from io import BytesIO
+        calls, delays, stats, raised = self._publishConflicting(
+            2, 3, REQUEST_METHOD='POST',
+            CONTENT_TYPE='application/x-www-form-urlencoded',
+            CONTENT_LENGTH='5', **{'wsgi.input': BytesIO(b'foo=1')})
+        self.assertFalse(raised)
+        self.assertEqual(self._inputs, ['1', '1', '1'])
+        self.assertEqual(delays, [0, 1])
+
+    def test_conflict_wo_retries_left_is_counted(self):
+        calls, delays, stats, raised = self._publishConflicting(2, 1)
+        self.assertTrue(raised)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(delays, [0])
+        self.assertEqual(stats, [{'path': '/conflicting', 'conflicts': 2,
+                                  'retries': 1, 'failures': 1}])
+
     def testCustomExceptionViewUnauthorized(self):
         from AccessControl import Unauthorized
         registerExceptionView(IUnauthorized)
@@ -628,6 +955,19 @@ def registerExceptionView(for_):
     )
 
 
+def unregisterExceptionView(for_):
+    from zope.interface import Interface
+    from zope.component import getGlobalSiteManager
+    from zope.publisher.interfaces.browser import IDefaultBrowserLayer
+    gsm = getGlobalSiteManager()
+    gsm.unregisterAdapter(
+        CustomExceptionView,
+        required=(for_, IDefaultBrowserLayer),
+        provided=Interface,
+        name=u'index.html',
+    )
+
+
 class DummyRequest(dict):
     _processedInputs = False
     _traversed = None
@@ -0,0 +1,144 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+import zlib
+
+from ZPublisher import compression
+
+
+class NegotiateTests(unittest.TestCase):
+
+    def _callFUT(self, accept_encoding, encodings=('gzip', 'deflate')):
+        return compression.negotiate(accept_encoding, encodings)
+
+    def test_empty(self):
+        self.assertIsNone(self._callFUT(''))
+        self.assertIsNone(self._callFUT('identity'))
+
+    def test_server_preference_on_equal_quality(self):
+        self.assertEqual(self._callFUT('deflate, gzip'), 'gzip')
+        self.assertEqual(self._callFUT('deflate, gzip',
+                                       ('deflate', 'gzip')), 'deflate')
+
+    def test_quality_values(self):
+        self.assertEqual(self._callFUT('gzip;q=0.5, deflate'), 'deflate')
+        self.assertEqual(self._callFUT('gzip; q=1.0, deflate;q=0.9'), 'gzip')
+
+    def test_zero_quality_is_refused(self):
+        self.assertIsNone(self._callFUT('gzip;q=0'))
+        self.assertEqual(self._callFUT('gzip;q=0, deflate;q=0.1'), 'deflate')
+
+    def test_wildcard(self):
+        self.assertEqual(self._callFUT('*'), 'gzip')
+        self.assertEqual(self._callFUT('gzip;q=0, *'), 'deflate')
+        self.assertIsNone(self._callFUT('*;q=0'))
+
+    def test_x_gzip(self):
+        self.assertEqual(self._callFUT('x-gzip'), 'gzip')
+
+    def test_case_insensitive(self):
+        self.assertEqual(self._callFUT('GZIP'), 'gzip')
+
+    def test_invalid_quality(self):
+        self.assertEqual(self._callFUT('gzip;q=1.2.3, deflate'), 'deflate')
+
+    def test_default_encodings(self):
+        self.assertEqual(compression.negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(compression.negotiate('*'),
+                         compression.ENCODINGS[0])
+
+
+class CompressTests(unittest.TestCase):
+
+    def test_gzip(self):
+        data = b'abc' * 1000
+        compressed = b''.join(compression.compress(data, 'gzip',
+                                                   chunk_size=100))
+        self.assertEqual(zlib.decompress(compressed, 16 + zlib.MAX_WBITS),
+                         data)
+
+    def test_deflate(self):
+        data = b'abc' * 1000
+        compressed = b''.join(compression.compress(data, 'deflate'))
+        self.assertEqual(zlib.decompress(compressed), data)
+
+    def test_sync_flush(self):
+        compressor = compression.compressobj('gzip')
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunk = compressor.compress(b'first') + compressor.flush(sync=True)
+        self.assertEqual(decompressor.decompress(chunk), b'first')
+
+    @unittest.skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        data = b'abc' * 1000
+        compressed = b''.join(compression.compress(data, 'br'))
+        self.assertEqual(compression.brotli.decompress(compressed), data)
+
+    @unittest.skipUnless(compression.zstandard, 'zstandard is not installed')
+    def test_zstandard(self):
+        data = b'abc' * 1000
+        compressed = b''.join(compression.compress(data, 'zstd'))
+        decompressor = compression.zstandard.ZstdDecompressor()
+        self.assertEqual(decompressor.decompressobj().decompress(compressed),
+                         data)
+
+
+class VariantCacheTests(unittest.TestCase):
+
+    def _makeOne(self, *args, **kw):
+        return compression.VariantCache(*args, **kw)
+
+    def test_get_set(self):
+        cache = self._makeOne()
+        self.assertIsNone(cache.get(b'1', 'gzip', 6))
+        cache.set(b'1', 'gzip', 6, b'compressed')
+        self.assertEqual(cache.get(b'1', 'gzip', 6), b'compressed')
+        self.assertIsNone(cache.get(b'1', 'deflate', 6))
+        self.assertIsNone(cache.get(b'1', 'gzip', 9))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_lru_bounded_by_size(self):
+        cache = self._makeOne(max_size=10)
+        cache.set(b'1', 'gzip', 6, b'x' * 4)
+        cache.set(b'2', 'gzip', 6, b'x' * 4)
+        cache.get(b'1', 'gzip', 6)
+        cache.set(b'3', 'gzip', 6, b'x' * 4)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(b'2', 'gzip', 6))
+        self.assertIsNotNone(cache.get(b'1', 'gzip', 6))
+
+    def test_replacing_entry_keeps_size(self):
+        cache = self._makeOne(max_size=10)
+        cache.set(b'1', 'gzip', 6, b'x' * 6)
+        cache.set(b'1', 'gzip', 6, b'x' * 6)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get(b'1', 'gzip', 6))
+
+    def test_oversized_entries_are_not_cached(self):
+        cache = self._makeOne(max_size=100, max_entry_size=10)
+        cache.set(b'1', 'gzip', 6, b'x' * 11)
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = self._makeOne(max_size=0)
+        cache.set(b'1', 'gzip', 6, b'x')
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache = self._makeOne()
+        cache.set(b'1', 'gzip', 6, b'compressed')
+        cache.get(b'1', 'gzip', 6)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
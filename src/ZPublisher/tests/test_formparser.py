@@ -0,0 +1,180 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+from io import BytesIO
+import unittest
+
+MULTIPART_BODY = (
+    b'preamble\r\n'
+    b'--BOUNDARY\r\n'
+    b'Content-Disposition: form-data; name="title"\r\n'
+    b'\r\n'
+    b'Hello\r\n'
+    b'--BOUNDARY\r\n'
+    b'Content-Disposition: form-data; name="file"; filename="a.txt"\r\n'
+    b'Content-Type: text/plain\r\n'
+    b'\r\n'
+    b'line 1\r\n--BOUNDARY is not the delimiter\r\nline 3\r\n'
+    b'--BOUNDARY\r\n'
+    b'Content-Disposition: form-data; name="empty"\r\n'
+    b'\r\n'
+    b'\r\n'
+    b'--BOUNDARY--\r\n'
+    b'epilogue'
+)
+
+
+class FormParserTests(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from ZPublisher.formparser import FormParser
+        return FormParser
+
+    def _makeOne(self, body=b'', method='POST', content_type=None,
+                 query_string=None, **kw):
+        environ = {'REQUEST_METHOD': method,
+                   'CONTENT_LENGTH': str(len(body))}
+        if content_type is not None:
+            environ['CONTENT_TYPE'] = content_type
+        if query_string is not None:
+            environ['QUERY_STRING'] = query_string
+        kw.setdefault('encoding', 'utf-8')
+        return self._getTargetClass()(environ, BytesIO(body), **kw)
+
+    def _multipart(self, body=MULTIPART_BODY, **kw):
+        return self._makeOne(
+            body, content_type='multipart/form-data; boundary=BOUNDARY',
+            **kw)
+
+    def test_get_parses_query_string_only(self):
+        parser = self._makeOne(b'ignored=1', method='GET',
+                               query_string='a=1&b=%C3%A4&c')
+        self.assertTrue(parser.is_form)
+        self.assertEqual([(f.name, f.value) for f in parser],
+                         [('a', '1'), ('b', u'\xe4'), ('c', '')])
+
+    def test_urlencoded_w_query_string(self):
+        parser = self._makeOne(
+            b'foo=1&bar=%C3%A4',
+            content_type='application/x-www-form-urlencoded',
+            query_string='baz=2', chunk_size=3)
+        self.assertEqual([(f.name, f.value) for f in parser],
+                         [('foo', '1'), ('bar', u'\xe4'), ('baz', '2')])
+
+    def test_urlencoded_long_value_small_chunks(self):
+        value = b'x' * 1000
+        parser = self._makeOne(
+            b'a=1&b=' + value + b'&c=%C3%A4&&d',
+            content_type='application/x-www-form-urlencoded',
+            chunk_size=7)
+        self.assertEqual([(f.name, f.value) for f in parser],
+                         [('a', '1'), ('b', value.decode('ascii')),
+                          ('c', u'\xe4'), ('d', '')])
+
+    def test_post_wo_content_type_is_urlencoded(self):
+        parser = self._makeOne(b'foo=1')
+        self.assertEqual([(f.name, f.value) for f in parser], [('foo', '1')])
+
+    def test_multipart(self):
+        fields = list(self._multipart())
+        self.assertEqual([f.name for f in fields], ['title', 'file', 'empty'])
+        self.assertEqual(fields[0].value, 'Hello')
+        self.assertIsNone(fields[0].filename)
+        self.assertEqual(fields[1].filename, 'a.txt')
+        self.assertEqual(fields[1].headers['Content-Type'], 'text/plain')
+        self.assertEqual(fields[1].file.read(),
+                         b'line 1\r\n--BOUNDARY is not the delimiter\r\n'
+                         b'line 3')
+        self.assertEqual(fields[2].value, '')
+
+    def test_multipart_small_chunks(self):
+        expected = [(f.name, f.value) for f in self._multipart()]
+        for chunk_size in (1, 2, 5, 13):
+            parser = self._multipart(chunk_size=chunk_size)
+            self.assertEqual([(f.name, f.value) for f in parser], expected)
+
+    def test_multipart_w_query_string(self):
+        parser = self._multipart(query_string='qs=1')
+        self.assertEqual([f.name for f in parser],
+                         ['qs', 'title', 'file', 'empty'])
+
+    def test_multipart_lf_line_endings_and_missing_close(self):
+        body = (b'\n--BOUNDARY\n'
+                b'Content-Disposition: form-data; name="f"; filename="f"\n'
+                b'\n'
+                b'test\n\n')
+        fields = list(self._multipart(body))
+        self.assertEqual(len(fields), 1)
+        self.assertEqual(fields[0].file.read(), b'test\n')
+
+    def test_multipart_invalid_boundary(self):
+        parser = self._makeOne(
+            b'', content_type='multipart/form-data; boundary=')
+        self.assertRaises(ValueError, list, parser)
+
+    def test_multipart_fields_are_yielded_incrementally(self):
+        stdin = BytesIO(MULTIPART_BODY)
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': 'multipart/form-data; boundary=BOUNDARY',
+            'CONTENT_LENGTH': str(len(MULTIPART_BODY)),
+        }
+        parser = self._getTargetClass()(environ, stdin, chunk_size=16)
+        next(iter(parser))
+        self.assertLess(stdin.tell(), len(MULTIPART_BODY))
+
+    def test_upload_spills_to_tempfile_above_threshold(self):
+        data = b'x' * 100
+        body = (b'--BOUNDARY\r\n'
+                b'Content-Disposition: form-data; name="f"; filename="f"\r\n'
+                b'\r\n' + data + b'\r\n--BOUNDARY--\r\n')
+        small, = list(self._multipart(body, threshold=len(data)))
+        self.assertIsInstance(small.file, BytesIO)
+        big, = list(self._multipart(body, threshold=len(data) - 1))
+        self.assertNotIsInstance(big.file, BytesIO)
+        self.assertEqual(big.file.read(), data)
+
+    def test_other_body_is_file(self):
+        parser = self._makeOne(b'<xml/>', content_type='text/xml')
+        self.assertFalse(parser.is_form)
+        self.assertEqual(list(parser), [])
+        self.assertEqual(parser.value, b'<xml/>')
+        self.assertEqual(parser.file.read(), b'<xml/>')
+
+    def test_other_body_wo_content_length(self):
+        environ = {'REQUEST_METHOD': 'PUT'}
+        parser = self._getTargetClass()(environ, BytesIO(b'x' * 10),
+                                        threshold=5)
+        self.assertFalse(parser.is_form)
+        self.assertEqual(parser.file.read(), b'x' * 10)
+
+    def test_content_length_limits_read(self):
+        stdin = BytesIO(b'abcdef')
+        environ = {'REQUEST_METHOD': 'PUT', 'CONTENT_LENGTH': '3'}
+        parser = self._getTargetClass()(environ, stdin)
+        self.assertEqual(parser.value, b'abc')
+
+
+class ParseHeaderTests(unittest.TestCase):
+
+    def _callFUT(self, line):
+        from ZPublisher.formparser import parse_header
+        return parse_header(line)
+
+    def test_simple(self):
+        self.assertEqual(self._callFUT('text/plain'), ('text/plain', {}))
+
+    def test_params(self):
+        self.assertEqual(
+            self._callFUT('form-data; name="a;b"; filename="c \\"d\\""'),
+            ('form-data', {'name': 'a;b', 'filename': 'c "d"'}))
@@ -0,0 +1,97 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+
+class ExponentialBackoffTests(unittest.TestCase):
+
+    def _makeOne(self, **kw):
+        from ZPublisher.retry import ExponentialBackoff
+        return ExponentialBackoff(**kw)
+
+    def test_interface(self):
+        from zope.interface.verify import verifyObject
+        from ZPublisher.interfaces import IRetryPolicy
+        verifyObject(IRetryPolicy, self._makeOne())
+
+    def test_invalid_jitter(self):
+        self.assertRaises(ValueError, self._makeOne, jitter='some')
+
+    def test_no_jitter(self):
+        policy = self._makeOne(base=0.5, jitter='none')
+        self.assertEqual([policy.delay(i) for i in range(4)],
+                         [0.5, 1.0, 2.0, 4.0])
+
+    def test_cap(self):
+        policy = self._makeOne(base=0.5, cap=1.5, jitter='none')
+        self.assertEqual([policy.delay(i) for i in range(4)],
+                         [0.5, 1.0, 1.5, 1.5])
+
+    def test_full_jitter(self):
+        policy = self._makeOne(base=1.0, cap=4.0)
+        for i in range(100):
+            self.assertTrue(0 <= policy.delay(3) <= 4.0)
+
+    def test_equal_jitter(self):
+        policy = self._makeOne(base=1.0, jitter='equal')
+        for i in range(100):
+            self.assertTrue(1.0 <= policy.delay(1) <= 2.0)
+
+
+class RetryPolicyRegistryTests(unittest.TestCase):
+
+    def test_set_and_get(self):
+        from ZPublisher.retry import getRetryPolicy
+        from ZPublisher.retry import setRetryPolicy
+        policy = object()
+        orig = setRetryPolicy(policy)
+        try:
+            self.assertIs(getRetryPolicy(), policy)
+        finally:
+            self.assertIs(setRetryPolicy(orig), policy)
+
+
+class ConflictStatsTests(unittest.TestCase):
+
+    def _makeOne(self, **kw):
+        from ZPublisher.retry import ConflictStats
+        return ConflictStats(**kw)
+
+    def test_empty(self):
+        self.assertEqual(self._makeOne().items(), [])
+
+    def test_record(self):
+        stats = self._makeOne()
+        stats.record('/a', True)
+        stats.record('/b', True)
+        stats.record('/b', True)
+        stats.record('/b', False)
+        self.assertEqual(stats.items(), [
+            {'path': '/b', 'conflicts': 3, 'retries': 2, 'failures': 1},
+            {'path': '/a', 'conflicts': 1, 'retries': 1, 'failures': 0},
+        ])
+
+    def test_max_paths(self):
+        stats = self._makeOne(max_paths=2)
+        for path in ('/a', '/b', '/c', '/d', '/a'):
+            stats.record(path, True)
+        self.assertEqual(
+            [(item['path'], item['conflicts']) for item in stats.items()],
+            [('(other)', 2), ('/a', 2), ('/b', 1)])
+
+    def test_clear(self):
+        stats = self._makeOne()
+        stats.record('/a', True)
+        stats.clear()
+        self.assertEqual(stats.items(), [])
@@ -0,0 +1,157 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+
+class DummyClock(object):
+
+    def __init__(self, *times):
+        self.times = list(times)
+
+    def __call__(self):
+        return self.times.pop(0)
+
+
+class DummyRequest(object):
+    _timing = None
+
+
+class TimingTestBase(unittest.TestCase):
+
+    def setUp(self):
+        from ZPublisher import timing
+        self._orig_clock = timing._clock
+
+    def tearDown(self):
+        from ZPublisher import timing
+        timing._clock = self._orig_clock
+        timing.enabled = timing.server_timing = False
+        timing.timing_stats.clear()
+
+    def _makeTiming(self, *times):
+        from ZPublisher import timing
+        timing._clock = DummyClock(*times)
+        return timing.RequestTiming()
+
+
+class RequestTimingTests(TimingTestBase):
+
+    def test_marks(self):
+        timing = self._makeTiming(1.0, 1.5, 1.75, 2.0)
+        timing.mark('traversal')
+        timing.mark('app')
+        timing.mark('custom')
+        self.assertEqual(timing.items(), [
+            ('app', 0.25), ('traversal', 0.5), ('custom', 0.25)])
+        self.assertEqual(timing.total(), 1.0)
+
+    def test_repeated_phases_are_summed(self):
+        timing = self._makeTiming(0.0, 0.25, 0.5, 1.0)
+        timing.mark('call')
+        timing.mark('error')
+        timing.mark('call')
+        self.assertEqual(timing.items(), [('call', 0.75), ('error', 0.25)])
+
+    def test_header(self):
+        timing = self._makeTiming(0.0, 0.001, 0.0105)
+        timing.mark('app')
+        timing.mark('call')
+        self.assertEqual(timing.header(),
+                         'app;dur=1.00, call;dur=9.50, total;dur=10.50')
+
+
+class TimingStatsTests(TimingTestBase):
+
+    def _makeOne(self):
+        from ZPublisher.timing import TimingStats
+        return TimingStats()
+
+    def test_record(self):
+        stats = self._makeOne()
+        timing = self._makeTiming(0.0, 0.002, 0.004)
+        timing.mark('call')
+        stats.record(timing)
+        timing = self._makeTiming(0.0, 10.0)
+        timing.mark('call')
+        stats.record(timing)
+        call, total = stats.items()
+        self.assertEqual(call['phase'], 'call')
+        self.assertEqual(call['count'], 2)
+        self.assertEqual(call['mean'], 5001.0)
+        self.assertEqual(call['buckets'], [0, 1, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(total['phase'], 'total')
+        self.assertEqual(total['buckets'], [0, 1, 0, 0, 0, 0, 0, 0, 1])
+
+    def test_clear(self):
+        stats = self._makeOne()
+        stats.record(self._makeTiming(0.0))
+        stats.clear()
+        self.assertEqual(stats.items(), [])
+
+
+class FunctionTests(TimingTestBase):
+
+    def test_disabled(self):
+        from ZPublisher import timing
+        request = DummyRequest()
+        timing.start(request)
+        timing.mark(request, 'app')
+        self.assertIsNone(timing.getTiming(request))
+        headers = []
+        timing.finish(request, headers)
+        self.assertEqual(headers, [])
+        self.assertEqual(timing.timing_stats.items(), [])
+
+    def test_enabled(self):
+        from ZPublisher import timing
+        timing.enabled = True
+        timing._clock = DummyClock(0.0, 0.5, 0.75)
+        request = DummyRequest()
+        timing.start(request)
+        timing.mark(request, 'app')
+        timing.mark(request, 'finalize')
+        self.assertEqual(timing.getTiming(request).items(),
+                         [('app', 0.5), ('finalize', 0.25)])
+        headers = []
+        timing.finish(request, headers)
+        self.assertEqual(headers, [])
+        self.assertEqual(len(timing.timing_stats.items()), 3)
+
+    def test_server_timing(self):
+        from ZPublisher import timing
+        timing.enabled = timing.server_timing = True
+        timing._clock = DummyClock(0.0, 0.5)
+        request = DummyRequest()
+        timing.start(request)
+        timing.mark(request, 'call')
+        headers = []
+        timing.finish(request, headers)
+        self.assertEqual(headers, [
+            ('Server-Timing', 'call;dur=500.00, total;dur=500.00')])
+
+    def test_event_handlers(self):
+        from ZPublisher import pubevents
+        from ZPublisher import timing
+        timing.enabled = True
+        timing._clock = DummyClock(*range(6))
+        request = DummyRequest()
+        timing.start(request)
+        timing.afterStart(pubevents.PubStart(request))
+        timing.afterTraversal(pubevents.PubAfterTraversal(request))
+        timing.beforeCommit(pubevents.PubBeforeCommit(request))
+        timing.afterSuccess(pubevents.PubSuccess(request))
+        timing.afterFailure(pubevents.PubFailure(request, None, False))
+        self.assertEqual(timing.getTiming(request).items(), [
+            ('app', 1), ('traversal', 1), ('call', 1), ('commit', 1),
+            ('error', 1)])
@@ -0,0 +1,204 @@
+##############################################################################
+#
+# Copyright (c) 2018 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Timing of the phases of publishing a request.
+
+If enabled, the publisher measures how long each phase of a request
+takes.  A phase ends at a mark, and began at the previous one:
+
+  app        opening the database connection and starting the transaction
+  inputs     parsing the request inputs
+  traversal  traversal and authentication
+  metadata   recording the transaction meta data
+  call       calling the published object
+  commit     committing the transaction
+  error      aborting the transaction and handling an error
+  finalize   finalizing the response
+
+Durations of retried requests are summed up.  The durations of finished
+requests are aggregated in `timing_stats`, and may be sent to the client
+in a Server-Timing response header.
+"""
+
+import threading
+import time
+
+from zope.component import adapter
+
+from ZPublisher.interfaces import IPubAfterTraversal
+from ZPublisher.interfaces import IPubBeforeCommit
+from ZPublisher.interfaces import IPubFailure
+from ZPublisher.interfaces import IPubStart
+from ZPublisher.interfaces import IPubSuccess
+
+# The ZConfig machinery may set these attributes on initialization.
+enabled = False
+server_timing = False
+
+PHASES = ('app', 'inputs', 'traversal', 'metadata', 'call', 'commit',
+          'error', 'finalize')
+
+# Upper bounds in milliseconds of the histogram buckets.
+BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class RequestTiming(object):
+    """The durations of the phases of a request in seconds."""
+
+    def __init__(self):
+        self.start = self._last = _clock()
+        self.durations = {}
+
+    def mark(self, phase):
+        """End `phase`, which began at the previous mark."""
+        now = _clock()
+        durations = self.durations
+        durations[phase] = durations.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def total(self):
+        return self._last - self.start
+
+    def items(self):
+        """Return (phase, duration) pairs in the order of `PHASES`."""
+        durations = self.durations
+        items = [(phase, durations[phase]) for phase in PHASES
+                 if phase in durations]
+        items.extend(sorted((phase, duration)
+                            for phase, duration in durations.items()
+                            if phase not in PHASES))
+        return items
+
+    def header(self):
+        """Return the value of a Server-Timing header."""
+        items = self.items()
+        items.append(('total', self.total()))
+        return ', '.join('%s;dur=%.2f' % (phase, duration * 1000)
+                         for phase, duration in items)
+
+
+class TimingStats(object):
+    """Thread safe histograms of the phase durations of requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, timing):
+        items = timing.items()
+        items.append(('total', timing.total()))
+        with self._lock:
+            for phase, duration in items:
+                histogram = self._histograms.get(phase)
+                if histogram is None:
+                    histogram = self._histograms[phase] = [
+                        0, 0.0, [0] * (len(BUCKETS) + 1)]
+                ms = duration * 1000
+                histogram[0] += 1
+                histogram[1] += ms
+                for i, bound in enumerate(BUCKETS):
+                    if ms <= bound:
+                        break
+                else:
+                    i = len(BUCKETS)
+                histogram[2][i] += 1
+
+    def items(self):
+        """Return a list of histograms in the order of `PHASES`.
+
+        Each entry is a mapping with the keys 'phase', 'count', 'mean'
+        (in milliseconds) and 'buckets', the number of durations up to
+        each bound in `BUCKETS` and above the last one.
+        """
+        with self._lock:
+            histograms = dict(
+                (phase, (count, total, list(buckets)))
+                for phase, (count, total, buckets)
+                in self._histograms.items())
+        order = [phase for phase in PHASES if phase in histograms]
+        order.extend(sorted(phase for phase in histograms
+                            if phase not in PHASES and phase != 'total'))
+        if 'total' in histograms:
+            order.append('total')
+        result = []
+        for phase in order:
+            count, total, buckets = histograms[phase]
+            result.append({'phase': phase,
+                           'count': count,
+                           'mean': total / count,
+                           'buckets': buckets})
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+timing_stats = TimingStats()
+
+
+def start(request):
+    """Start timing `request` if timing is enabled."""
+    if enabled:
+        request._timing = RequestTiming()
+
+
+def mark(request, phase):
+    """End `phase` of `request` if it is timed."""
+    timing = getattr(request, '_timing', None)
+    if timing is not None:
+        timing.mark(phase)
+
+
+def getTiming(request):
+    """Return the `RequestTiming` of `request` or None."""
+    return getattr(request, '_timing', None)
+
+
+def finish(request, headers):
+    """Record the timing of a finished request.
+
+    Add a Server-Timing header to the response `headers` if configured.
+    """
+    timing = getattr(request, '_timing', None)
+    if timing is None:
+        return
+    timing_stats.record(timing)
+    if server_timing:
+        headers.append(('Server-Timing', timing.header()))
+
+
+@adapter(IPubStart)
+def afterStart(event):
+    mark(event.request, 'app')
+
+
+@adapter(IPubAfterTraversal)
+def afterTraversal(event):
+    mark(event.request, 'traversal')
+
+
+@adapter(IPubBeforeCommit)
+def beforeCommit(event):
+    mark(event.request, 'call')
+
+
+@adapter(IPubSuccess)
+def afterSuccess(event):
+    mark(event.request, 'commit')
+
+
+@adapter(IPubFailure)
+def afterFailure(event):
+    mark(event.request, 'error')
@@ -46,6 +46,21 @@ def security_policy_implementation(value):
     return value
 
 
+def conflict_retry_jitter(value):
+    value = value.lower()
+    ok = ('full', 'equal', 'none')
+    if value not in ok:
+        raise ValueError("conflict-retry-jitter must be one of %r" % (ok, ))
+    return value
+
+
+def http_compression_level(value):
+    value = int(value)
+    if not 1 <= value <= 9:
+        raise ValueError("http-compression-level must be between 1 and 9")
+    return value
+
+
 def datetime_format(value):
     value = value.lower()
     ok = ('us', 'international')
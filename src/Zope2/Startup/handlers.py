@@ -89,9 +89,50 @@ def root_wsgi_handler(cfg):
     # set the maximum number of ConflictError retries
     from ZPublisher import HTTPRequest
     if cfg.max_conflict_retries:
-        HTTPRequest.retry_max_count = cfg.max_conflict_retries
+        HTTPRequest.HTTPRequest.retry_max_count = cfg.max_conflict_retries
     else:
-        HTTPRequest.retry_max_count = 3
+        HTTPRequest.HTTPRequest.retry_max_count = 3
+
+    # set the policy deciding how long to wait before a retry
+    from ZPublisher import retry
+    retry.setRetryPolicy(cfg.conflict_retry_policy(
+        base=cfg.conflict_retry_delay,
+        cap=cfg.conflict_retry_max_delay,
+        jitter=cfg.conflict_retry_jitter))
+
+    # defer parsing of request inputs until they are accessed
+    HTTPRequest.lazy_inputs = cfg.lazy_request_inputs
+
+    # limit the number of cookies parsed per request
+    HTTPRequest.cookie_limit = cfg.max_request_cookies
+
+    # configure the content compression of responses
+    from ZPublisher import HTTPResponse
+    HTTPResponse.compression_level = cfg.http_compression_level
+    HTTPResponse.compression_min_size = cfg.http_compression_min_size
+    from ZPublisher import compression
+    compression.variant_cache = compression.VariantCache(
+        cfg.http_compression_cache_size)
+
+    # measure the phases of publishing requests
+    from ZPublisher import timing
+    timing.enabled = cfg.request_timing
+    timing.server_timing = cfg.server_timing_header
+
+    # set the size above which request bodies are spooled to disk
+    from ZPublisher import formparser
+    formparser.spool_threshold = cfg.form_spool_threshold
+
+    # set how large files and images are stored
+    from OFS import Image
+    Image.pdata_chunk_size = cfg.file_chunk_size
+    Image.pdata_savepoint_chunks = max(cfg.file_savepoint_chunks, 1)
+    Image.blob_storage = cfg.file_blob_storage
+    Image.max_ranges = max(cfg.max_byte_ranges, 0)
+
+    # set where shared caches keep their files
+    from OFS import SharedCacheManager
+    SharedCacheManager.directory = cfg.shared_cache_directory
 
 
 def _name_to_ips(host):
@@ -113,6 +113,187 @@ class WSGIStartupTestCase(unittest.TestCase):
             """)
         self.assertEqual(conf.max_conflict_retries, 15)
 
+    def test_conflict_retry_policy_default(self):
+        from ZPublisher.retry import ExponentialBackoff
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertIs(conf.conflict_retry_policy, ExponentialBackoff)
+        self.assertEqual(conf.conflict_retry_delay, 1.0)
+        self.assertEqual(conf.conflict_retry_max_delay, 4.0)
+        self.assertEqual(conf.conflict_retry_jitter, 'full')
+
+    def test_conflict_retry_policy_explicit(self):
+        from ZPublisher import retry
+        from ZPublisher.HTTPRequest import HTTPRequest
+        from Zope2.Startup.handlers import root_wsgi_handler
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            max-conflict-retries 5
+            conflict-retry-delay 0.05
+            conflict-retry-max-delay 0.5
+            conflict-retry-jitter None
+            """)
+        orig_policy = retry.getRetryPolicy()
+        orig_max_count = HTTPRequest.retry_max_count
+        try:
+            root_wsgi_handler(conf)
+            policy = retry.getRetryPolicy()
+            self.assertEqual(HTTPRequest.retry_max_count, 5)
+        finally:
+            retry.setRetryPolicy(orig_policy)
+            HTTPRequest.retry_max_count = orig_max_count
+        self.assertEqual(policy.delay(0), 0.05)
+        self.assertEqual(policy.delay(10), 0.5)
+
+    def test_conflict_retry_jitter_invalid(self):
+        self.assertRaises(ValueError, self.load_config_text,
+                          u"""\
+            instancehome <<INSTANCE_HOME>>
+            conflict-retry-jitter sometimes
+            """)
+
+    def test_form_spool_threshold_default(self):
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.form_spool_threshold, 65536)
+
+    def test_form_spool_threshold_explicit(self):
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            form-spool-threshold 1MB
+            """)
+        self.assertEqual(conf.form_spool_threshold, 1048576)
+
+    def test_lazy_request_inputs(self):
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertFalse(conf.lazy_request_inputs)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            lazy-request-inputs on
+            """)
+        self.assertTrue(conf.lazy_request_inputs)
+
+    def test_max_request_cookies(self):
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.max_request_cookies, 0)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            max-request-cookies 50
+            """)
+        self.assertEqual(conf.max_request_cookies, 50)
+
+    def test_http_compression(self):
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.http_compression_level, 6)
+        self.assertEqual(conf.http_compression_min_size, 0)
+        self.assertEqual(conf.http_compression_cache_size, 8 << 20)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            http-compression-level 9
+            http-compression-min-size 1KB
+            http-compression-cache-size 1MB
+            """)
+        self.assertEqual(conf.http_compression_level, 9)
+        self.assertEqual(conf.http_compression_min_size, 1024)
+        self.assertEqual(conf.http_compression_cache_size, 1 << 20)
+
+    def test_http_compression_level_invalid(self):
+        self.assertRaises(ValueError, self.load_config_text, u"""\
+            instancehome <<INSTANCE_HOME>>
+            http-compression-level 10
+            """)
+
+    def test_request_timing(self):
+        from ZPublisher import timing
+        from Zope2.Startup.handlers import root_wsgi_handler
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertFalse(conf.request_timing)
+        self.assertFalse(conf.server_timing_header)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            request-timing on
+            server-timing-header on
+            """)
+        try:
+            root_wsgi_handler(conf)
+            self.assertTrue(timing.enabled)
+            self.assertTrue(timing.server_timing)
+        finally:
+            timing.enabled = timing.server_timing = False
+
+    def test_file_chunk_size(self):
+        from OFS import Image
+        from Zope2.Startup.handlers import root_wsgi_handler
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.file_chunk_size, 65536)
+        self.assertEqual(conf.file_savepoint_chunks, 16)
+        self.assertFalse(conf.file_blob_storage)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            file-chunk-size 256KB
+            file-savepoint-chunks 64
+            file-blob-storage on
+            """)
+        orig = (Image.pdata_chunk_size, Image.pdata_savepoint_chunks,
+                Image.blob_storage)
+        try:
+            root_wsgi_handler(conf)
+            self.assertEqual(Image.pdata_chunk_size, 262144)
+            self.assertEqual(Image.pdata_savepoint_chunks, 64)
+            self.assertTrue(Image.blob_storage)
+        finally:
+            (Image.pdata_chunk_size, Image.pdata_savepoint_chunks,
+             Image.blob_storage) = orig
+
+    def test_max_byte_ranges(self):
+        from OFS import Image
+        from Zope2.Startup.handlers import root_wsgi_handler
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.max_byte_ranges, 100)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            max-byte-ranges 10
+            """)
+        orig = Image.max_ranges
+        try:
+            root_wsgi_handler(conf)
+            self.assertEqual(Image.max_ranges, 10)
+        finally:
+            Image.max_ranges = orig
+
+    def test_shared_cache_directory(self):
+        from OFS import SharedCacheManager
+        from Zope2.Startup.handlers import root_wsgi_handler
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            """)
+        self.assertEqual(conf.shared_cache_directory, None)
+        conf, handler = self.load_config_text(u"""\
+            instancehome <<INSTANCE_HOME>>
+            shared-cache-directory <<INSTANCE_HOME>>
+            """)
+        try:
+            root_wsgi_handler(conf)
+            self.assertEqual(SharedCacheManager.directory,
+                             conf.shared_cache_directory)
+            self.assertTrue(conf.shared_cache_directory)
+        finally:
+            SharedCacheManager.directory = None
+
     def test_default_zpublisher_encoding(self):
         conf, dummy = self.load_config_text(u"""\
             instancehome <<INSTANCE_HOME>>